@@ -85,6 +85,78 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Swap LocMemCache for a shared backend (Redis/Memcached) when running
+# several workers so catalog-version bumps invalidate every process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'jetflix',
+    }
+}
+
+# Bounded in-process cache for search_movies_api results
+SEARCH_CACHE_MAX_ENTRIES = 512
+SEARCH_CACHE_TTL = 300  # seconds; also bounds staleness of view counts
+
+# Offline recommendation models (trained by manage.py train_recommender;
+# build_ann_index and build_content_model also save theirs here, and
+# build_similarities the interaction totals its incremental runs compare)
+RECOMMENDER_MODEL_DIR = BASE_DIR / 'recommender_models'
+
+# Materialized per-user recommendations (movies.recommendations)
+RECOMMENDATION_REFRESH_DEBOUNCE = 30  # seconds after the last interaction change
+RECOMMENDATION_STALE_AFTER = 6 * 3600  # seconds before a stored list is refreshed
+RECOMMENDATION_BUDGET_MS = 150  # max time a request waits on a refresh before degrading
+
+# Seconds to batch review/view changes before a movie's leaderboard entries update
+LEADERBOARD_REFRESH_INTERVAL = 60
+
+# Landing page: genre/language rows streamed with the first response (the
+# rest load as the user scrolls) and movie cards per row page
+LANDING_EAGER_ROWS = 3
+LANDING_ROW_SIZE = 20
+
+# Rendered movie cards (movies.cards); entries are versioned per movie, so
+# the TTL only bounds memory held by movies nobody looks at any more
+MOVIE_CARD_CACHE_TTL = 24 * 3600
+MOVIE_PAYLOAD_CACHE_TTL = 24 * 3600  # serialized movies (movies.serializers)
+
+# Whole-page cache for anonymous visitors (movies.cache.cache_anonymous_page);
+# entries are also dropped whenever the catalog version changes
+PAGE_CACHE_TTL = 300
+
+# Threads for running a request's independent lookups in parallel
+# (movies.background.gather), e.g. the movie detail endpoint
+REQUEST_FANOUT_WORKERS = 8
+
+# Player heartbeats (movies.progress): how often the player reports its
+# position, and how often buffered positions are written to the database
+WATCH_PROGRESS_HEARTBEAT_INTERVAL = 15  # seconds
+WATCH_PROGRESS_FLUSH_INTERVAL = 30  # seconds
+WATCH_PROGRESS_MAX_PENDING = 5000  # buffered positions that force an early flush
+
+# Seconds after a QoE beacon before the hourly QoE rollups are rebuilt
+# (movies.qoe); compute_qoe_rollups also runs them on a schedule
+QOE_ROLLUP_INTERVAL = 300
+
+# Concurrent media streams (movies.streams), enforced per process. Streams
+# may hold MEDIA_WORKER_SHARE of the worker threads; the rest stay free for
+# pages and APIs. Busy requests get 503 with Retry-After
+SERVER_WORKER_THREADS = 16  # keep in line with the app server's threads per process
+MEDIA_WORKER_SHARE = 0.75
+STREAM_MAX_PER_USER = 4  # open media connections per viewer; a player uses one or two
+STREAM_RETRY_AFTER = 5  # seconds
+
+# Run movies.background jobs inline instead of on the thread pool
+BACKGROUND_TASKS_SYNC = False
+
+# Tests run background jobs inline and keep recommender models in a temp dir
+TEST_RUNNER = 'Jetflix.test_runner.JetflixTestRunner'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
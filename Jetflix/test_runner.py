@@ -0,0 +1,28 @@
+"""
+Test runner for Jetflix.
+
+Every test runs with movies.background jobs inline, so no timer outlives
+the test that started it, and with RECOMMENDER_MODEL_DIR in a fresh
+temporary directory, so models trained locally are never read or
+overwritten by tests.
+"""
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class JetflixTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._model_dir = tempfile.TemporaryDirectory(prefix='jetflix-test-models-')
+        self._test_settings = override_settings(
+            BACKGROUND_TASKS_SYNC=True,
+            RECOMMENDER_MODEL_DIR=self._model_dir.name,
+        )
+        self._test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.disable()
+        self._model_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
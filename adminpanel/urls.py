@@ -19,5 +19,7 @@ urlpatterns = [
     path('users/', views.manage_users, name='manage_users'),
     path('users/<int:user_id>/', views.user_profile, name='user_profile'),
     path('payments/', views.manage_payments, name='manage_payments'),
+    path('qoe/', views.qoe_report, name='qoe_report'),
+    path('streams/', views.stream_stats, name='stream_stats'),
     path('logout/', views.admin_logout, name='admin_logout'),
 ]
\ No newline at end of file
@@ -6,9 +6,16 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
-from django.db.models import Count
+from django.db.models import Count, Sum
+from django.utils import timezone
+from datetime import timedelta
 from .forms import MovieForm
-from movies.models import Movie, Review, WatchHistory
+from movies.models import Movie, Review, WatchHistory, QoERollup
+from movies.cache import search_cache
+from movies.factorization import get_model
+from movies.recommendations import tier_stats
+from movies.qoe import METRICS as QOE_METRICS, latest_summary as latest_qoe_summary
+from movies.streams import stream_tracker
 
 
 def admin_login(request):
@@ -39,6 +46,11 @@ def admin_dashboard(request):
         'published_movies': published_movies,
         'total_views': total_views,
         'total_reviews': total_reviews,
+        'search_cache': search_cache.stats(),
+        'recommender_model': get_model(),
+        'recommendation_tiers': tier_stats.stats(),
+        'qoe': latest_qoe_summary(),
+        'streams': stream_tracker.stats(),
     }
 
     return render(request, 'adminpanel/dashboard.html', context)
@@ -197,6 +209,47 @@ def manage_payments(request):
     })
 
 
+@staff_member_required
+def stream_stats(request):
+    """Live media stream counts of the process serving this request, polled by the dashboard"""
+    return JsonResponse({'status': 'success', 'streams': stream_tracker.stats()})
+
+@staff_member_required
+def qoe_report(request):
+    """Hourly playback QoE percentiles, for all movies or one (?movie=id)"""
+    try:
+        hours = min(max(int(request.GET.get('hours', 24)), 1), 24 * 7)
+    except ValueError:
+        hours = 24
+    since = timezone.now() - timedelta(hours=hours)
+    movie = None
+    if request.GET.get('movie'):
+        movie = get_object_or_404(Movie, id=request.GET['movie'])
+
+    rollups = QoERollup.objects.filter(bucket_start__gte=since, movie=movie)
+    buckets = {}
+    for rollup in rollups:
+        buckets.setdefault(rollup.bucket_start, {})[rollup.metric] = rollup
+    rows = [
+        {'bucket_start': bucket, **{metric: metrics.get(metric) for metric in QOE_METRICS}}
+        for bucket, metrics in sorted(buckets.items(), reverse=True)
+    ]
+
+    # Sums merge across hours, so the worst movies are ranked by total stall time
+    worst_movies = QoERollup.objects.filter(
+        bucket_start__gte=since, movie__isnull=False, metric='stall'
+    ).values('movie_id', 'movie__title').annotate(
+        stalls=Sum('count'), stall_ms=Sum('total')
+    ).order_by('-stall_ms')[:10]
+
+    return render(request, 'adminpanel/qoe_report.html', {
+        'rows': rows,
+        'movie': movie,
+        'hours': hours,
+        'worst_movies': worst_movies,
+    })
+
+
 def admin_logout(request):
     logout(request)
     return redirect('admin_login')
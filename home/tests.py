@@ -1,3 +1,118 @@
-from django.test import TestCase
+import threading
+import time
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from movies.cache import ResultCache, search_cache
+from movies.models import Movie
+
+from .models import Payment
+
+
+class ResultCacheTests(SimpleTestCase):
+    """Hits, expiry, eviction and single-flight fills of ResultCache"""
+
+    def test_repeated_key_is_served_from_cache(self):
+        results = ResultCache(max_entries=4, ttl=60)
+        calls = []
+        fill = lambda: calls.append(1) or 'result'
+
+        self.assertEqual(results.get_or_fill('key', fill), 'result')
+        self.assertEqual(results.get_or_fill('key', fill), 'result')
+        self.assertEqual(len(calls), 1)
+        stats = results.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['fills']), (1, 1, 1))
+
+    def test_expired_entry_is_filled_again(self):
+        results = ResultCache(max_entries=4, ttl=0)
+        results.get_or_fill('key', lambda: 'old')
+        self.assertEqual(results.get_or_fill('key', lambda: 'new'), 'new')
+
+    def test_least_recently_used_entry_is_evicted(self):
+        results = ResultCache(max_entries=2, ttl=60)
+        results.get_or_fill('a', lambda: 'a')
+        results.get_or_fill('b', lambda: 'b')
+        results.get_or_fill('a', lambda: 'unused')
+        results.get_or_fill('c', lambda: 'c')
+
+        self.assertEqual(results.get_or_fill('a', lambda: 'refilled'), 'a')
+        self.assertEqual(results.get_or_fill('b', lambda: 'refilled'), 'refilled')
+
+    def test_concurrent_misses_share_one_fill(self):
+        results = ResultCache(max_entries=4, ttl=60)
+        calls, values = [], []
+
+        def slow_fill():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'result'
+
+        threads = [threading.Thread(target=lambda: values.append(results.get_or_fill('key', slow_fill)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(values, ['result'] * 5)
+
+    def test_failed_fill_is_not_cached(self):
+        results = ResultCache(max_entries=4, ttl=60)
+
+        def failing_fill():
+            raise RuntimeError('database down')
+
+        with self.assertRaises(RuntimeError):
+            results.get_or_fill('key', failing_fill)
+        self.assertEqual(results.get_or_fill('key', lambda: 'result'), 'result')
+
+
+class SearchApiCacheTests(TestCase):
+    """/api/search/ answers repeated queries from search_cache until the catalog changes"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.clear()
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        Payment.objects.create(user=self.user, status='completed', transaction_id='test-search-cache')
+        self.client.login(username='viewer', password='pass')
+        self.movie = Movie.objects.create(
+            title='Space Pirates', year=2020, description='A movie about space pirates',
+            thumbnail='thumbnails/test.jpg', video='movies/test.mp4'
+        )
+        self.url = reverse('search_movies_api')
+
+    def search(self, query):
+        response = self.client.get(self.url, {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [movie['title'] for movie in response.json()['movies']]
+
+    def test_repeated_query_is_served_from_cache(self):
+        self.assertEqual(self.search('pirates'), ['Space Pirates'])
+        before = search_cache.stats()
+
+        # Case and surrounding spaces normalise to the same entry
+        self.assertEqual(self.search('pirates'), ['Space Pirates'])
+        self.assertEqual(self.search('  PIRATES '), ['Space Pirates'])
+        after = search_cache.stats()
+        self.assertEqual(after['hits'] - before['hits'], 2)
+        self.assertEqual(after['fills'], before['fills'])
+
+    def test_saving_a_movie_invalidates_cached_results(self):
+        self.assertEqual(self.search('pirates'), ['Space Pirates'])
+        fills = search_cache.stats()['fills']
+
+        self.movie.title = 'Space Pirates Returns'
+        self.movie.save()
+
+        self.assertEqual(self.search('pirates'), ['Space Pirates Returns'])
+        self.assertEqual(search_cache.stats()['fills'], fills + 1)
+
+    def test_anonymous_request_is_redirected_to_login(self):
+        self.client.logout()
+        response = self.client.get(self.url, {'q': 'pirates'})
+        self.assertRedirects(response, f'/?next={self.url}%3Fq%3Dpirates', fetch_redirect_response=False)
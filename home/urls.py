@@ -12,6 +12,7 @@ urlpatterns = [
     path('verify-payment/<str:transaction_uuid>/', views.verify_payment_status, name='verify_payment'),
     path('dashboard/', views.home_page, name='home'),
     path('search/', views.search_view, name='search'),
+    path('api/search/', views.search_movies_api, name='search_movies_api'),
     path('watchlist/', views.watchlist_view, name='watchlist'),
     path('profile/', views.profile_view, name='profile'),
     path('watch_history/', views.watch_history_view, name='watch_history'),
@@ -8,6 +8,14 @@ from django.views.decorators.csrf import csrf_exempt
 from .forms import CustomUserCreationForm
 from .models import Payment
 from movies.models import Movie, Watchlist, WatchHistory, UserInteraction
+from movies.cache import search_cache, normalize_search_params, get_catalog_version, cache_anonymous_page
+from movies.cards import attach_movie_cards
+from movies.streams import limit_media_streams
+from movies.recommendations import serve_recommendations
+from movies.trending import get_trending_movies
+from movies.progress import continue_watching
+from movies.serializers import only_for, parse_fields, serialize_movies
+from movies.pagination import HTML_PAGE_SIZE, SEARCH_PAGE_SIZE, InvalidCursor, page_params, paginate
 import logging
 import os
 import mimetypes
@@ -35,6 +43,7 @@ ESEWA_CALLBACK_BASE  = None
 # -----------------------------------------------------------------------
 
 
+@limit_media_streams
 def video_stream(request, path):
     """Serve video files with HTTP Range request support so browsers can seek and get duration."""
     from django.conf import settings
@@ -114,6 +123,7 @@ def register_view(request):
 
 
 # Login
+@cache_anonymous_page
 def login_view(request):
     if request.user.is_authenticated:
         has_payment = Payment.objects.filter(user=request.user, status='completed').exists()
@@ -166,12 +176,22 @@ def search_view(request):
 @login_required(login_url='/')
 def watchlist_view(request):
     try:
-        watchlist_items = Watchlist.objects.filter(user=request.user).select_related('movie').prefetch_related('movie__genres', 'movie__language')
-        movies = [item.movie for item in watchlist_items]
+        watchlist_items = Watchlist.objects.filter(user=request.user)
+        cursor, limit = page_params(request, default=HTML_PAGE_SIZE)
+        page = paginate(
+            watchlist_items.select_related('movie__language').prefetch_related('movie__genres'),
+            ['-added_on', '-id'], cursor, limit
+        )
+        movies = [item.movie for item in page.items]
+        attach_movie_cards(movies)
         return render(request, 'home/watchlist.html', {
             'movies': movies,
-            'watchlist_count': len(movies)
+            'watchlist_count': watchlist_items.count(),
+            'cursor': cursor,
+            'next_cursor': page.next_cursor
         })
+    except InvalidCursor:
+        return redirect(request.path)
     except Exception as e:
         logger.error(f"Error in watchlist_view: {str(e)}")
         messages.error(request, "Unable to load watchlist.")
@@ -195,10 +215,19 @@ def profile_view(request):
 @login_required(login_url='/')
 def watch_history_view(request):
     try:
-        watch_history = WatchHistory.objects.filter(user=request.user).select_related('movie').order_by('-watched_at')
+        cursor, limit = page_params(request, default=HTML_PAGE_SIZE)
+        page = paginate(
+            WatchHistory.objects.filter(user=request.user).select_related('movie__language').prefetch_related('movie__genres'),
+            ['-watched_at', '-id'], cursor, limit
+        )
         return render(request, 'home/watch_history.html', {
-            'watch_history': watch_history
+            'watch_history': page.items,
+            'watch_count': WatchHistory.objects.filter(user=request.user).count(),
+            'cursor': cursor,
+            'next_cursor': page.next_cursor
         })
+    except InvalidCursor:
+        return redirect(request.path)
     except Exception as e:
         logger.error(f"Error in watch_history_view: {str(e)}")
         messages.error(request, "Unable to load watch history.")
@@ -237,24 +266,28 @@ def edit_profile_view(request):
 
 def get_recommended_movies(user, min_interactions=1):
     """
-    Get personalized movie recommendations using collaborative filtering.
+    Get the user's movie recommendations within the serving time budget.
+    
+    Lists are computed in the background (see movies.recommendations);
+    when that misses the deadline a cached or popular list is served.
     
     Args:
         user: The user to get recommendations for
         min_interactions: Minimum number of interactions user must have before getting recommendations
+    
+    Returns:
+        (movies, tier) where tier names the source that served the list,
+        or (None, None) for a new user
     """
     if not user.is_authenticated:
-        return []
+        return [], None
     
     # Check if user has enough interactions
     interaction_count = UserInteraction.objects.filter(user=user).count()
     if interaction_count < min_interactions:
-        return None  # Indicates new user
-    
-    # Use the collaborative filtering method from Movie model
-    recommended_movies = Movie.get_recommendations_for_user(user, limit=12)
+        return None, None  # Indicates new user
     
-    return list(recommended_movies)
+    return serve_recommendations(user, limit=12)
 
 
 def home_page(request):
@@ -263,26 +296,34 @@ def home_page(request):
         recent_movies = Movie.objects.filter(is_published=True).select_related('language').prefetch_related('genres').order_by('-id')[:8]
         
     
-        trending_movies = Movie.objects.filter(is_published=True).select_related('language').prefetch_related('genres').order_by('-views')[:8]
+        trending_movies = get_trending_movies('24h', limit=8)
         
         
         recommended_movies = None
+        recommendation_tier = None
         is_new_user = False
+        continue_movies = []
         
         if request.user.is_authenticated:
+            continue_movies = continue_watching(request.user.id)
             
-            recommended_movies = get_recommended_movies(request.user, min_interactions=1)
+            recommended_movies, recommendation_tier = get_recommended_movies(request.user, min_interactions=1)
             if recommended_movies is None:
                 
                 is_new_user = True
                 recommended_movies = []
+        attach_movie_cards(recent_movies, trending_movies, recommended_movies or [], continue_movies)
         
-        return render(request, 'home/homepage.html', {
+        response = render(request, 'home/homepage.html', {
+            'continue_movies': continue_movies,
             'movies': recent_movies,
             'trending_movies': trending_movies,
             'recommended_movies': recommended_movies,
             'is_new_user': is_new_user,
         })
+        if recommendation_tier:
+            response['X-Recommendation-Tier'] = recommendation_tier
+        return response
     except Exception as e:
         logger.error(f"Error loading home page: {str(e)}")
         messages.error(request, "Unable to load movies. Please refresh the page.")
@@ -309,62 +350,66 @@ def homepage_view(request):
 
 
 
+def _search_movies(query, language, genres, fields, cursor=None, limit=SEARCH_PAGE_SIZE):
+    """Run the search filter chain and build one JSON-ready page of results, newest first."""
+    movies = Movie.objects.filter(is_published=True)
+    
+    
+    if query:
+        movies = movies.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(cast__icontains=query)
+        )
+    
+    
+    if language:
+        movies = movies.filter(language__name=language)
+    
+    
+    if genres:
+        for genre in genres:
+            movies = movies.filter(genres__name__icontains=genre)
+    
+    
+    page = paginate(movies.only(*only_for(fields)).distinct(), ['-id'], cursor, limit)
+    
+    
+    return page.next_cursor, serialize_movies(page.items, fields)
+
+
 @login_required(login_url='/')
 def search_movies_api(request):
     """
     Optional API endpoint for searching movies via AJAX.
     This allows backend filtering instead of client-side only.
+    Results are paged with ?cursor= and cached per normalised query, page
+    and catalog version.
     """
     try:
-        query = request.GET.get('q', '').strip()
-        language = request.GET.get('language', '')
-        genres = request.GET.getlist('genres[]')
-        
-        
-        movies = Movie.objects.filter(is_published=True)
-        
-    
-        if query:
-            movies = movies.filter(
-                Q(title__icontains=query) |
-                Q(description__icontains=query) |
-                Q(cast__icontains=query)
-            )
-        
-        
-        if language:
-            movies = movies.filter(language__name=language)
-        
-        
-        if genres:
-            for genre in genres:
-                movies = movies.filter(genres__name__icontains=genre)
-        
-        
-        movies = movies.select_related('language').prefetch_related('genres').distinct()[:50]
-        
-        
-        data = [{
-            'id': movie.id,
-            'title': movie.title,
-            'year': movie.year,
-            'description': movie.description or '',
-            'thumbnail': movie.thumbnail.url if movie.thumbnail else '',
-            'video': movie.video.url if movie.video else '',
-            'genres': movie.get_genres_display(),
-            'language': movie.language.name if movie.language else 'Unknown',
-            'cast': movie.cast or '',
-            'rating': float(movie.review_stars) if hasattr(movie, 'review_stars') else 0.0,
-            'views': movie.views if hasattr(movie, 'views') else 0,
-            'length': movie.movie_length if hasattr(movie, 'movie_length') else 'Unknown',
-        } for movie in movies]
+        query, language, genres = normalize_search_params(
+            request.GET.get('q', ''),
+            request.GET.get('language', ''),
+            request.GET.getlist('genres[]'),
+        )
+        fields = parse_fields(request)
+        cursor, limit = page_params(request, default=SEARCH_PAGE_SIZE)
+        key = (get_catalog_version(), query, language, genres, fields, cursor, limit)
+        next_cursor, data = search_cache.get_or_fill(
+            key, lambda: _search_movies(query, language, genres, fields, cursor, limit)
+        )
         
         return JsonResponse({
             'status': 'success',
             'count': len(data),
-            'movies': data
+            'movies': data,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         })
         
+    except ValueError as e:
+        # A malformed ?cursor= (InvalidCursor) or an unknown ?fields= name
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
     except Exception as e:
         logger.error(f"Error in search_movies_api: {str(e)}")
         return JsonResponse({
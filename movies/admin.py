@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Movie, Watchlist, Review, Language, Genre, WatchHistory, UserInteraction
+from .models import Movie, Watchlist, Review, Language, Genre, WatchHistory, WatchProgress, UserInteraction, MovieSimilarity, UserRecommendation, MovieContentTerms, MoviePlayRollup, TrendingMovie, LeaderboardEntry, PlaybackEvent, QoERollup
 
 @admin.register(Language)
 class LanguageAdmin(admin.ModelAdmin):
@@ -18,6 +18,8 @@ class MovieAdmin(admin.ModelAdmin):
     search_fields = ['title', 'cast', 'description']
     filter_horizontal = ['genres']  # Nice UI for ManyToMany field
     ordering = ['-id']
+    # Maintained from reviews; fix drift with the repair_rating_aggregates command
+    readonly_fields = ['rating_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
     
     def get_genres(self, obj):
         """Display genres as comma-separated list in admin"""
@@ -44,9 +46,64 @@ class WatchHistoryAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'movie__title']
     readonly_fields = ['watched_at']
 
+@admin.register(WatchProgress)
+class WatchProgressAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'movie', 'position', 'duration', 'updated_at']
+    search_fields = ['user__username', 'movie__title']
+    readonly_fields = ['updated_at']
+
 @admin.register(UserInteraction)
 class UserInteractionAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'movie', 'interaction_type', 'score', 'created_at']
     list_filter = ['interaction_type', 'created_at']
     search_fields = ['user__username', 'movie__title']
-    readonly_fields = ['created_at']
\ No newline at end of file
+    readonly_fields = ['created_at']
+
+@admin.register(MovieSimilarity)
+class MovieSimilarityAdmin(admin.ModelAdmin):
+    list_display = ['id', 'movie', 'similar_movie', 'kind', 'score', 'computed_at']
+    list_filter = ['kind']
+    search_fields = ['movie__title', 'similar_movie__title']
+    readonly_fields = ['computed_at']
+
+@admin.register(UserRecommendation)
+class UserRecommendationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'computed_at']
+    search_fields = ['user__username']
+    readonly_fields = ['computed_at']
+
+@admin.register(MovieContentTerms)
+class MovieContentTermsAdmin(admin.ModelAdmin):
+    list_display = ['id', 'movie', 'updated_at']
+    search_fields = ['movie__title']
+    readonly_fields = ['updated_at']
+
+@admin.register(MoviePlayRollup)
+class MoviePlayRollupAdmin(admin.ModelAdmin):
+    list_display = ['id', 'movie', 'granularity', 'bucket_start', 'plays']
+    list_filter = ['granularity', 'bucket_start']
+    search_fields = ['movie__title']
+
+@admin.register(TrendingMovie)
+class TrendingMovieAdmin(admin.ModelAdmin):
+    list_display = ['window', 'rank', 'movie', 'score', 'computed_at']
+    list_filter = ['window']
+    search_fields = ['movie__title']
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'key', 'rank', 'movie', 'score', 'bayesian_rating', 'computed_at']
+    list_filter = ['kind']
+    search_fields = ['movie__title']
+
+@admin.register(PlaybackEvent)
+class PlaybackEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'movie', 'metric', 'value', 'created_at']
+    list_filter = ['metric', 'created_at']
+    search_fields = ['movie__title']
+
+@admin.register(QoERollup)
+class QoERollupAdmin(admin.ModelAdmin):
+    list_display = ['id', 'movie', 'metric', 'bucket_start', 'count', 'p50', 'p90', 'p99']
+    list_filter = ['metric', 'bucket_start']
+    search_fields = ['movie__title']
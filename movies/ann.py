@@ -0,0 +1,255 @@
+"""
+IVF-flat approximate nearest-neighbour index over movie embeddings.
+
+Vectors are clustered with spherical k-means into `n_lists` inverted lists.
+A query scores the centroids, scans only the `n_probe` closest lists and
+ranks those candidates exactly, so cost grows with the probed lists rather
+than the catalog. Per-movie published flags and language ids are stored
+alongside the vectors so filtered queries never touch the database.
+"""
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .factorization import ReloadingFile, get_model
+from .models import Movie
+
+DEFAULT_PROBES = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50000
+NO_LANGUAGE = -1
+
+
+def index_path():
+    return os.path.join(settings.RECOMMENDER_MODEL_DIR, 'ann.npz')
+
+
+def _unit(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _kmeans(vectors, n_lists, seed):
+    """Spherical k-means on (a sample of) unit vectors"""
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > KMEANS_SAMPLE:
+        sample = vectors[rng.choice(len(vectors), KMEANS_SAMPLE, replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for cluster in range(n_lists):
+            members = sample[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids = _unit(centroids)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index with exact re-ranking inside the probed lists"""
+
+    def __init__(self, centroids, offsets, vectors, ids, published, language_ids, source_version=0.0):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.vectors = vectors
+        self.ids = ids
+        self.published = published
+        self.language_ids = language_ids
+        # Timestamp of the embeddings the index was built from, so callers can
+        # tell whether it still matches the model they query it with
+        self.source_version = float(source_version)
+        self.norms = np.linalg.norm(vectors, axis=1)
+        self.norms[self.norms == 0] = 1.0
+        self._position = {int(movie_id): i for i, movie_id in enumerate(ids)}
+
+    @classmethod
+    def build(cls, vectors, ids, published=None, language_ids=None, n_lists=None, seed=0,
+              source_version=0.0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        published = np.ones(len(ids), dtype=bool) if published is None else np.asarray(published, dtype=bool)
+        language_ids = (
+            np.full(len(ids), NO_LANGUAGE, dtype=np.int64) if language_ids is None
+            else np.asarray(language_ids, dtype=np.int64)
+        )
+        n_lists = n_lists or max(1, int(np.sqrt(len(ids))))
+        n_lists = min(n_lists, len(ids))
+
+        centroids = _kmeans(_unit(vectors), n_lists, seed)
+        assignment = np.argmax(_unit(vectors) @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignment, minlength=n_lists))
+        return cls(
+            centroids.astype(np.float32), offsets, vectors[order],
+            ids[order], published[order], language_ids[order], source_version,
+        )
+
+    @classmethod
+    def from_file(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['centroids'], data['offsets'], data['vectors'],
+                data['ids'], data['published'], data['language_ids'],
+                data['source_version'],
+            )
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f, centroids=self.centroids, offsets=self.offsets, vectors=self.vectors,
+                ids=self.ids, published=self.published, language_ids=self.language_ids,
+                source_version=np.float64(self.source_version),
+            )
+        os.replace(tmp_path, path)
+        _index_file.reset()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def vector(self, movie_id):
+        position = self._position.get(movie_id)
+        return None if position is None else self.vectors[position]
+
+    def _mask(self, positions, published_only, language_id, exclude_ids):
+        mask = np.ones(len(positions), dtype=bool)
+        if published_only:
+            mask &= self.published[positions]
+        if language_id is not None:
+            mask &= self.language_ids[positions] == language_id
+        if exclude_ids:
+            mask &= ~np.isin(self.ids[positions], np.fromiter(exclude_ids, dtype=np.int64))
+        return positions[mask]
+
+    def _score(self, query, positions, metric):
+        scores = self.vectors[positions] @ query
+        if metric == 'cosine':
+            scores = scores / (self.norms[positions] * (np.linalg.norm(query) or 1.0))
+        return scores
+
+    @staticmethod
+    def _top(positions, scores, k):
+        if len(positions) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(positions))
+        top = top[np.argsort(-scores[top])]
+        return positions[top], scores[top]
+
+    def search(self, query, k=10, n_probe=DEFAULT_PROBES, metric='ip',
+               published_only=True, language_id=None, exclude_ids=()):
+        """
+        Return [(movie_id, score)] for the k best matches of `query`.
+
+        When filters leave fewer than k candidates in the probed lists,
+        the probe count is doubled until enough are found or every list
+        has been scanned.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        list_order = np.argsort(-(self.centroids @ _unit(query)))
+        n_probe = max(1, min(n_probe, self.n_lists))
+        while True:
+            probed = list_order[:n_probe]
+            positions = np.concatenate([
+                np.arange(self.offsets[c], self.offsets[c + 1]) for c in probed
+            ])
+            positions = self._mask(positions, published_only, language_id, exclude_ids)
+            if len(positions) >= k or n_probe >= self.n_lists:
+                break
+            n_probe = min(n_probe * 2, self.n_lists)
+
+        if not len(positions):
+            return []
+        positions, scores = self._top(positions, self._score(query, positions, metric), k)
+        return [(int(self.ids[p]), float(s)) for p, s in zip(positions, scores)]
+
+    def exact_search(self, query, k=10, metric='ip', published_only=True,
+                     language_id=None, exclude_ids=()):
+        """Brute-force search over the whole index (benchmark baseline)"""
+        query = np.asarray(query, dtype=np.float32)
+        positions = self._mask(np.arange(len(self.ids)), published_only, language_id, exclude_ids)
+        if not len(positions):
+            return []
+        positions, scores = self._top(positions, self._score(query, positions, metric), k)
+        return [(int(self.ids[p]), float(s)) for p, s in zip(positions, scores)]
+
+    def similar(self, movie_id, k=10, **filters):
+        """Cosine neighbours of a movie that is in the index"""
+        vector = self.vector(movie_id)
+        if vector is None:
+            return []
+        exclude_ids = set(filters.pop('exclude_ids', ())) | {movie_id}
+        return self.search(vector, k=k, metric='cosine', exclude_ids=exclude_ids, **filters)
+
+
+def build_index_from_model(n_lists=None, seed=0):
+    """Index the movie factors of the trained ALS model with current movie metadata"""
+    model = get_model()
+    if model is None:
+        return None
+    metadata = {
+        movie_id: (is_published, language_id)
+        for movie_id, is_published, language_id in Movie.objects.filter(
+            id__in=[int(m) for m in model.movie_ids]
+        ).values_list('id', 'is_published', 'language_id')
+    }
+    keep = np.array([int(m) in metadata for m in model.movie_ids], dtype=bool)
+    ids = model.movie_ids[keep]
+    published = [metadata[int(m)][0] for m in ids]
+    language_ids = [metadata[int(m)][1] or NO_LANGUAGE for m in ids]
+    return IVFIndex.build(
+        model.item_factors[keep], ids, published, language_ids,
+        n_lists=n_lists, seed=seed, source_version=model.trained_at.timestamp(),
+    )
+
+
+def benchmark(index, queries, k=10, probes=(1, 4, 16, 32, 64), metric='ip'):
+    """
+    Compare IVF search against exact search over the same queries.
+
+    Returns one row per probe count with mean recall@k and p50/p99 latency
+    in milliseconds, preceded by the exact-search baseline.
+    """
+    def timed(search):
+        latencies, results = [], []
+        for query in queries:
+            started = time.perf_counter()
+            results.append({movie_id for movie_id, _ in search(query)})
+            latencies.append((time.perf_counter() - started) * 1000)
+        return results, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+    truth, p50, p99 = timed(lambda q: index.exact_search(q, k=k, metric=metric))
+    rows = [{'probes': 'exact', 'recall': 1.0, 'p50_ms': p50, 'p99_ms': p99}]
+    for n_probe in probes:
+        found, p50, p99 = timed(lambda q: index.search(q, k=k, n_probe=n_probe, metric=metric))
+        recall = np.mean([
+            len(f & t) / len(t) if t else 1.0 for f, t in zip(found, truth)
+        ])
+        rows.append({'probes': n_probe, 'recall': float(recall), 'p50_ms': p50, 'p99_ms': p99})
+    return rows
+
+
+_index_file = ReloadingFile(index_path, IVFIndex.from_file)
+
+
+def get_index(model=None):
+    """
+    Return the process-wide IVFIndex, or None if none was built.
+
+    When `model` is given, an index built from a different training run
+    is treated as missing since its vectors live in another space.
+    """
+    index = _index_file.get()
+    if index is not None and model is not None and index.source_version != model.trained_at.timestamp():
+        return None
+    return index
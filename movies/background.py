@@ -0,0 +1,122 @@
+"""
+Minimal in-process background runner.
+
+Work is handed to a small thread pool so request threads never wait on
+it. debounce() collapses bursts of triggers for the same key into a single
+run `delay` seconds after the last one; throttle() runs once `delay` seconds
+after the first, so a steady stream of triggers still fires regularly. Each job closes its database
+connection when done so worker threads never leak connections.
+
+gather() is the request-side counterpart: it runs a request's independent
+lookups side by side on a separate pool, so they never queue behind
+background jobs.
+
+Set BACKGROUND_TASKS_SYNC = True to run jobs inline (tests, management
+commands).
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='jetflix-bg')
+_request_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'REQUEST_FANOUT_WORKERS', 8), thread_name_prefix='jetflix-req'
+)
+_timers = {}
+_timers_lock = threading.Lock()
+
+
+def _run(fn, args, kwargs):
+    close_old_connections()
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        logger.exception(f"Background task {fn.__name__} failed")
+    finally:
+        connection.close()
+
+
+def submit(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on the background pool"""
+    if getattr(settings, 'BACKGROUND_TASKS_SYNC', False):
+        fn(*args, **kwargs)
+        return
+    _executor.submit(_run, fn, args, kwargs)
+
+
+def _call(fn, args, kwargs):
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        connection.close()
+
+
+def submit_future(fn, *args, **kwargs):
+    """Like submit(), but return a Future so the caller can wait with a timeout"""
+    if getattr(settings, 'BACKGROUND_TASKS_SYNC', False):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _executor.submit(_call, fn, args, kwargs)
+
+
+def debounce(key, delay, fn, *args, **kwargs):
+    """Run fn once, `delay` seconds after the last debounce() call for `key`"""
+    if getattr(settings, 'BACKGROUND_TASKS_SYNC', False):
+        fn(*args, **kwargs)
+        return
+
+    def fire():
+        with _timers_lock:
+            if _timers.get(key) is timer:
+                del _timers[key]
+        _executor.submit(_run, fn, args, kwargs)
+
+    with _timers_lock:
+        previous = _timers.get(key)
+        if previous is not None:
+            previous.cancel()
+        timer = _timers[key] = threading.Timer(delay, fire)
+        timer.daemon = True
+        timer.start()
+
+
+def throttle(key, delay, fn, *args, **kwargs):
+    """Run fn once, `delay` seconds after the first throttle() call for `key` since it last ran"""
+    if getattr(settings, 'BACKGROUND_TASKS_SYNC', False):
+        fn(*args, **kwargs)
+        return
+
+    def fire():
+        with _timers_lock:
+            if _timers.get(key) is timer:
+                del _timers[key]
+        _executor.submit(_run, fn, args, kwargs)
+
+    with _timers_lock:
+        if key in _timers:
+            return
+        timer = _timers[key] = threading.Timer(delay, fire)
+        timer.daemon = True
+        timer.start()
+
+
+def gather(*calls):
+    """
+    Run (fn, *args) calls in parallel and return their results in order.
+
+    An exception from any call is re-raised here, the earliest call first.
+    """
+    if getattr(settings, 'BACKGROUND_TASKS_SYNC', False):
+        return [fn(*args) for fn, *args in calls]
+    futures = [_request_executor.submit(_call, fn, args, {}) for fn, *args in calls]
+    return [future.result() for future in futures]
@@ -0,0 +1,228 @@
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_vary_headers
+
+CATALOG_VERSION_KEY = 'movies:catalog_version'
+
+
+def get_catalog_version():
+    """Return the current catalog version, initialising it on first use"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate everything keyed by the catalog version"""
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Key was evicted or never set - start a fresh version sequence
+        cache.set(CATALOG_VERSION_KEY, 2, timeout=None)
+        return 2
+
+
+def movie_version_key(movie_id):
+    return f'movies:movie_version:{movie_id}'
+
+
+def get_movie_versions(movie_ids, cached=None):
+    """
+    Return {movie_id: version token} for per-movie caches.
+
+    `cached` may hold the result of a get_many that already included the
+    version keys, saving a round trip. Tokens are random rather than counters
+    so an evicted version can never come back equal to an old one.
+    """
+    keys = {movie_id: movie_version_key(movie_id) for movie_id in movie_ids}
+    if cached is None:
+        cached = cache.get_many(keys.values())
+    versions = {}
+    for movie_id, key in keys.items():
+        version = cached.get(key)
+        if version is None:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(key)
+        versions[movie_id] = version
+    return versions
+
+
+def bump_movie_versions(movie_ids):
+    """Invalidate every per-movie cache entry for these movies"""
+    cache.set_many({movie_version_key(movie_id): uuid.uuid4().hex for movie_id in movie_ids}, timeout=None)
+
+
+CSRF_PLACEHOLDER = '__csrf_token__'
+_CSRF_INPUT = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def _page_key(request):
+    return f'movies:page:{get_catalog_version()}:{request.get_full_path()}'
+
+
+def _store_page(key, content_type, content):
+    # Every visitor gets their own CSRF token; keep a placeholder in the copy
+    content = _CSRF_INPUT.sub(rf'\g<1>{CSRF_PLACEHOLDER}\g<2>', content)
+    cache.set(key, (content_type, content), settings.PAGE_CACHE_TTL)
+
+
+def _tee_into_cache(content, key, content_type, charset):
+    chunks = []
+    for chunk in content:
+        chunks.append(chunk)
+        yield chunk
+    _store_page(key, content_type, b''.join(chunks).decode(charset))
+
+
+def cache_anonymous_page(view):
+    """
+    Serve whole pages to anonymous GET requests from the cache.
+
+    Entries are keyed by the catalog version, so catalog changes invalidate
+    them. Hits inject a fresh CSRF token for the visitor into any form. Logged-in
+    users, other methods, visitors with pending flash messages and responses
+    that set cookies or aren't 200 always run the view. Responses vary on
+    Cookie so shared caches never hand an anonymous copy to a signed-in user.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated or len(get_messages(request)):
+            return view(request, *args, **kwargs)
+
+        key = _page_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content_type, content = cached
+            if CSRF_PLACEHOLDER in content:
+                content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Page-Cache'] = 'hit'
+        else:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies:
+                if response.streaming:
+                    # Keep streaming to this visitor and store the page once it's complete
+                    response.streaming_content = _tee_into_cache(
+                        response.streaming_content, key, response['Content-Type'], response.charset
+                    )
+                else:
+                    _store_page(key, response['Content-Type'], response.content.decode(response.charset))
+            response['X-Page-Cache'] = 'miss'
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+    return wrapper
+
+
+class _Fill:
+    """A computation in flight that other callers for the same key wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """
+    Bounded in-process LRU cache with single-flight fills.
+
+    Concurrent misses for the same key collapse into one call of the fill
+    function; the other callers block until it finishes and share its result.
+    """
+
+    def __init__(self, max_entries=512, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.fill_time = 0.0
+
+    def get_or_fill(self, key, fill):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = _Fill()
+
+        if not leader:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        started = time.perf_counter()
+        try:
+            pending.value = fill()
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                del self._inflight[key]
+                self.fills += 1
+                self.fill_time += elapsed
+                if pending.error is None:
+                    self._entries[key] = (time.monotonic() + self.ttl, pending.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            pending.event.set()
+
+        return pending.value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'fills': self.fills,
+                'avg_fill_ms': (self.fill_time / self.fills * 1000) if self.fills else 0.0,
+            }
+
+
+search_cache = ResultCache(
+    max_entries=getattr(settings, 'SEARCH_CACHE_MAX_ENTRIES', 512),
+    ttl=getattr(settings, 'SEARCH_CACHE_TTL', 300),
+)
+
+
+def normalize_search_params(query, language, genres):
+    """Normalise search parameters so equivalent queries share one cache entry"""
+    return (
+        query.strip().lower(),
+        language.strip(),
+        tuple(sorted({g.strip().lower() for g in genres if g.strip()})),
+    )
@@ -0,0 +1,51 @@
+"""
+Cached movie card markup shared by the browse pages.
+
+The card body (thumbnail, title, year, language and genres) is rendered once
+per movie version and reused by every page and user. Templates wrap it with
+the per-page bits (click handler, watchlist button); the watchlist state
+itself is applied client-side from the membership set in movies.watchlists.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .cache import get_movie_versions, movie_version_key
+
+CARD_TEMPLATE = 'movies/partials/movie_card.html'
+
+
+def _card_key(movie_id):
+    return f'movies:card:{movie_id}'
+
+
+def attach_movie_cards(*movie_lists):
+    """
+    Set `card_html` on every movie in `movie_lists`.
+
+    Versions and cached cards for all the movies come back in one multi-get;
+    only cards that are missing or out of date are rendered (which is where
+    thumbnail.url and get_genres_display run) and written back in one call.
+    """
+    movies = {movie.id: movie for movies in movie_lists for movie in movies}
+    if not movies:
+        return
+    cached = cache.get_many(
+        [movie_version_key(movie_id) for movie_id in movies] + [_card_key(movie_id) for movie_id in movies]
+    )
+    versions = get_movie_versions(movies, cached)
+
+    cards, stale = {}, {}
+    for movie_id, movie in movies.items():
+        entry = cached.get(_card_key(movie_id))
+        if entry is not None and entry[0] == versions[movie_id]:
+            cards[movie_id] = entry[1]
+        else:
+            cards[movie_id] = render_to_string(CARD_TEMPLATE, {'movie': movie})
+            stale[_card_key(movie_id)] = (versions[movie_id], cards[movie_id])
+    if stale:
+        cache.set_many(stale, settings.MOVIE_CARD_CACHE_TTL)
+
+    for movies in movie_lists:
+        for movie in movies:
+            movie.card_html = cards[movie.id]
@@ -0,0 +1,273 @@
+"""
+Content-based movie similarity from TF-IDF vectors.
+
+Each movie is reduced to weighted term counts over its description, cast,
+genres and language (stored in MovieContentTerms when the movie is saved).
+The build_content_model command rebuilds the TF-IDF matrix from those counts
+in one query, writes cosine neighbours to MovieSimilarity with kind='content'
+(so cold-start lookups for new movies and new users are a single indexed
+read) and saves the matrix with its vocabulary and idf weights to disk.
+
+Saving a movie only updates its MovieContentTerms row and rescored
+neighbour lists; the file is only written by full rebuilds, so any number
+of processes can refresh movies at once. Each refresh folds every terms row
+saved since the stored model was built into the matrix in memory, weighted
+with the stored idf; the vocabulary and idf stay as built until the next
+full rebuild.
+"""
+import math
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from .factorization import ReloadingFile
+from .models import Movie, MovieContentTerms, MovieSimilarity
+from .similarity import DEFAULT_TOP_K, store_neighbours
+
+FIELD_WEIGHTS = {
+    'genre': 3.0,
+    'cast': 2.0,
+    'lang': 2.0,
+    'text': 1.0,
+}
+
+STOP_WORDS = frozenset('''
+    a an and are as at be but by for from has have he her his in into is it its
+    of on or she that the their them they this to was were when where which who
+    will with after before about over under while hers our your you we
+'''.split())
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def extract_terms(movie):
+    """Weighted term counts for one movie (genres must be loadable)"""
+    terms = Counter()
+    for word in WORD_RE.findall((movie.description or '').lower()):
+        word = word.strip("'")
+        if len(word) > 2 and word not in STOP_WORDS:
+            terms[f'text:{word}'] += FIELD_WEIGHTS['text']
+    for name in (movie.cast or '').split(','):
+        name = ' '.join(name.lower().split())
+        if name and name != 'unknown':
+            terms[f'cast:{name}'] += FIELD_WEIGHTS['cast']
+    for genre in movie.genres.all():
+        terms[f'genre:{genre.name.lower()}'] += FIELD_WEIGHTS['genre']
+    if movie.language_id:
+        terms[f'lang:{movie.language_id}'] += FIELD_WEIGHTS['lang']
+    return dict(terms)
+
+
+def update_movie_terms(movie):
+    terms, _ = MovieContentTerms.objects.update_or_create(
+        movie=movie, defaults={'terms': extract_terms(movie)}
+    )
+    return terms
+
+
+def content_model_path():
+    return os.path.join(settings.RECOMMENDER_MODEL_DIR, 'content.npz')
+
+
+class ContentModel:
+    """TF-IDF rows of every movie with the vocabulary and idf they were weighted with"""
+
+    def __init__(self, matrix, movie_ids, terms, idf, built_at=0.0):
+        self.matrix = matrix
+        self.movie_ids = movie_ids
+        self.terms = terms
+        self.idf = idf
+        self.built_at = built_at  # epoch seconds; terms saved from then on aren't in the matrix
+        self._vocabulary = {term: i for i, term in enumerate(terms)}
+        self._movie_index = {int(m): i for i, m in enumerate(movie_ids)}
+
+    @classmethod
+    def from_file(cls, path):
+        with np.load(path) as data:
+            matrix = sparse.csr_matrix(
+                (data['data'], data['indices'], data['indptr']), shape=tuple(data['shape'])
+            )
+            built_at = float(data['built_at']) if 'built_at' in data.files else 0.0
+            return cls(matrix, data['movie_ids'], data['terms'], data['idf'], built_at)
+
+    def save(self, path):
+        """Write the model atomically so serving processes never see a partial file"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f, data=self.matrix.data, indices=self.matrix.indices, indptr=self.matrix.indptr,
+                shape=np.asarray(self.matrix.shape, dtype=np.int64), movie_ids=self.movie_ids,
+                terms=np.asarray(self.terms, dtype=str), idf=self.idf, built_at=self.built_at,
+            )
+        os.replace(tmp_path, path)
+        _model_file.reset()
+
+    def vectorize(self, terms):
+        """
+        L2-normalised TF-IDF row for one movie's term counts. Terms outside
+        the vocabulary are weighted as if only this movie had them; no
+        stored row shares them, so they only lower the movie's other scores.
+        """
+        unseen_idf = math.log((1 + len(self.movie_ids)) / 2) + 1.0
+        columns, values, norm = [], [], 0.0
+        for term, count in terms.items():
+            column = self._vocabulary.get(term)
+            value = (1.0 + math.log(count)) * (unseen_idf if column is None else self.idf[column])
+            norm += value * value
+            if column is not None:
+                columns.append(column)
+                values.append(value)
+        values = np.asarray(values, dtype=np.float32) / (math.sqrt(norm) or 1.0)
+        return sparse.csr_matrix(
+            (values, (np.zeros(len(columns), dtype=np.int64), columns)), shape=(1, len(self.terms))
+        )
+
+    def with_rows(self, rows, keep=None):
+        """
+        A copy with the rows in `rows` (movie id -> 1-row matrix) replacing
+        the movies' stored rows or appended for new movies, and without the
+        rows of movies not in `keep`, if given
+        """
+        new_ids = np.fromiter(rows, dtype=np.int64, count=len(rows))
+        kept = ~np.isin(self.movie_ids, new_ids)
+        if keep is not None:
+            kept &= np.isin(self.movie_ids, np.fromiter(keep, dtype=np.int64, count=len(keep)))
+        matrix = sparse.vstack([self.matrix[kept], *rows.values()], format='csr')
+        movie_ids = np.concatenate([self.movie_ids[kept], new_ids])
+        return ContentModel(matrix.astype(np.float32), movie_ids, self.terms, self.idf, self.built_at)
+
+    def position(self, movie_id):
+        """Row of the movie in the matrix, or None if it has none"""
+        return self._movie_index.get(movie_id)
+
+
+_model_file = ReloadingFile(content_model_path, ContentModel.from_file)
+
+
+def get_content_model():
+    """Return the process-wide ContentModel, or None if none was built"""
+    return _model_file.get()
+
+
+def build_tfidf():
+    """
+    Return a ContentModel with one L2-normalised TF-IDF row per movie.
+
+    Term frequencies are log-scaled and idf is smoothed, so very common
+    terms (a popular genre, generic words) carry little weight.
+    """
+    built_at = time.time()
+    rows = list(MovieContentTerms.objects.values_list('movie_id', 'terms'))
+    movie_ids = np.array([movie_id for movie_id, _ in rows], dtype=np.int64)
+    vocabulary, document_frequency = {}, Counter()
+    for _, terms in rows:
+        document_frequency.update(terms.keys())
+    for term in document_frequency:
+        vocabulary[term] = len(vocabulary)
+
+    n_docs = len(rows)
+    idf = np.array([
+        math.log((1 + n_docs) / (1 + document_frequency[term])) + 1.0 for term in vocabulary
+    ])
+    row_idx, col_idx, values = [], [], []
+    for i, (_, terms) in enumerate(rows):
+        for term, count in terms.items():
+            row_idx.append(i)
+            col_idx.append(vocabulary[term])
+            values.append((1.0 + math.log(count)) * idf[vocabulary[term]])
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(values, dtype=np.float32), (row_idx, col_idx)),
+        shape=(n_docs, len(vocabulary)),
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    matrix = sparse.diags(1.0 / norms).dot(matrix).tocsr().astype(np.float32)
+    return ContentModel(matrix, movie_ids, list(vocabulary), idf, built_at)
+
+
+def current_content_model():
+    """
+    The stored ContentModel with every terms row saved since it was built
+    folded in, and movies deleted since dropped; None if none was built
+    """
+    model = get_content_model()
+    if model is None:
+        return None
+    changed = MovieContentTerms.objects.filter(
+        updated_at__gte=datetime.fromtimestamp(model.built_at, tz=timezone.utc)
+    ).values_list('movie_id', 'terms')
+    live = set(MovieContentTerms.objects.values_list('movie_id', flat=True))
+    return model.with_rows({movie_id: model.vectorize(terms) for movie_id, terms in changed}, keep=live)
+
+
+def _neighbours(matrix, movie_ids, rows, k):
+    scores = matrix[rows].dot(matrix.T).toarray()
+    scores[np.arange(len(rows)), rows] = 0.0
+    neighbours = {}
+    top_k = min(k, scores.shape[1] - 1)
+    for offset, row in enumerate(rows):
+        if top_k <= 0:
+            neighbours[int(movie_ids[row])] = []
+            continue
+        picked = np.argpartition(-scores[offset], top_k - 1)[:top_k]
+        picked = picked[np.argsort(-scores[offset, picked])]
+        neighbours[int(movie_ids[row])] = [
+            (int(movie_ids[col]), float(scores[offset, col]))
+            for col in picked if scores[offset, col] > 0
+        ]
+    return neighbours
+
+
+def rebuild_content_model(k=DEFAULT_TOP_K, block_size=256):
+    """Re-extract terms for every movie, recompute all content neighbours and save the model"""
+    for movie in Movie.objects.prefetch_related('genres').iterator(chunk_size=500):
+        update_movie_terms(movie)
+
+    model = build_tfidf()
+    neighbours = {}
+    for start in range(0, len(model.movie_ids), block_size):
+        rows = np.arange(start, min(start + block_size, len(model.movie_ids)))
+        neighbours.update(_neighbours(model.matrix, model.movie_ids, rows, k))
+    stored = store_neighbours(neighbours, kind='content', replace_all=True)
+    model.save(content_model_path())
+    return len(neighbours), stored
+
+
+def refresh_movie_content(movie_id, k=DEFAULT_TOP_K):
+    """
+    Incrementally update the content model after one movie changed.
+
+    The movie's terms are re-extracted and saved, and the rows of movies
+    changed since the last build are recomputed in memory (see
+    current_content_model); the stored file is left alone. The movie's
+    neighbour list is then rescored, along with the lists of movies that
+    previously pointed at it or that it now points at, since those are the
+    lists its change can reorder. Without a stored model only the terms are
+    saved, for the next full rebuild.
+    """
+    movie = Movie.objects.prefetch_related('genres').filter(id=movie_id).first()
+    if movie is None:
+        return 0
+    update_movie_terms(movie)
+
+    model = current_content_model()
+    if model is None:
+        return 0
+
+    own = _neighbours(model.matrix, model.movie_ids, np.array([model.position(movie_id)]), k)
+    affected = set(
+        MovieSimilarity.objects.filter(kind='content', similar_movie_id=movie_id).values_list('movie_id', flat=True)
+    ) | {similar_id for similar_id, _ in own[movie_id]}
+    rows = np.array([row for row in map(model.position, affected) if row is not None], dtype=np.int64)
+    neighbours = dict(own)
+    if len(rows):
+        neighbours.update(_neighbours(model.matrix, model.movie_ids, rows, k))
+    return store_neighbours(neighbours, kind='content')
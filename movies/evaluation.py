@@ -0,0 +1,295 @@
+"""
+Offline evaluation of the recommendation strategies on synthetic data.
+
+A dataset is generated from a seed: movies with Zipf-distributed
+popularity, and users who prefer one or two genres and pick movies in
+proportion to popularity boosted by that preference. Every event gets a
+timestamp. Events before a global cutoff are written as UserInteraction
+rows. The events after it are the holdout each strategy has to predict.
+
+For every strategy the harness reports precision@k, recall@k and catalog
+coverage next to p50/p99 latency and the number of queries per call, so
+a change can be judged on quality and speed at once. It must run against
+a throwaway database; the evaluate_recommendations command sets one up.
+"""
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connection, reset_queries
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+
+from .models import Genre, Language, Movie, MovieSimilarity, UserInteraction
+
+SCALES = {
+    'small': {'users': 300, 'movies': 500, 'events_per_user': 20},
+    'medium': {'users': 3000, 'movies': 3000, 'events_per_user': 30},
+    'large': {'users': 20000, 'movies': 10000, 'events_per_user': 40},
+}
+
+GENRE_WORDS = {
+    'Action': 'chase explosion mission agent rescue fight heist escape',
+    'Comedy': 'wedding roommate prank awkward road trip mishap party',
+    'Drama': 'family grief ambition secret trial betrayal memory choice',
+    'Horror': 'haunted cabin ritual curse possessed shadow scream cellar',
+    'Romance': 'lovers letter summer reunion heartbreak proposal dance kiss',
+    'Thriller': 'conspiracy hostage witness stalker detective alibi ransom twist',
+    'Sci-Fi': 'starship android colony timeline alien signal planet clone',
+    'Fantasy': 'dragon kingdom wizard quest prophecy sword realm spell',
+    'Animation': 'talking toys adventure friendship forest village magic pup',
+    'Documentary': 'interview archive climate history investigation footage expedition portrait',
+    'Crime': 'gangster cartel robbery informant corruption precinct getaway smuggler',
+    'Mystery': 'clue disappearance manor puzzle inheritance locked riddle inspector',
+}
+GENRE_WORDS = {genre: words.split() for genre, words in GENRE_WORDS.items()}
+
+LANGUAGES = [('English', 'en', 0.6), ('Spanish', 'es', 0.15), ('Hindi', 'hi', 0.15), ('Japanese', 'ja', 0.1)]
+
+# (interaction_type, probability); review scores are the drawn rating
+INTERACTION_MIX = [('watch', 0.7), ('watchlist', 0.2), ('review', 0.1)]
+INTERACTION_SCORES = {'watch': 2.0, 'watchlist': 1.0}
+
+
+@dataclass
+class Dataset:
+    movie_ids: list
+    user_ids: list
+    train_count: int
+    seen: dict = field(default_factory=dict)
+    holdout: dict = field(default_factory=dict)
+
+
+def generate_dataset(users, movies, events_per_user, holdout=0.2, zipf=1.1, seed=0, batch_size=5000):
+    """
+    Write a synthetic catalog and the training interactions, return a Dataset.
+
+    `holdout` is the fraction of events, by time, kept out of the database.
+    """
+    rng = np.random.default_rng(seed)
+    genres = [Genre.objects.get_or_create(name=name)[0] for name in GENRE_WORDS]
+    languages = [Language.objects.get_or_create(name=name, code=code)[0] for name, code, _ in LANGUAGES]
+    language_weights = np.array([weight for _, _, weight in LANGUAGES])
+
+    movie_genres = [
+        rng.choice(len(genres), size=rng.integers(1, 4), replace=False) for _ in range(movies)
+    ]
+    genre_matrix = np.zeros((movies, len(genres)), dtype=bool)
+    for movie, picked in enumerate(movie_genres):
+        genre_matrix[movie, picked] = True
+    popularity = 1.0 / np.arange(1, movies + 1) ** zipf
+    rng.shuffle(popularity)
+
+    # Sample every user's events over movie positions
+    preference_cache = {}
+    event_user, event_movie, event_time, event_type, event_score = [], [], [], [], []
+    for user in range(users):
+        preferred = tuple(sorted(rng.choice(len(genres), size=rng.integers(1, 3), replace=False)))
+        if preferred not in preference_cache:
+            weights = popularity * (1.0 + 4.0 * genre_matrix[:, preferred].any(axis=1))
+            preference_cache[preferred] = weights / weights.sum()
+        count = min(movies, 1 + rng.poisson(events_per_user))
+        picked = rng.choice(movies, size=count, replace=False, p=preference_cache[preferred])
+        types = rng.choice(len(INTERACTION_MIX), size=count, p=[p for _, p in INTERACTION_MIX])
+        for movie, type_index in zip(picked, types):
+            interaction_type = INTERACTION_MIX[type_index][0]
+            event_user.append(user)
+            event_movie.append(int(movie))
+            event_time.append(rng.random())
+            event_type.append(interaction_type)
+            event_score.append(
+                float(rng.integers(3, 6)) if interaction_type == 'review'
+                else INTERACTION_SCORES[interaction_type]
+            )
+    cutoff = np.quantile(event_time, 1.0 - holdout) if event_time else 1.0
+    is_train = np.asarray(event_time) < cutoff
+
+    # Movie stats reflect the training period only, as they would in production
+    views = np.zeros(movies, dtype=np.int64)
+    rating_sum, rating_count = np.zeros(movies), np.zeros(movies)
+    for movie, interaction_type, score, train in zip(event_movie, event_type, event_score, is_train):
+        if not train:
+            continue
+        if interaction_type == 'watch':
+            views[movie] += 1
+        elif interaction_type == 'review':
+            rating_sum[movie] += score
+            rating_count[movie] += 1
+
+    movie_objects = []
+    for movie in range(movies):
+        names = [genres[g].name for g in movie_genres[movie]]
+        words = [str(w) for name in names for w in rng.choice(GENRE_WORDS[name], size=4)]
+        cast = ', '.join(f'{names[0]} Actor {rng.integers(0, 25)}' for _ in range(2))
+        movie_objects.append(Movie(
+            title=f'Synthetic {movie}',
+            year=int(rng.integers(1970, 2026)),
+            description=' '.join(words),
+            thumbnail='thumbnails/synthetic.jpg',
+            video='movies/synthetic.mp4',
+            language=languages[rng.choice(len(languages), p=language_weights)],
+            cast=cast,
+            review_stars=float(rating_sum[movie] / rating_count[movie]) if rating_count[movie] else 0.0,
+            views=int(views[movie]),
+        ))
+    movie_ids = [m.id for m in Movie.objects.bulk_create(movie_objects, batch_size=batch_size)]
+    MovieGenre = Movie.genres.through
+    MovieGenre.objects.bulk_create([
+        MovieGenre(movie_id=movie_ids[movie], genre_id=genres[g].id)
+        for movie in range(movies) for g in movie_genres[movie]
+    ], batch_size=batch_size)
+
+    user_ids = [u.id for u in User.objects.bulk_create(
+        [User(username=f'synthetic_{seed}_{user}') for user in range(users)], batch_size=batch_size,
+    )]
+
+    dataset = Dataset(movie_ids, user_ids, train_count=int(is_train.sum()))
+    train_rows = []
+    for user, movie, interaction_type, score, train in zip(
+            event_user, event_movie, event_type, event_score, is_train):
+        user_id, movie_id = user_ids[user], movie_ids[movie]
+        if train:
+            dataset.seen.setdefault(user_id, set()).add(movie_id)
+            train_rows.append(UserInteraction(
+                user_id=user_id, movie_id=movie_id, interaction_type=interaction_type, score=score,
+            ))
+        else:
+            dataset.holdout.setdefault(user_id, set()).add(movie_id)
+    UserInteraction.objects.bulk_create(train_rows, batch_size=batch_size)
+    return dataset
+
+
+class Strategy:
+    """A named way of producing top-k movie ids for a user"""
+    name = None
+
+    def __init__(self, **options):
+        self.options = options
+
+    def prepare(self, dataset):
+        """Build whatever offline model the strategy serves from"""
+
+    def recommend(self, user, seen, k):
+        raise NotImplementedError
+
+
+class CurrentStrategy(Strategy):
+    """Movie.get_recommendations_for_user exactly as the site calls it"""
+    name = 'current'
+
+    def recommend(self, user, seen, k):
+        return [movie.id for movie in Movie.get_recommendations_for_user(user, limit=k)]
+
+
+class PopularStrategy(Strategy):
+    """Non-personalised baseline"""
+    name = 'popular'
+
+    def recommend(self, user, seen, k):
+        return list(Movie.objects.filter(is_published=True).exclude(id__in=seen).order_by(
+            '-review_stars', '-views'
+        ).values_list('id', flat=True)[:k])
+
+
+class ItemItemStrategy(Strategy):
+    """Summed precomputed item-item neighbour scores of the user's movies"""
+    name = 'item'
+
+    def prepare(self, dataset):
+        from .similarity import rebuild_similarities
+        rebuild_similarities()
+
+    def recommend(self, user, seen, k):
+        return list(MovieSimilarity.objects.filter(
+            kind='item', movie_id__in=seen, similar_movie__is_published=True
+        ).exclude(similar_movie_id__in=seen).values('similar_movie_id').annotate(
+            total=Sum('score')
+        ).order_by('-total').values_list('similar_movie_id', flat=True)[:k])
+
+
+class FactorizationStrategy(Strategy):
+    """ALS embeddings scored in process; options are passed to train_als"""
+    name = 'als'
+
+    def prepare(self, dataset):
+        from .factorization import get_model, model_path, save_model, train_als
+        from .similarity import load_interaction_matrix
+        matrix, movie_ids, user_ids = load_interaction_matrix()
+        user_factors, item_factors = train_als(matrix, **self.options)
+        save_model(model_path(), user_factors, item_factors, user_ids, movie_ids)
+        self.model = get_model()
+
+    def recommend(self, user, seen, k):
+        if not self.model.has_user(user.id):
+            return []
+        return [movie_id for movie_id, _ in self.model.recommend(user.id, exclude_ids=seen, limit=k)]
+
+
+class ContentStrategy(Strategy):
+    """TF-IDF content neighbours via Movie.get_content_based"""
+    name = 'content'
+
+    def prepare(self, dataset):
+        from .content import rebuild_content_model
+        rebuild_content_model()
+
+    def recommend(self, user, seen, k):
+        return [movie.id for movie in Movie.get_content_based(list(seen), limit=k)]
+
+
+# 'current' goes first: once 'als' has saved a model, the site path serves from it
+STRATEGIES = [CurrentStrategy, PopularStrategy, ItemItemStrategy, FactorizationStrategy, ContentStrategy]
+
+
+def evaluate(strategy, dataset, user_ids, k=10):
+    """Replay the holdout of `user_ids` against one prepared strategy"""
+    users = User.objects.in_bulk(user_ids)
+    precision, recall, latencies, queries = [], [], [], []
+    recommended = set()
+    for user_id in user_ids:
+        seen = dataset.seen.get(user_id, set())
+        # A full query log (e.g. after a long prepare() under DEBUG) would read as zero queries
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            ids = strategy.recommend(users[user_id], seen, k)[:k]
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        hits = len(set(ids) & dataset.holdout[user_id])
+        precision.append(hits / k)
+        recall.append(hits / len(dataset.holdout[user_id]))
+        recommended.update(ids)
+    return {
+        'strategy': strategy.name,
+        'precision': float(np.mean(precision)),
+        'recall': float(np.mean(recall)),
+        'coverage': len(recommended) / len(dataset.movie_ids),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'queries': float(np.mean(queries)),
+    }
+
+
+def run_evaluation(dataset, strategies=None, k=10, eval_users=200, seed=0, callback=None):
+    """
+    Prepare and evaluate each strategy on the same sampled users.
+
+    Returns one result row per strategy, with the time spent in prepare()
+    as 'build_s'. `callback(row)` is called as each row is finished.
+    """
+    rng = np.random.default_rng(seed)
+    candidates = sorted(user_id for user_id in dataset.holdout if dataset.seen.get(user_id))
+    user_ids = [int(u) for u in rng.choice(candidates, size=min(eval_users, len(candidates)), replace=False)]
+
+    rows = []
+    for strategy in strategies or [strategy_class() for strategy_class in STRATEGIES]:
+        started = time.perf_counter()
+        strategy.prepare(dataset)
+        build_seconds = time.perf_counter() - started
+        row = evaluate(strategy, dataset, user_ids, k=k)
+        row['build_s'] = build_seconds
+        rows.append(row)
+        if callback:
+            callback(row)
+    return rows
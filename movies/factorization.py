@@ -0,0 +1,204 @@
+"""
+Implicit-feedback matrix factorization (ALS) for user recommendations.
+
+Training follows Hu, Koren & Volinsky: every summed interaction score w
+becomes a confidence 1 + alpha * w on a binary preference, and user and
+movie factors are solved alternately with ridge regression. Each half-step
+splits the rows into blocks solved on a thread pool (LAPACK releases the
+GIL). Factors are stored as float32 in a single .npz file, so serving is a
+dot product against the movie factors plus filtering of already-seen ids.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+DEFAULT_FACTORS = 64
+DEFAULT_ITERATIONS = 15
+DEFAULT_REGULARIZATION = 0.1
+DEFAULT_ALPHA = 40.0
+SOLVE_BLOCK_SIZE = 512
+
+
+def model_path():
+    return os.path.join(settings.RECOMMENDER_MODEL_DIR, 'als.npz')
+
+
+def _solve_rows(confidence, fixed, gram, regularization, rows, out):
+    """Solve the least-squares update for `rows` of `confidence` in place"""
+    identity = regularization * np.eye(fixed.shape[1], dtype=np.float64)
+    indptr, indices, data = confidence.indptr, confidence.indices, confidence.data
+    for row in rows:
+        start, end = indptr[row], indptr[row + 1]
+        if start == end:
+            out[row] = 0.0
+            continue
+        factors = fixed[indices[start:end]]
+        weights = data[start:end]
+        # A = YtY + Yt (Cu - I) Y + lambda I,  b = Yt Cu p(u) with p(u) = 1
+        a = gram + (factors.T * weights) @ factors + identity
+        b = factors.T @ (1.0 + weights)
+        out[row] = np.linalg.solve(a, b)
+
+
+def _half_step(confidence, fixed, regularization, out, executor):
+    gram = fixed.T @ fixed
+    blocks = [
+        range(start, min(start + SOLVE_BLOCK_SIZE, confidence.shape[0]))
+        for start in range(0, confidence.shape[0], SOLVE_BLOCK_SIZE)
+    ]
+    futures = [
+        executor.submit(_solve_rows, confidence, fixed, gram, regularization, block, out)
+        for block in blocks
+    ]
+    for future in futures:
+        future.result()
+
+
+def train_als(matrix, factors=DEFAULT_FACTORS, iterations=DEFAULT_ITERATIONS,
+              regularization=DEFAULT_REGULARIZATION, alpha=DEFAULT_ALPHA,
+              workers=None, seed=0, callback=None):
+    """
+    Learn (user_factors, item_factors) from a movie x user weight matrix.
+
+    `callback(iteration, seconds)` is called after every full iteration.
+    """
+    item_confidence = matrix.tocsr().astype(np.float64) * alpha
+    user_confidence = item_confidence.T.tocsr()
+    n_items, n_users = item_confidence.shape
+
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(scale=0.01, size=(n_users, factors))
+    item_factors = rng.normal(scale=0.01, size=(n_items, factors))
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for iteration in range(iterations):
+            started = time.perf_counter()
+            _half_step(user_confidence, item_factors, regularization, user_factors, executor)
+            _half_step(item_confidence, user_factors, regularization, item_factors, executor)
+            if callback:
+                callback(iteration + 1, time.perf_counter() - started)
+
+    return user_factors.astype(np.float32), item_factors.astype(np.float32)
+
+
+def save_model(path, user_factors, item_factors, user_ids, movie_ids):
+    """Write the model atomically so serving processes never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    trained_at = timezone.now().timestamp()
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            user_factors=user_factors,
+            item_factors=item_factors,
+            user_ids=np.asarray(user_ids, dtype=np.int64),
+            movie_ids=np.asarray(movie_ids, dtype=np.int64),
+            trained_at=np.float64(trained_at),
+        )
+    os.replace(tmp_path, path)
+    reset_model_cache()
+    return FactorModel.from_file(path)
+
+
+class FactorModel:
+    """User and movie embeddings loaded from a trained .npz file"""
+
+    def __init__(self, user_factors, item_factors, user_ids, movie_ids, trained_at):
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.user_ids = user_ids
+        self.movie_ids = movie_ids
+        self.trained_at = trained_at
+        self._user_index = {int(u): i for i, u in enumerate(user_ids)}
+        self._movie_index = {int(m): i for i, m in enumerate(movie_ids)}
+
+    @classmethod
+    def from_file(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['user_factors'],
+                data['item_factors'],
+                data['user_ids'],
+                data['movie_ids'],
+                datetime.fromtimestamp(float(data['trained_at']), tz=dt_timezone.utc),
+            )
+
+    def has_user(self, user_id):
+        return user_id in self._user_index
+
+    def user_vector(self, user_id):
+        return self.user_factors[self._user_index[user_id]]
+
+    def movie_vector(self, movie_id):
+        index = self._movie_index.get(movie_id)
+        return None if index is None else self.item_factors[index]
+
+    def recommend(self, user_id, exclude_ids=(), limit=6):
+        """Return [(movie_id, score)] ranked by dot product, skipping exclude_ids"""
+        scores = self.item_factors @ self.user_vector(user_id)
+        excluded = [self._movie_index[m] for m in exclude_ids if m in self._movie_index]
+        scores[excluded] = -np.inf
+
+        limit = min(limit, len(scores) - len(excluded))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.movie_ids[i]), float(scores[i])) for i in top]
+
+
+class ReloadingFile:
+    """
+    Process-wide cache of an object loaded from a file on disk.
+
+    The file's mtime is re-checked at most every `interval` seconds, so a
+    newly written file is picked up by running workers without a restart.
+    """
+
+    def __init__(self, path_fn, loader, interval=30):
+        self.path_fn = path_fn
+        self.loader = loader
+        self.interval = interval
+        self._value = None
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self._last_check and now - self._last_check < self.interval:
+            return self._value
+
+        with self._lock:
+            self._last_check = now
+            try:
+                mtime = os.path.getmtime(self.path_fn())
+            except OSError:
+                self._value = self._mtime = None
+                return None
+            if mtime != self._mtime:
+                self._value = self.loader(self.path_fn())
+                self._mtime = mtime
+            return self._value
+
+    def reset(self):
+        self._last_check = 0.0
+
+
+_model_file = ReloadingFile(model_path, FactorModel.from_file)
+
+
+def get_model():
+    """Return the process-wide FactorModel, or None if nothing was trained"""
+    return _model_file.get()
+
+
+def reset_model_cache():
+    """Force the next get_model() call to re-check the model file"""
+    _model_file.reset()
@@ -0,0 +1,238 @@
+"""
+Precomputed per-genre and per-language leaderboards.
+
+A movie's leaderboard score blends its Bayesian-averaged rating (the
+mean of its reviews shrunk towards the catalog mean by PRIOR_WEIGHT
+pseudo-reviews) with log-scaled popularity. Serving any page of any board
+is a single indexed read of LeaderboardEntry.
+
+The catalog mean and the highest view count are kept in the cache: review
+changes shift the rating totals there as they commit, and they are
+recomputed from the catalog when missing or after STATS_TTL. When a
+movie's reviews or views change, update_board_entry() re-scores just that
+movie against the stored board and rewrites only the ranks it moved
+across. A board is rebuilt in full when the movie's change can't be
+applied on its own: the catalog stats moved since the board's scores were
+computed (every score depends on them), or the movie dropped off a full
+board. Boards a movie leaves (a genre removed, a new language, the movie
+deleted) are rebuilt after the change commits; build_leaderboards rebuilds
+every board from scratch.
+"""
+import math
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Sum
+
+from .background import debounce, throttle
+from .models import Genre, Language, LeaderboardEntry, Movie
+
+PRIOR_WEIGHT = 10  # pseudo-reviews at the catalog mean added to every movie
+RATING_WEIGHT = 0.7
+POPULARITY_WEIGHT = 0.3
+LEADERBOARD_SIZE = 100
+PAGE_SIZE = 20
+STATS_TTL = 3600  # seconds before the cached catalog stats are recomputed
+
+RATING_SUM_KEY = 'movies:leaderboards:rating_sum'
+RATING_COUNT_KEY = 'movies:leaderboards:rating_count'
+MAX_VIEWS_KEY = 'movies:leaderboards:max_views'
+STATS_KEYS = [RATING_SUM_KEY, RATING_COUNT_KEY, MAX_VIEWS_KEY]
+
+_board_lock = threading.Lock()  # board writes read the stored ranks first
+
+
+def bayesian_rating(rating_sum, rating_count, prior_mean, prior_weight=PRIOR_WEIGHT):
+    return (prior_weight * prior_mean + rating_sum) / (prior_weight + rating_count)
+
+
+def _board_stats_key(kind, key):
+    return f'movies:leaderboards:board:{kind}:{key}'
+
+
+def catalog_stats():
+    """(prior mean, highest published view count), cached for STATS_TTL"""
+    stats = cache.get_many(STATS_KEYS)
+    if len(stats) < len(STATS_KEYS):
+        totals = Movie.objects.aggregate(Sum('rating_sum'), Sum('rating_count'))
+        stats = {
+            RATING_SUM_KEY: totals['rating_sum__sum'] or 0,
+            RATING_COUNT_KEY: totals['rating_count__sum'] or 0,
+            MAX_VIEWS_KEY: Movie.objects.filter(is_published=True).aggregate(Max('views'))['views__max'] or 0,
+        }
+        cache.set_many(stats, STATS_TTL)
+    return stats[RATING_SUM_KEY] / (stats[RATING_COUNT_KEY] or 1), stats[MAX_VIEWS_KEY]
+
+
+def record_rating_change(added=None, removed=None):
+    """Shift the cached rating totals by one review change (see Movie.apply_rating_change)"""
+    count_delta = (added is not None) - (removed is not None)
+    sum_delta = (added or 0) - (removed or 0)
+    try:
+        if count_delta:
+            cache.incr(RATING_COUNT_KEY, count_delta)
+        if sum_delta:
+            cache.incr(RATING_SUM_KEY, sum_delta)
+    except ValueError:
+        # Not cached any more; drop both so the next read recomputes them together
+        forget_catalog_stats()
+
+
+def forget_catalog_stats():
+    cache.delete_many(STATS_KEYS)
+
+
+def movie_score(rating_sum, rating_count, views, prior_mean, max_views):
+    """(leaderboard score, Bayesian rating) of one movie"""
+    rating = bayesian_rating(rating_sum, rating_count, prior_mean)
+    popularity = math.log1p(views) / math.log1p(max_views) if max_views else 0.0
+    return RATING_WEIGHT * rating / 5.0 + POPULARITY_WEIGHT * popularity, rating
+
+
+def _board_movies(kind, key):
+    movies = Movie.objects.filter(is_published=True)
+    if kind == 'genre':
+        return movies.filter(genres__id=key)
+    return movies.filter(language_id=key)
+
+
+def refresh_board(kind, key, size=LEADERBOARD_SIZE):
+    """Recompute and store one leaderboard; returns the number of entries"""
+    prior_mean, max_views = catalog_stats()
+    rows = _board_movies(kind, key).values_list('id', 'rating_sum', 'rating_count', 'views')
+
+    ranked = []
+    for movie_id, rating_sum, rating_count, views in rows:
+        score, rating = movie_score(rating_sum, rating_count, views, prior_mean, max_views)
+        ranked.append((score, rating, movie_id))
+    ranked.sort(reverse=True)
+
+    with _board_lock, transaction.atomic():
+        LeaderboardEntry.objects.filter(kind=kind, key=key).delete()
+        LeaderboardEntry.objects.bulk_create([
+            LeaderboardEntry(kind=kind, key=key, rank=rank, movie_id=movie_id,
+                             score=score, bayesian_rating=rating)
+            for rank, (score, rating, movie_id) in enumerate(ranked[:size], start=1)
+        ])
+        # The stats the stored scores were computed with
+        cache.set(_board_stats_key(kind, key), (prior_mean, max_views), None)
+    return min(len(ranked), size)
+
+
+def update_board_entry(kind, key, movie, size=LEADERBOARD_SIZE):
+    """
+    Re-rank one movie within a stored board, rewriting only the ranks that
+    changed. Returns False, leaving the board alone, when that isn't enough:
+    the board was never built, its scores were computed with other catalog
+    stats, or the movie left or sank to the bottom of a full board and an
+    unlisted movie may belong in its place.
+    """
+    prior_mean, max_views = catalog_stats()
+    with _board_lock, transaction.atomic():
+        if cache.get(_board_stats_key(kind, key)) != (prior_mean, max_views):
+            return False
+        entries = LeaderboardEntry.objects.filter(kind=kind, key=key).order_by('rank')
+        stored = {rank: (movie_id, score, rating) for rank, movie_id, score, rating in entries.values_list(
+            'rank', 'movie_id', 'score', 'bayesian_rating'
+        )}
+        if not stored:
+            return False
+
+        ranked = [(score, rating, movie_id) for movie_id, score, rating in stored.values() if movie_id != movie.id]
+        if movie.is_published:
+            score, rating = movie_score(movie.rating_sum, movie.rating_count, movie.views, prior_mean, max_views)
+            ranked.append((score, rating, movie.id))
+            ranked.sort(reverse=True)
+        updated = {rank: (movie_id, score, rating) for rank, (score, rating, movie_id) in enumerate(ranked[:size], start=1)}
+
+        was_listed = any(movie_id == movie.id for movie_id, _, _ in stored.values())
+        if was_listed and len(stored) >= size and (not movie.is_published or updated[size][0] == movie.id):
+            # It left or sank to the bottom of a full board, where a movie
+            # that isn't listed may now outrank it
+            return False
+
+        changed = [rank for rank in stored.keys() | updated.keys() if stored.get(rank) != updated.get(rank)]
+        LeaderboardEntry.objects.filter(kind=kind, key=key, rank__in=changed).delete()
+        LeaderboardEntry.objects.bulk_create([
+            LeaderboardEntry(kind=kind, key=key, rank=rank, movie_id=updated[rank][0],
+                             score=updated[rank][1], bayesian_rating=updated[rank][2])
+            for rank in changed if rank in updated
+        ])
+    return True
+
+
+def movie_boards(movie):
+    """(kind, key) of every board the movie belongs to"""
+    boards = [('genre', genre_id) for genre_id in movie.genres.values_list('id', flat=True)]
+    if movie.language_id:
+        boards.append(('language', movie.language_id))
+    return boards
+
+
+def refresh_boards_for_movie(movie_id):
+    """Bring every board the movie currently belongs to up to date with it"""
+    movie = Movie.objects.filter(id=movie_id).only(
+        'id', 'language', 'is_published', 'rating_sum', 'rating_count', 'views'
+    ).first()
+    if movie is None:
+        return
+
+    _, max_views = catalog_stats()
+    if movie.is_published and movie.views > max_views:
+        # Every popularity score is scaled by the highest view count, so
+        # update_board_entry() will rebuild the boards in full
+        cache.set(MAX_VIEWS_KEY, movie.views, STATS_TTL)
+    for kind, key in movie_boards(movie):
+        if not update_board_entry(kind, key, movie):
+            refresh_board(kind, key)
+
+
+def schedule_board_refresh(kind, key):
+    """Rebuild one board once the current transaction commits, e.g. after a movie left it"""
+    transaction.on_commit(lambda: debounce(('leaderboard', kind, key), 0, refresh_board, kind, key))
+
+
+def schedule_movie_boards(movie_id):
+    """
+    Background update of a movie's boards once the change commits, at most
+    once per LEADERBOARD_REFRESH_INTERVAL
+    """
+    delay = getattr(settings, 'LEADERBOARD_REFRESH_INTERVAL', 60)
+    transaction.on_commit(lambda: throttle(('leaderboards', movie_id), delay, refresh_boards_for_movie, movie_id))
+
+
+def rebuild_leaderboards():
+    """Recompute every genre and language board; returns the number of boards"""
+    forget_catalog_stats()
+    boards = [('genre', key) for key in Genre.objects.values_list('id', flat=True)]
+    boards += [('language', key) for key in Language.objects.values_list('id', flat=True)]
+    with transaction.atomic():
+        LeaderboardEntry.objects.exclude(
+            kind='genre', key__in=[key for kind, key in boards if kind == 'genre']
+        ).exclude(
+            kind='language', key__in=[key for kind, key in boards if kind == 'language']
+        ).delete()
+    for kind, key in boards:
+        refresh_board(kind, key)
+    return len(boards)
+
+
+def get_leaderboard_page(kind, key, page=1, page_size=PAGE_SIZE):
+    """
+    One page of a board as LeaderboardEntry rows with their movies loaded.
+    Entries of movies that left the board or were unpublished since it was
+    stored are skipped until the board is rebuilt.
+    """
+    start = (page - 1) * page_size
+    entries = LeaderboardEntry.objects.filter(
+        kind=kind, key=key,
+        rank__gt=start, rank__lte=start + page_size,
+        movie__is_published=True,
+    )
+    if kind == 'genre':
+        entries = entries.filter(movie__genres__id=key)
+    else:
+        entries = entries.filter(movie__language_id=key)
+    return list(entries.select_related('movie', 'movie__language').order_by('rank'))
@@ -0,0 +1,257 @@
+"""
+Synthetic production-scale data for load and scale testing.
+
+Users, movies (with genres, languages and placeholder media paths) and
+payments are created with bulk_create. Per-user activity follows a
+log-normal distribution and movie picks follow a Zipf distribution, so a
+few titles and heavy users dominate as they do in real traffic. Every
+picked (user, movie) pair is a watch. Some pairs also get a review and
+some a watchlist entry, and each of those rows has a matching
+UserInteraction row.
+
+User ranges are generated in parallel by worker threads. Each range has
+its own RNG derived from (seed, range index), so the output does not
+depend on the worker count. The large tables are written with plain
+executemany inserts, one transaction per batch.
+"""
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from home.models import Payment
+from .cache import bump_catalog_version
+from .evaluation import GENRE_WORDS, LANGUAGES
+from .models import Genre, Language, Movie, Review, UserInteraction, WatchHistory, Watchlist
+
+REVIEW_RATE = 0.15
+WATCHLIST_RATE = 0.2
+WATCH_SCORE = 2.0
+WATCHLIST_SCORE = 1.0
+ACTIVITY_SIGMA = 1.0
+USERS_PER_RANGE = 2000
+OVERSAMPLE = 3
+PLACEHOLDER_THUMBNAIL = 'thumbnails/placeholder.jpg'
+PLACEHOLDER_VIDEO = 'movies/placeholder.mp4'
+
+
+def username_prefix(seed):
+    return f'load_{seed}_'
+
+
+def _insert(model, fields, rows, batch_size):
+    """executemany INSERT of plain tuples, one transaction per batch"""
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(f).column) for f in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    sql = f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+    for start in range(0, len(rows), batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def _timestamps(rng, count, start, end):
+    """Uniform random datetimes in [start, end) as database-ready strings"""
+    offsets = rng.integers(0, int((end - start).total_seconds() * 1e6), size=count)
+    values = np.datetime64(start.replace(tzinfo=None), 'us') + offsets.astype('timedelta64[us]')
+    strings = np.char.replace(np.datetime_as_string(values, unit='us'), 'T', ' ')
+    # SQLite stores naive UTC, other backends want an explicit offset
+    suffix = '' if connection.vendor == 'sqlite' else '+00:00'
+    return [f'{s}{suffix}' for s in strings.tolist()]
+
+
+class _Catalog:
+    """Shared, read-only inputs for the range workers"""
+
+    def __init__(self, movie_ids, popularity_cdf, quality, user_ids, pairs_per_user, start, end):
+        self.movie_ids = movie_ids
+        self.popularity_cdf = popularity_cdf
+        self.quality = quality
+        self.user_ids = user_ids
+        self.pairs_per_user = pairs_per_user
+        self.start = start
+        self.end = end
+
+
+def _generate_range(catalog, seed, range_index, batch_size, write_lock):
+    """Generate and write every activity row of one user range"""
+    rng = np.random.default_rng([seed, range_index])
+    first = range_index * USERS_PER_RANGE
+    user_ids = catalog.user_ids[first:first + USERS_PER_RANGE]
+    n_movies = len(catalog.movie_ids)
+
+    activity = rng.lognormal(0.0, ACTIVITY_SIGMA, size=len(user_ids)) / np.exp(ACTIVITY_SIGMA ** 2 / 2)
+    counts = np.minimum(rng.poisson(catalog.pairs_per_user * activity), n_movies)
+    # Heavy users re-pick popular titles often, so draw extra picks, collapse
+    # repeats into one (user, movie) pair and keep a random `counts` of them
+    users = np.repeat(np.arange(len(user_ids)), counts * OVERSAMPLE)
+    movies = np.minimum(np.searchsorted(catalog.popularity_cdf, rng.random(len(users))), n_movies - 1)
+    pairs = np.unique(users.astype(np.int64) * n_movies + movies)
+    users = pairs // n_movies
+    order = np.lexsort((rng.random(len(pairs)), users))
+    starts = np.searchsorted(users[order], np.arange(len(user_ids)))
+    rank = np.arange(len(pairs)) - starts[users[order]]
+    pairs = np.sort(pairs[order][rank < counts[users[order]]])
+    users, movies = pairs // n_movies, pairs % n_movies
+
+    user_col = np.asarray(user_ids, dtype=np.int64)[users].tolist()
+    movie_col = catalog.movie_ids[movies].tolist()
+    watched_at = _timestamps(rng, len(pairs), catalog.start, catalog.end)
+    reviewed = np.flatnonzero(rng.random(len(pairs)) < REVIEW_RATE)
+    listed = np.flatnonzero(rng.random(len(pairs)) < WATCHLIST_RATE)
+    ratings = np.clip(np.rint(catalog.quality[movies[reviewed]] + rng.normal(0, 1, len(reviewed))), 1, 5).astype(int)
+
+    watch_rows = list(zip(user_col, movie_col, watched_at))
+    review_rows = [
+        (user_col[i], movie_col[i], int(r), 'Synthetic review.', watched_at[i], watched_at[i])
+        for i, r in zip(reviewed.tolist(), ratings.tolist())
+    ]
+    watchlist_rows = [(user_col[i], movie_col[i], watched_at[i]) for i in listed.tolist()]
+    interaction_rows = (
+        [(u, m, 'watch', WATCH_SCORE, t) for u, m, t in watch_rows]
+        + [(u, m, 'review', float(r), t) for u, m, r, _, t, _ in review_rows]
+        + [(u, m, 'watchlist', WATCHLIST_SCORE, t) for u, m, t in watchlist_rows]
+    )
+
+    try:
+        with write_lock:
+            _insert(WatchHistory, ['user', 'movie', 'watched_at'], watch_rows, batch_size)
+            _insert(Review, ['user', 'movie', 'rating', 'review_text', 'created_at', 'updated_at'],
+                    review_rows, batch_size)
+            _insert(Watchlist, ['user', 'movie', 'added_on'], watchlist_rows, batch_size)
+            _insert(UserInteraction, ['user', 'movie', 'interaction_type', 'score', 'created_at'],
+                    interaction_rows, batch_size)
+    finally:
+        connection.close()
+
+    return {
+        'views': np.bincount(movies, minlength=n_movies),
+        'star_counts': np.bincount(movies[reviewed] * 5 + ratings - 1, minlength=n_movies * 5).reshape(n_movies, 5),
+        'watch_history': len(watch_rows),
+        'reviews': len(review_rows),
+        'watchlist': len(watchlist_rows),
+        'interactions': len(interaction_rows),
+    }
+
+
+def _create_movies(rng, count, batch_size):
+    genres = [Genre.objects.get_or_create(name=name)[0] for name in GENRE_WORDS]
+    languages = [Language.objects.get_or_create(code=code, defaults={'name': name})[0] for name, code, _ in LANGUAGES]
+    language_weights = np.array([weight for _, _, weight in LANGUAGES])
+
+    movie_genres = [rng.choice(len(genres), size=rng.integers(1, 4), replace=False) for _ in range(count)]
+    movie_objects = []
+    for position, picked in enumerate(movie_genres):
+        names = [genres[g].name for g in picked]
+        movie_objects.append(Movie(
+            title=f'Load Test Movie {position}',
+            year=int(rng.integers(1970, 2026)),
+            description=' '.join(str(w) for name in names for w in rng.choice(GENRE_WORDS[name], size=4)),
+            thumbnail=PLACEHOLDER_THUMBNAIL,
+            video=PLACEHOLDER_VIDEO,
+            language=languages[rng.choice(len(languages), p=language_weights)],
+            cast=', '.join(f'{names[0]} Actor {rng.integers(0, 50)}' for _ in range(2)),
+        ))
+    movie_ids = np.array(
+        [m.id for m in Movie.objects.bulk_create(movie_objects, batch_size=batch_size)], dtype=np.int64,
+    )
+    MovieGenre = Movie.genres.through
+    MovieGenre.objects.bulk_create([
+        MovieGenre(movie_id=int(movie_ids[position]), genre_id=genres[g].id)
+        for position, picked in enumerate(movie_genres) for g in picked
+    ], batch_size=batch_size)
+    return movie_ids
+
+
+def _create_users(rng, count, seed, password, paid_fraction, batch_size):
+    password_hash = make_password(password)
+    prefix = username_prefix(seed)
+    user_ids = [u.id for u in User.objects.bulk_create(
+        [User(username=f'{prefix}{i}', password=password_hash) for i in range(count)],
+        batch_size=batch_size,
+    )]
+    paid = np.flatnonzero(rng.random(count) < paid_fraction)
+    Payment.objects.bulk_create([
+        Payment(user_id=user_ids[i], transaction_id=f'LOAD-{seed}-{i}', status='completed')
+        for i in paid.tolist()
+    ], batch_size=batch_size)
+    return user_ids, len(paid)
+
+
+def generate_load_data(users, movies, interactions, zipf=1.1, seed=0, workers=4, batch_size=20000,
+                       paid_fraction=0.8, days=365, password='loadtest123', callback=None):
+    """
+    Insert a synthetic data set and return the number of rows per table.
+
+    `interactions` is the approximate number of UserInteraction rows to
+    produce. `callback(done, total)` is called as user ranges finish.
+    """
+    rng = np.random.default_rng(seed)
+    movie_ids = _create_movies(rng, movies, batch_size)
+    user_ids, payments = _create_users(rng, users, seed, password, paid_fraction, batch_size)
+
+    popularity = 1.0 / np.arange(1, movies + 1) ** zipf
+    rng.shuffle(popularity)
+    # Well-watched titles tend to rate a little higher
+    quality = np.clip(3.0 + rng.normal(0, 0.7, movies) + 0.5 * (popularity > np.median(popularity)), 1, 5)
+    end = timezone.now()
+    catalog = _Catalog(
+        movie_ids=movie_ids,
+        popularity_cdf=np.cumsum(popularity) / popularity.sum(),
+        quality=quality,
+        user_ids=user_ids,
+        pairs_per_user=interactions / (1 + REVIEW_RATE + WATCHLIST_RATE) / max(users, 1),
+        start=end - timedelta(days=days),
+        end=end,
+    )
+
+    # SQLite allows one writer at a time; generation still runs in parallel
+    write_lock = threading.Lock() if connection.vendor == 'sqlite' else nullcontext()
+    n_ranges = (users + USERS_PER_RANGE - 1) // USERS_PER_RANGE
+    totals = {'users': users, 'movies': movies, 'payments': payments,
+              'watch_history': 0, 'reviews': 0, 'watchlist': 0, 'interactions': 0}
+    views = np.zeros(movies, dtype=np.int64)
+    star_counts = np.zeros((movies, 5), dtype=np.int64)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_generate_range, catalog, seed, index, batch_size, write_lock)
+            for index in range(n_ranges)
+        ]
+        for done, future in enumerate(futures, 1):
+            result = future.result()
+            views += result['views']
+            star_counts += result['star_counts']
+            for table in ('watch_history', 'reviews', 'watchlist', 'interactions'):
+                totals[table] += result[table]
+            if callback:
+                callback(done, n_ranges)
+
+    _update_movie_stats(movie_ids, views, star_counts, batch_size)
+    bump_catalog_version()
+    return totals
+
+
+def _update_movie_stats(movie_ids, views, star_counts, batch_size):
+    """Write views and every rating aggregate from the generated rows"""
+    rating_count = star_counts.sum(axis=1)
+    rating_sum = star_counts @ np.arange(1, 6)
+    stars = np.divide(rating_sum, rating_count, out=np.zeros(len(movie_ids)), where=rating_count > 0)
+    rows = [
+        (v, s, c, total, *hist, movie_id)
+        for v, s, c, total, hist, movie_id in zip(
+            views.tolist(), stars.tolist(), rating_count.tolist(), rating_sum.tolist(),
+            star_counts.tolist(), movie_ids.tolist(),
+        )
+    ]
+    table = connection.ops.quote_name(Movie._meta.db_table)
+    histogram = ', '.join(f'rating_{star} = %s' for star in range(1, 6))
+    sql = (f'UPDATE {table} SET views = %s, review_stars = %s, rating_count = %s, rating_sum = %s, '
+           f'{histogram} WHERE id = %s')
+    for start in range(0, len(rows), batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows[start:start + batch_size])
@@ -0,0 +1,44 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from movies.ann import IVFIndex, benchmark, get_index
+from movies.factorization import get_model
+
+
+class Command(BaseCommand):
+    help = 'Measure recall and latency of the ANN index against exact search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--probes', default='1,4,16,32,64',
+                            help='Comma-separated probe counts to compare')
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Benchmark a random index of this many movies instead of the built one')
+        parser.add_argument('--dim', type=int, default=64, help='Vector size for --synthetic')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        if options['synthetic']:
+            self.stdout.write(f"Building synthetic index of {options['synthetic']} vectors...")
+            vectors = rng.normal(size=(options['synthetic'], options['dim'])).astype(np.float32)
+            index = IVFIndex.build(vectors, np.arange(len(vectors)), seed=options['seed'])
+            queries = rng.normal(size=(options['queries'], options['dim'])).astype(np.float32)
+        else:
+            model = get_model()
+            index = get_index(model) if model is not None else None
+            if index is None:
+                self.stdout.write(self.style.WARNING('No ANN index matching the trained model - run build_ann_index first'))
+                return
+            # Query with real user vectors, as the recommendation path does
+            picks = rng.choice(len(model.user_factors), min(options['queries'], len(model.user_factors)), replace=False)
+            queries = model.user_factors[picks]
+
+        probes = [int(p) for p in options['probes'].split(',') if p]
+        self.stdout.write(f'{len(index)} vectors, {index.n_lists} lists, k={options["k"]}')
+        self.stdout.write(f'{"probes":>8} {"recall":>8} {"p50 ms":>9} {"p99 ms":>9}')
+        for row in benchmark(index, queries, k=options['k'], probes=probes):
+            self.stdout.write(
+                f'{row["probes"]:>8} {row["recall"]:>8.3f} {row["p50_ms"]:>9.3f} {row["p99_ms"]:>9.3f}'
+            )
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.ann import build_index_from_model, index_path
+
+
+class Command(BaseCommand):
+    help = 'Build the IVF approximate nearest-neighbour index from the trained movie embeddings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lists', type=int, default=None,
+                            help='Number of inverted lists (defaults to sqrt of the catalog size)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = build_index_from_model(n_lists=options['lists'], seed=options['seed'])
+        if index is None:
+            self.stdout.write(self.style.WARNING('No trained model found - run train_recommender first'))
+            return
+        index.save(index_path())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Indexed {len(index)} movies into {index.n_lists} lists '
+                f'in {time.perf_counter() - started:.2f}s'
+            )
+        )
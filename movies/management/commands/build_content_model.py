@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.content import rebuild_content_model
+from movies.similarity import DEFAULT_TOP_K
+
+
+class Command(BaseCommand):
+    help = 'Rebuild TF-IDF content vectors and content-based neighbours for every movie'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K,
+                            help='Number of neighbours to keep per movie')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.stdout.write('Rebuilding content model...')
+        movies, rows = rebuild_content_model(k=options['top_k'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Stored {rows} content neighbours for {movies} movies '
+                f'in {time.perf_counter() - started:.2f}s'
+            )
+        )
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.leaderboards import rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every per-genre and per-language leaderboard'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        boards = rebuild_leaderboards()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {boards} leaderboards in {time.perf_counter() - started:.2f}s')
+        )
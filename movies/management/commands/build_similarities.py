@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+
+from movies.similarity import (
+    DEFAULT_TOP_K, SIMILARITY_METHODS, rebuild_similarities, update_similarities,
+)
+
+
+class Command(BaseCommand):
+    help = 'Build the precomputed item-item similarity table from UserInteraction data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K,
+                            help='Number of neighbours to keep per movie')
+        parser.add_argument('--method', choices=SIMILARITY_METHODS, default='cosine',
+                            help='Similarity measure')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only refresh movies affected by interactions since the last build')
+        parser.add_argument('--since', help='ISO timestamp to use instead of the last build time (implies --incremental)')
+        parser.add_argument('--from-export', action='store_true',
+                            help='Read interactions from the published matrix export (full rebuilds only)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                self.stderr.write(self.style.ERROR(f"Invalid --since timestamp: {options['since']}"))
+                return
+
+        if options['incremental'] or since is not None:
+            self.stdout.write('Updating similarities incrementally...')
+            movies, rows = update_similarities(since=since, k=options['top_k'], method=options['method'])
+        else:
+            self.stdout.write('Rebuilding all similarities...')
+            movies, rows = rebuild_similarities(
+                k=options['top_k'], method=options['method'], from_export=options['from_export'],
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Stored {rows} neighbours for {movies} movies '
+                f'in {time.perf_counter() - started:.2f}s'
+            )
+        )
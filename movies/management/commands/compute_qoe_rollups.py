@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.qoe import ROLLUP_HOURS, prune_qoe, rollup_qoe
+
+
+class Command(BaseCommand):
+    help = 'Rebuild hourly playback QoE percentiles from raw player events (run on a schedule, e.g. hourly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=ROLLUP_HOURS,
+                            help='Number of recent hourly buckets to rebuild')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete raw events and rollups past their retention')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        summary = f'{rollup_qoe(hours=options["hours"])} rollups'
+        if options['prune']:
+            summary += f'; pruned {prune_qoe()} old rows'
+        self.stdout.write(
+            self.style.SUCCESS(f'QoE rollups updated ({summary}) in {time.perf_counter() - started:.2f}s')
+        )
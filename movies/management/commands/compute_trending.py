@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.trending import TRENDING_SIZE, WINDOWS, compute_trending, prune_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute decayed trending scores from play rollups (run on a schedule, e.g. every 15 minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', choices=list(WINDOWS), action='append',
+                            help='Only recompute this window (repeatable)')
+        parser.add_argument('--size', type=int, default=TRENDING_SIZE,
+                            help='Number of movies to keep per window')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete rollup buckets past their retention')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stored = compute_trending(windows=options['window'], size=options['size'])
+        summary = ', '.join(f'{window}: {count}' for window, count in stored.items())
+        if options['prune']:
+            summary += f'; pruned {prune_rollups()} old buckets'
+        self.stdout.write(
+            self.style.SUCCESS(f'Trending updated ({summary}) in {time.perf_counter() - started:.2f}s')
+        )
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.matrix_export import export_interaction_matrix, export_root
+
+
+class Command(BaseCommand):
+    help = 'Export the user x movie interaction matrix as memory-mappable flat files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help='Export root directory (defaults to RECOMMENDER_MODEL_DIR/interactions)')
+        parser.add_argument('--keep', type=int, default=2,
+                            help='Number of export versions to keep on disk')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.stdout.write('Exporting interactions...')
+        meta = export_interaction_matrix(root=options['output'], keep=options['keep'])
+        users, movies = meta['shape']
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Published {meta['version']} to {options['output'] or export_root()}: "
+                f"{meta['nnz']} interactions ({users} users x {movies} movies) "
+                f'in {time.perf_counter() - started:.2f}s'
+            )
+        )
@@ -0,0 +1,57 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.loadgen import generate_load_data, username_prefix
+
+
+class Command(BaseCommand):
+    help = 'Bulk-insert synthetic users, movies and activity with Zipfian popularity for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--movies', type=int, default=2000)
+        parser.add_argument('--interactions', type=int, default=500000,
+                            help='Approximate number of UserInteraction rows to create')
+        parser.add_argument('--zipf', type=float, default=1.1, help='Popularity skew exponent')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=20000)
+        parser.add_argument('--paid-fraction', type=float, default=0.8,
+                            help='Share of users given a completed payment')
+        parser.add_argument('--days', type=int, default=365, help='Spread activity over this many past days')
+        parser.add_argument('--password', default='loadtest123', help='Password of every generated user')
+
+    def handle(self, *args, **options):
+        prefix = username_prefix(options['seed'])
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"Load data for seed {options['seed']} already exists ({prefix}*); use another --seed")
+
+        started = time.perf_counter()
+
+        def progress(done, total):
+            if done == total or done % 10 == 0:
+                self.stdout.write(f'  {done}/{total} user ranges written ({time.perf_counter() - started:.1f}s)')
+
+        totals = generate_load_data(
+            users=options['users'],
+            movies=options['movies'],
+            interactions=options['interactions'],
+            zipf=options['zipf'],
+            seed=options['seed'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            paid_fraction=options['paid_fraction'],
+            days=options['days'],
+            password=options['password'],
+            callback=progress,
+        )
+
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f'{count} {table.replace("_", " ")}' for table, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {summary} in {elapsed:.1f}s'))
+        self.stdout.write(
+            f"Users are {prefix}0..{prefix}{options['users'] - 1} with password '{options['password']}'. "
+            'Run build_similarities, train_recommender and refresh_recommendations --all to build models.'
+        )
@@ -1,55 +1,105 @@
+import time
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
 from movies.models import Review, WatchHistory, Watchlist, UserInteraction
 
+# (interaction_type, source model, timestamp field, score); a None score means the review rating
+SOURCES = [
+    ('review', Review, 'created_at', None),
+    ('watch', WatchHistory, 'watched_at', 2.0),
+    ('watchlist', Watchlist, 'added_on', 1.0),
+]
+
+
 class Command(BaseCommand):
     help = 'Populate UserInteraction data from existing reviews, watch history, and watchlists'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only copy source rows created after this ISO timestamp')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows read and inserted per batch')
+        parser.add_argument('--progress-every', type=int, default=20,
+                            help='Report progress every N batches (0 to disable)')
+
     def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                self.stderr.write(self.style.ERROR(f"Invalid --since timestamp: {options['since']}"))
+                return
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
         self.stdout.write('Populating interaction data...')
-        
-        # Create interactions from reviews
-        reviews = Review.objects.all()
-        review_count = 0
-        for review in reviews:
-            interaction, created = UserInteraction.objects.get_or_create(
-                user=review.user,
-                movie=review.movie,
-                interaction_type='review',
-                defaults={'score': float(review.rating)}
-            )
-            if created:
-                review_count += 1
-        
-        # Create interactions from watch history
-        watch_history = WatchHistory.objects.all()
-        watch_count = 0
-        for watch in watch_history:
-            interaction, created = UserInteraction.objects.get_or_create(
-                user=watch.user,
-                movie=watch.movie,
-                interaction_type='watch',
-                defaults={'score': 2.0}
+        started = time.perf_counter()
+        created = {}
+        for interaction_type, model, timestamp_field, score in SOURCES:
+            created[interaction_type] = self.copy_source(
+                interaction_type, model, timestamp_field, score, since, options,
             )
-            if created:
-                watch_count += 1
-        
-        # Create interactions from watchlists
-        watchlists = Watchlist.objects.all()
-        watchlist_count = 0
-        for watchlist_item in watchlists:
-            interaction, created = UserInteraction.objects.get_or_create(
-                user=watchlist_item.user,
-                movie=watchlist_item.movie,
-                interaction_type='watchlist',
-                defaults={'score': 1.0}
-            )
-            if created:
-                watchlist_count += 1
-        
+
         self.stdout.write(
             self.style.SUCCESS(
-                f'Successfully created {review_count} review interactions, '
-                f'{watch_count} watch interactions, and '
-                f'{watchlist_count} watchlist interactions'
+                f'Successfully created {created["review"]} review interactions, '
+                f'{created["watch"]} watch interactions, and '
+                f'{created["watchlist"]} watchlist interactions '
+                f'in {time.perf_counter() - started:.2f}s'
             )
-        )
\ No newline at end of file
+        )
+        if any(created.values()):
+            # Bulk inserts skip the per-row signals that refresh recommendations
+            self.stdout.write('Run refresh_recommendations --all to rebuild stored recommendations.')
+
+    def copy_source(self, interaction_type, model, timestamp_field, score, since, options):
+        """Stream one source table into UserInteraction, returning the rows added"""
+        # No ORDER BY: the default orderings would force a sort of the whole table
+        rows = model.objects.order_by()
+        if since is not None:
+            rows = rows.filter(**{f'{timestamp_field}__gt': since})
+        fields = ['user_id', 'movie_id'] + (['rating'] if score is None else [])
+        batch_size = options['batch_size']
+
+        existing = UserInteraction.objects.filter(interaction_type=interaction_type)
+        before = existing.count()
+        started = time.perf_counter()
+        batch, read, batches = [], 0, 0
+        for row in rows.values_list(*fields).iterator(chunk_size=batch_size):
+            batch.append(UserInteraction(
+                user_id=row[0],
+                movie_id=row[1],
+                interaction_type=interaction_type,
+                score=float(row[2]) if score is None else score,
+            ))
+            if len(batch) >= batch_size:
+                read += self.flush(batch)
+                batches += 1
+                if options['progress_every'] and batches % options['progress_every'] == 0:
+                    self.report(interaction_type, read, started)
+        read += self.flush(batch)
+
+        added = existing.count() - before
+        self.report(interaction_type, read, started, added)
+        return added
+
+    def flush(self, batch):
+        # One transaction per batch: a failure only loses the current batch, and
+        # the unique (user, movie, type) constraint makes re-runs idempotent
+        count = len(batch)
+        if batch:
+            with transaction.atomic():
+                UserInteraction.objects.bulk_create(batch, ignore_conflicts=True)
+            batch.clear()
+        return count
+
+    def report(self, interaction_type, read, started, added=None):
+        elapsed = time.perf_counter() - started
+        rate = read / elapsed if elapsed else 0.0
+        message = f'  {interaction_type}: {read} rows read in {elapsed:.1f}s ({rate:,.0f} rows/s)'
+        if added is not None:
+            message += f', {added} new'
+        self.stdout.write(message)
@@ -0,0 +1,30 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from movies.recommendations import refresh_stale_recommendations, refresh_user_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Refresh materialized user recommendations (run on a schedule)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Refresh every user with interactions, not just stale lists')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['all']:
+            user_ids = list(User.objects.filter(interactions__isnull=False).values_list('id', flat=True).distinct())
+            for user_id in user_ids:
+                refresh_user_recommendations(user_id)
+            refreshed = len(user_ids)
+        else:
+            refreshed = refresh_stale_recommendations()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Refreshed {refreshed} recommendation lists in {time.perf_counter() - started:.2f}s'
+            )
+        )
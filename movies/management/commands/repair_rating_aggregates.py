@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from movies.cache import bump_catalog_version, bump_movie_versions
+from movies.models import RATING_FIELDS, Movie, Review
+
+
+class Command(BaseCommand):
+    help = "Rebuild every movie's rating count, sum, histogram and average from its reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        star_counts = {}
+        rows = Review.objects.order_by().values_list('movie_id', 'rating').annotate(n=Count('id'))
+        for movie_id, rating, n in rows:
+            star_counts.setdefault(movie_id, {})[rating] = n
+
+        checked, changed = 0, []
+        for movie in Movie.objects.only('id', *RATING_FIELDS).iterator(chunk_size=options['batch_size']):
+            checked += 1
+            before = [getattr(movie, field) for field in RATING_FIELDS]
+            review_stars = movie.review_stars
+            counts = star_counts.get(movie.id, {})
+            movie.set_rating_aggregates(counts)
+            if not counts:
+                # Keep ratings entered by hand for movies nobody has reviewed yet
+                movie.review_stars = review_stars
+            if [getattr(movie, field) for field in RATING_FIELDS] != before:
+                changed.append(movie)
+        # bulk_update skips save() and its signals; only aggregates change here
+        Movie.objects.bulk_update(changed, RATING_FIELDS, batch_size=options['batch_size'])
+        if changed:
+            bump_catalog_version()
+            bump_movie_versions([movie.id for movie in changed])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Checked {checked} movies, repaired {len(changed)} '
+                f'in {time.perf_counter() - started:.2f}s'
+            )
+        )
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.factorization import (
+    DEFAULT_ALPHA, DEFAULT_FACTORS, DEFAULT_ITERATIONS, DEFAULT_REGULARIZATION,
+    model_path, save_model, train_als,
+)
+from movies.similarity import load_interaction_matrix
+
+
+class Command(BaseCommand):
+    help = 'Train the implicit ALS recommendation model from UserInteraction data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, default=DEFAULT_FACTORS)
+        parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+        parser.add_argument('--regularization', type=float, default=DEFAULT_REGULARIZATION)
+        parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA,
+                            help='Confidence scaling applied to interaction scores')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Solver threads (defaults to CPU count)')
+        parser.add_argument('--output', default=None, help='Model file path')
+        parser.add_argument('--from-export', action='store_true',
+                            help='Train from the published matrix export instead of the database')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.stdout.write('Loading interactions...')
+        matrix, movie_ids, user_ids = load_interaction_matrix(from_export=options['from_export'])
+        if matrix.nnz == 0:
+            self.stdout.write(self.style.WARNING('No interactions found - nothing to train'))
+            return
+        self.stdout.write(
+            f'Training on {matrix.nnz} interactions '
+            f'({len(user_ids)} users x {len(movie_ids)} movies)...'
+        )
+
+        def report(iteration, seconds):
+            self.stdout.write(f'  iteration {iteration}/{options["iterations"]} ({seconds:.2f}s)')
+
+        user_factors, item_factors = train_als(
+            matrix,
+            factors=options['factors'],
+            iterations=options['iterations'],
+            regularization=options['regularization'],
+            alpha=options['alpha'],
+            workers=options['workers'],
+            callback=report,
+        )
+        path = options['output'] or model_path()
+        model = save_model(path, user_factors, item_factors, user_ids, movie_ids)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Saved model to {path} (trained at {model.trained_at:%Y-%m-%d %H:%M:%S} UTC) '
+                f'in {time.perf_counter() - started:.2f}s'
+            )
+        )
@@ -0,0 +1,137 @@
+"""
+Flat-file export of the user x movie interaction matrix.
+
+An export is a directory of raw little-endian arrays (CSR indptr, indices
+and weights plus the user and movie id maps) and a meta.json describing
+them. It is an input for the offline builds (train_recommender and
+build_similarities with --from-export), which map the arrays read-only
+with np.memmap instead of reading UserInteraction in chunks; request
+serving never reads it. New exports are written to a fresh version
+directory and published by atomically replacing the CURRENT pointer file;
+readers pick the new version up on their next check while already-mapped
+files stay valid.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from scipy import sparse
+
+from .factorization import ReloadingFile
+
+ARRAYS = ('indptr', 'indices', 'weights', 'user_ids', 'movie_ids')
+POINTER_FILE = 'CURRENT'
+
+
+def export_root():
+    return os.path.join(settings.RECOMMENDER_MODEL_DIR, 'interactions')
+
+
+def _pointer_path(root=None):
+    return os.path.join(root or export_root(), POINTER_FILE)
+
+
+def export_interaction_matrix(root=None, keep=2):
+    """
+    Write the current UserInteraction table as a new export version.
+
+    Returns the metadata of the published export. Only the newest `keep`
+    versions are left on disk.
+    """
+    from .similarity import load_interaction_matrix
+
+    root = root or export_root()
+    matrix, movie_ids, user_ids = load_interaction_matrix()
+    user_matrix = matrix.T.tocsr()
+    index_dtype = '<i4' if user_matrix.nnz < np.iinfo(np.int32).max else '<i8'
+
+    exported_at = timezone.now()
+    version = f'v{exported_at:%Y%m%d%H%M%S%f}-{os.getpid()}'
+    directory = os.path.join(root, version)
+    os.makedirs(directory)
+    arrays = {
+        'indptr': user_matrix.indptr.astype(index_dtype),
+        'indices': user_matrix.indices.astype(index_dtype),
+        'weights': user_matrix.data.astype('<f4'),
+        'user_ids': np.asarray(user_ids, dtype='<i8'),
+        'movie_ids': np.asarray(movie_ids, dtype='<i8'),
+    }
+    for name, array in arrays.items():
+        array.tofile(os.path.join(directory, f'{name}.bin'))
+
+    meta = {
+        'version': version,
+        'exported_at': exported_at.isoformat(),
+        'shape': [int(user_matrix.shape[0]), int(user_matrix.shape[1])],
+        'nnz': int(user_matrix.nnz),
+        'dtypes': {name: array.dtype.str for name, array in arrays.items()},
+    }
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    tmp_pointer = f'{_pointer_path(root)}.{os.getpid()}.tmp'
+    with open(tmp_pointer, 'w') as f:
+        f.write(version)
+    os.replace(tmp_pointer, _pointer_path(root))
+    _matrix_file.reset()
+
+    _prune_versions(root, keep)
+    return meta
+
+
+def _prune_versions(root, keep):
+    versions = sorted(
+        entry for entry in os.listdir(root)
+        if entry.startswith('v') and os.path.isdir(os.path.join(root, entry))
+    )
+    # Unlinking is safe for readers that still have the old files mapped
+    for version in versions[:-keep] if keep > 0 else []:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+
+
+def _map(path, dtype):
+    # mmap cannot map empty files, which an export with no interactions has
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
+class SharedInteractionMatrix:
+    """Read-only, memory-mapped view of one published export"""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.version = self.meta['version']
+        self.shape = tuple(self.meta['shape'])
+        for name in ARRAYS:
+            setattr(self, name, _map(
+                os.path.join(directory, f'{name}.bin'), np.dtype(self.meta['dtypes'][name]),
+            ))
+
+    @classmethod
+    def from_pointer(cls, pointer_path):
+        with open(pointer_path) as f:
+            version = f.read().strip()
+        return cls(os.path.join(os.path.dirname(pointer_path), version))
+
+    @property
+    def nnz(self):
+        return self.meta['nnz']
+
+    def csr(self):
+        """User x movie CSR matrix backed by the mapped arrays (no copy)"""
+        return sparse.csr_matrix(
+            (self.weights, self.indices, self.indptr), shape=self.shape, copy=False,
+        )
+
+
+_matrix_file = ReloadingFile(_pointer_path, SharedInteractionMatrix.from_pointer)
+
+
+def get_shared_matrix():
+    """Return the process-wide mapping of the published export, or None"""
+    return _matrix_file.get()
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_alter_movie_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('item', 'Co-interaction')], default='item', max_length=10)),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='movies.movie')),
+                ('similar_movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbour_of', to='movies.movie')),
+            ],
+            options={
+                'verbose_name_plural': 'Movie Similarities',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['movie', 'kind', '-score'], name='movies_movi_movie_i_c093eb_idx')],
+                'unique_together': {('movie', 'similar_movie', 'kind')},
+            },
+        ),
+    ]
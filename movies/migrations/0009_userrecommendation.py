@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_moviesimilarity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movie_ids', models.JSONField(default=list, help_text='Recommended movie ids, best first')),
+                ('computed_at', models.DateTimeField(db_index=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stored_recommendations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='moviesimilarity',
+            name='kind',
+            field=models.CharField(choices=[('item', 'Co-interaction'), ('content', 'Content (TF-IDF)')], default='item', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='MovieContentTerms',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('terms', models.JSONField(default=dict, help_text='Term -> weighted count')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='content_terms', to='movies.movie')),
+            ],
+        ),
+    ]
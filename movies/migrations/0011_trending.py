@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_moviecontentterms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoviePlayRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('plays', models.PositiveIntegerField(default=0)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='play_rollups', to='movies.movie')),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+                'indexes': [models.Index(fields=['granularity', 'bucket_start'], name='movies_movi_granula_25fad8_idx')],
+                'unique_together': {('movie', 'granularity', 'bucket_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingMovie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('24h', 'Last 24 hours'), ('7d', 'Last 7 days'), ('30d', 'Last 30 days')], max_length=3)),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trending_entries', to='movies.movie')),
+            ],
+            options={
+                'ordering': ['window', 'rank'],
+                'unique_together': {('window', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0011_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('genre', 'Genre'), ('language', 'Language')], max_length=8)),
+                ('key', models.PositiveIntegerField(help_text='Genre or Language id')),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('bayesian_rating', models.FloatField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='movies.movie')),
+            ],
+            options={
+                'verbose_name_plural': 'Leaderboard Entries',
+                'ordering': ['kind', 'key', 'rank'],
+                'unique_together': {('kind', 'key', 'rank')},
+            },
+        ),
+    ]
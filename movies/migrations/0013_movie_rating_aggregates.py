@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    Review = apps.get_model('movies', 'Review')
+    star_counts = {}
+    for movie_id, rating, n in Review.objects.order_by().values_list('movie_id', 'rating').annotate(n=Count('id')):
+        star_counts.setdefault(movie_id, {})[rating] = n
+    movies = list(Movie.objects.filter(id__in=star_counts))
+    for movie in movies:
+        counts = star_counts[movie.id]
+        for star in range(1, 6):
+            setattr(movie, f'rating_{star}', counts.get(star, 0))
+        movie.rating_count = sum(counts.values())
+        movie.rating_sum = sum(star * n for star, n in counts.items())
+        movie.review_stars = movie.rating_sum / movie.rating_count
+    Movie.objects.bulk_update(
+        movies, ['review_stars', 'rating_count', 'rating_sum'] + [f'rating_{star}' for star in range(1, 6)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0012_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
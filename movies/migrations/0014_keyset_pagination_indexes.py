@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0013_movie_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['movie', '-created_at', '-id'], name='movies_revi_movie_i_391870_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchhistory',
+            index=models.Index(fields=['user', '-watched_at', '-id'], name='movies_watc_user_id_17f4ab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(fields=['user', '-added_on', '-id'], name='movies_watc_user_id_a868dd_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0014_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WatchProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.FloatField(default=0.0, help_text='Seconds into the movie')),
+                ('duration', models.FloatField(default=0.0, help_text='Length reported by the player, in seconds')),
+                ('updated_at', models.DateTimeField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watch_progress', to='movies.movie')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watch_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Watch Progress',
+                'ordering': ['-updated_at'],
+                'indexes': [models.Index(fields=['user', '-updated_at'], name='movies_watc_user_id_fdad4a_idx')],
+                'unique_together': {('user', 'movie')},
+            },
+        ),
+    ]
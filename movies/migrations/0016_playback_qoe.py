@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0015_watch_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaybackEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('startup', 'Time to first frame (ms)'), ('stall', 'Stall duration (ms)'), ('seek', 'Seek latency (ms)'), ('bytes', 'Bytes fetched')], max_length=8)),
+                ('value', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='playback_events', to='movies.movie')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QoERollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('startup', 'Time to first frame (ms)'), ('stall', 'Stall duration (ms)'), ('seek', 'Seek latency (ms)'), ('bytes', 'Bytes fetched')], max_length=8)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0.0)),
+                ('p50', models.FloatField(default=0.0)),
+                ('p90', models.FloatField(default=0.0)),
+                ('p99', models.FloatField(default=0.0)),
+                ('movie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='qoe_rollups', to='movies.movie')),
+            ],
+            options={
+                'verbose_name': 'QoE rollup',
+                'ordering': ['-bucket_start'],
+                'indexes': [models.Index(fields=['bucket_start'], name='movies_qoer_bucket__93d022_idx')],
+                'unique_together': {('movie', 'metric', 'bucket_start')},
+            },
+        ),
+    ]
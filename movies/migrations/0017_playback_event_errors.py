@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0016_playback_qoe'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='playbackevent',
+            name='metric',
+            field=models.CharField(choices=[('startup', 'Time to first frame (ms)'), ('stall', 'Stall duration (ms)'), ('seek', 'Seek latency (ms)'), ('bytes', 'Bytes fetched'), ('error', 'Playback error (MediaError code)')], max_length=8),
+        ),
+        migrations.AlterField(
+            model_name='qoerollup',
+            name='metric',
+            field=models.CharField(choices=[('startup', 'Time to first frame (ms)'), ('stall', 'Stall duration (ms)'), ('seek', 'Seek latency (ms)'), ('bytes', 'Bytes fetched'), ('error', 'Playback error (MediaError code)')], max_length=8),
+        ),
+    ]
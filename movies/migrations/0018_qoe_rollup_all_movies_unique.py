@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0017_playback_event_errors'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='qoerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('movie__isnull', True)), fields=('metric', 'bucket_start'), name='unique_all_movies_qoe_rollup'),
+        ),
+    ]
@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Avg, Count, Q
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Q, Sum, Window
+from django.db.models.functions import Cast, Coalesce, NullIf, RowNumber
 from django.utils import timezone
 from collections import defaultdict
 import math
@@ -27,6 +28,9 @@ class Genre(models.Model):
     def __str__(self):
         return self.name
 
+RATING_STARS = range(1, 6)
+RATING_FIELDS = ['review_stars', 'rating_count', 'rating_sum'] + [f'rating_{star}' for star in RATING_STARS]
+
 class Movie(models.Model):
     id = models.AutoField(primary_key=True)
     title = models.CharField(max_length=255)
@@ -39,43 +43,192 @@ class Movie(models.Model):
     cast = models.CharField(max_length=255, default='Unknown', help_text='Comma-separated list of main actors')
     movie_length = models.CharField(max_length=20, default='Unknown', help_text='Duration e.g. 2h 30m')
     review_stars = models.FloatField(default=0.0, help_text='Average rating out of 5')
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
     views = models.PositiveIntegerField(default=0)
     is_published = models.BooleanField(default=True)
     
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored language so a change can rebuild the board it left
+        instance._stored_language_id = instance.__dict__.get('language_id')
+        return instance
+    
     def get_genres_display(self):
         """Returns comma-separated list of genres"""
         return ", ".join([genre.name for genre in self.genres.all()])
     
+    @property
+    def rating_histogram(self):
+        """Number of reviews per star, e.g. {1: 0, 2: 3, ...}"""
+        return {star: getattr(self, f'rating_{star}') for star in RATING_STARS}
+    
+    def set_rating_aggregates(self, star_counts):
+        """Set the rating fields in memory from a {star: review count} mapping"""
+        for star in RATING_STARS:
+            setattr(self, f'rating_{star}', star_counts.get(star, 0))
+        self.rating_count = sum(star_counts.get(star, 0) for star in RATING_STARS)
+        self.rating_sum = sum(star * star_counts.get(star, 0) for star in RATING_STARS)
+        self.review_stars = self.rating_sum / self.rating_count if self.rating_count else 0.0
+    
     def update_average_rating(self):
-        """Update the average rating based on all reviews"""
-        avg_rating = self.reviews.aggregate(Avg('rating'))['rating__avg']
-        self.review_stars = avg_rating if avg_rating else 0.0
-        self.save(update_fields=['review_stars'])
+        """Recompute the rating aggregates from all reviews (repair path)"""
+        star_counts = dict(self.reviews.order_by().values_list('rating').annotate(n=Count('id')))
+        self.set_rating_aggregates(star_counts)
+        self.save(update_fields=RATING_FIELDS)
+    
+    @classmethod
+    def apply_rating_change(cls, movie_id, added=None, removed=None):
+        """
+        Add and/or remove one rating in a single UPDATE, so concurrent
+        reviews never overwrite each other's counts. An edit passes both.
+        """
+        count_delta = (added is not None) - (removed is not None)
+        sum_delta = (added or 0) - (removed or 0)
+        updates = {
+            'rating_count': F('rating_count') + count_delta,
+            'rating_sum': F('rating_sum') + sum_delta,
+            # Every right-hand side sees the row as it was before the UPDATE
+            'review_stars': Coalesce(
+                ExpressionWrapper(
+                    Cast(F('rating_sum') + sum_delta, FloatField()) / NullIf(F('rating_count') + count_delta, 0),
+                    output_field=FloatField()
+                ),
+                0.0
+            ),
+        }
+        if added is not None and added != removed:
+            updates[f'rating_{added}'] = F(f'rating_{added}') + 1
+        if removed is not None and added != removed:
+            updates[f'rating_{removed}'] = F(f'rating_{removed}') - 1
+        cls.objects.filter(id=movie_id).update(**updates)
     
     def get_similar_movies(self, limit=6):
-        """Get movies similar to this one using item-based collaborative filtering"""
-        # Get users who interacted with this movie
-        user_ids = list(self.interactions.values_list('user_id', flat=True).distinct())
-        
-        if not user_ids:
-            # Fallback to genre-based recommendations
-            return Movie.objects.filter(
-                genres__in=self.genres.all(),
-                is_published=True
-            ).exclude(id=self.id).distinct()[:limit]
+        """Get movies similar to this one (see get_similar_movies_bulk)"""
+        return Movie.get_similar_movies_bulk([self.id], limit)[self.id]
+    
+    @classmethod
+    def get_similar_movies_bulk(cls, movie_ids, limit=6):
+        """
+        Similar movies for many movies at once, as {movie_id: [Movie, ...]}.
+        
+        Each movie uses the first source that has results: precomputed
+        item-item neighbours, the ANN index, content neighbours, then shared
+        genres. Every stage is one query for all movies still missing a list,
+        and the result movies are loaded together with language and genres.
+        """
+        movie_ids = list(dict.fromkeys(movie_ids))
+        ranked = cls._ranked_neighbours(movie_ids, 'item', limit)
         
-        # Find movies these users also interacted with
-        similar_movies = Movie.objects.filter(
-            interactions__user_id__in=user_ids,
+        missing = [movie_id for movie_id in movie_ids if not ranked.get(movie_id)]
+        if missing:
+            from .ann import get_index
+            index = get_index()
+            if index is not None:
+                for movie_id in missing:
+                    ranked[movie_id] = [similar_id for similar_id, _ in index.similar(movie_id, k=limit)]
+        
+        missing = [movie_id for movie_id in movie_ids if not ranked.get(movie_id)]
+        if missing:
+            ranked.update(cls._ranked_neighbours(missing, 'content', limit))
+        
+        missing = [movie_id for movie_id in movie_ids if not ranked.get(movie_id)]
+        if missing:
+            ranked.update(cls._ranked_by_genre(missing, limit))
+        
+        movies = cls.objects.filter(
+            id__in={similar_id for ids in ranked.values() for similar_id in ids},
             is_published=True
-        ).exclude(id=self.id).annotate(
-            interaction_count=Count('interactions__user_id', distinct=True)
-        ).order_by('-interaction_count', '-review_stars')[:limit]
+        ).select_related('language').prefetch_related('genres').in_bulk()
+        return {
+            movie_id: [movies[similar_id] for similar_id in ranked.get(movie_id, []) if similar_id in movies]
+            for movie_id in movie_ids
+        }
+    
+    @staticmethod
+    def _ranked_neighbours(movie_ids, kind, limit):
+        """Top `limit` published neighbour ids per movie from MovieSimilarity"""
+        rows = MovieSimilarity.objects.filter(
+            movie_id__in=movie_ids,
+            kind=kind,
+            similar_movie__is_published=True
+        ).annotate(
+            position=Window(RowNumber(), partition_by=F('movie_id'), order_by=F('score').desc())
+        ).filter(position__lte=limit).order_by('movie_id', 'position').values_list('movie_id', 'similar_movie_id')
         
-        return similar_movies
+        ranked = defaultdict(list)
+        for movie_id, similar_id in rows:
+            ranked[movie_id].append(similar_id)
+        return ranked
+    
+    @classmethod
+    def _ranked_by_genre(cls, movie_ids, limit):
+        """Best-rated published movies sharing a genre, per movie"""
+        MovieGenre = cls.genres.through
+        source_genres = defaultdict(set)
+        for movie_id, genre_id in MovieGenre.objects.filter(movie_id__in=movie_ids).values_list('movie_id', 'genre_id'):
+            source_genres[movie_id].add(genre_id)
+        
+        # The top limit + 1 of each genre is enough to fill every list after
+        # dropping the movie itself
+        genre_top = defaultdict(list)
+        rows = MovieGenre.objects.filter(
+            genre_id__in=set().union(*source_genres.values()),
+            movie__is_published=True
+        ).annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('genre_id'),
+                order_by=[F('movie__review_stars').desc(), F('movie__views').desc(), F('movie_id').asc()]
+            )
+        ).filter(position__lte=limit + 1).values_list('genre_id', 'movie_id', 'movie__review_stars', 'movie__views')
+        for genre_id, movie_id, stars, views in rows:
+            genre_top[genre_id].append((-stars, -views, movie_id))
+        
+        ranked = {}
+        for movie_id, genre_ids in source_genres.items():
+            candidates = sorted({
+                candidate for genre_id in genre_ids for candidate in genre_top[genre_id]
+                if candidate[2] != movie_id
+            })
+            ranked[movie_id] = [candidate[2] for candidate in candidates[:limit]]
+        return ranked
+    
+    @classmethod
+    def get_content_based(cls, movie_ids, exclude_ids=(), limit=6):
+        """
+        Movies closest in content to any of `movie_ids`, ranked by summed
+        similarity. Falls back to shared genres if the content model is empty.
+        """
+        exclude_ids = set(movie_ids) | set(exclude_ids)
+        content_based = cls.objects.filter(
+            neighbour_of__movie_id__in=movie_ids,
+            neighbour_of__kind='content',
+            is_published=True
+        ).exclude(id__in=exclude_ids).annotate(
+            content_score=Sum('neighbour_of__score')
+        ).order_by('-content_score', '-review_stars')[:limit]
+        
+        if content_based:
+            return content_based
+        
+        user_genres = cls.objects.filter(
+            id__in=movie_ids
+        ).values_list('genres', flat=True)
+        
+        return cls.objects.filter(
+            genres__in=user_genres,
+            is_published=True
+        ).exclude(id__in=exclude_ids).distinct().order_by('-review_stars', '-views')[:limit]
     
     @classmethod
     def get_recommendations_for_user(cls, user, limit=6):
@@ -89,6 +242,22 @@ class Movie(models.Model):
                 is_published=True
             ).order_by('-review_stars', '-views')[:limit]
         
+        # Serve from the trained factorization model when it knows this user
+        from .ann import get_index
+        from .factorization import get_model
+        model = get_model()
+        if model is not None and model.has_user(user.id):
+            index = get_index(model)
+            if index is not None:
+                ranked = index.search(model.user_vector(user.id), k=limit, exclude_ids=user_movies)
+            else:
+                # Over-fetch so unpublished movies can be dropped without a second pass
+                ranked = model.recommend(user.id, exclude_ids=user_movies, limit=limit * 3)
+            movies = cls.objects.filter(is_published=True).in_bulk([movie_id for movie_id, _ in ranked])
+            recommended_movies = [movies[movie_id] for movie_id, _ in ranked if movie_id in movies]
+            if recommended_movies:
+                return recommended_movies[:limit]
+        
         # Find similar users based on common movie interactions (lowered threshold to 1)
         similar_users = User.objects.filter(
             interactions__movie_id__in=user_movies
@@ -98,15 +267,8 @@ class Movie(models.Model):
         ).filter(common_movies__gte=1).order_by('-common_movies')[:20]
         
         if not similar_users:
-            # Fallback to genre-based recommendations
-            user_genres = cls.objects.filter(
-                id__in=user_movies
-            ).values_list('genres', flat=True)
-            
-            return cls.objects.filter(
-                genres__in=user_genres,
-                is_published=True
-            ).exclude(id__in=user_movies).distinct().order_by('-review_stars', '-views')[:limit]
+            # Fallback to content-based recommendations
+            return cls.get_content_based(user_movies, limit=limit)
         
         # Get movies liked by similar users
         recommended_movies = cls.objects.filter(
@@ -116,20 +278,15 @@ class Movie(models.Model):
             recommendation_score=Count('interactions__user', distinct=True)
         ).order_by('-recommendation_score', '-review_stars', '-views')[:limit]
         
-        # If not enough recommendations, add genre-based ones
-        if recommended_movies.count() < limit:
-            user_genres = cls.objects.filter(
-                id__in=user_movies
-            ).values_list('genres', flat=True)
+        # If not enough recommendations, add content-based ones
+        if len(recommended_movies) < limit:
+            content_based = cls.get_content_based(
+                user_movies,
+                exclude_ids=[m.id for m in recommended_movies],
+                limit=limit - len(recommended_movies)
+            )
             
-            genre_based = cls.objects.filter(
-                genres__in=user_genres,
-                is_published=True
-            ).exclude(id__in=user_movies).exclude(
-                id__in=[m.id for m in recommended_movies]
-            ).distinct().order_by('-review_stars', '-views')[:limit - recommended_movies.count()]
-            
-            recommended_movies = list(recommended_movies) + list(genre_based)
+            recommended_movies = list(recommended_movies) + list(content_based)
         
         return recommended_movies
 
@@ -141,6 +298,9 @@ class Watchlist(models.Model):
     class Meta:
         unique_together = ('user', 'movie')
         ordering = ['-added_on']
+        indexes = [
+            models.Index(fields=['user', '-added_on', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.movie.title}"
@@ -159,15 +319,41 @@ class Review(models.Model):
     class Meta:
         unique_together = ('user', 'movie')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['movie', '-created_at', '-id']),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so an edit can be applied as a delta
+        instance._stored_rating = instance.__dict__.get('rating')
+        return instance
     
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.movie.update_average_rating()
+        # An unsaved instance given an existing id updates that row, so only
+        # an instance without one is certainly new
+        adding = self._state.adding and self.pk is None
+        stored_rating = getattr(self, '_stored_rating', None)
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            rating_saved = update_fields is None or 'rating' in update_fields
+            if adding:
+                Movie.apply_rating_change(self.movie_id, added=self.rating)
+            elif rating_saved and stored_rating is None:
+                # Saved over an existing row without loading it first
+                Movie.objects.get(id=self.movie_id).update_average_rating()
+            elif rating_saved and stored_rating != self.rating:
+                Movie.apply_rating_change(self.movie_id, added=self.rating, removed=stored_rating)
+        if rating_saved:
+            self._stored_rating = self.rating
+        self.refresh_cached_movie()
     
-    def delete(self, *args, **kwargs):
-        movie = self.movie
-        super().delete(*args, **kwargs)
-        movie.update_average_rating()
+    def refresh_cached_movie(self):
+        """Reload the rating fields of an already-fetched self.movie"""
+        if Review.movie.is_cached(self):
+            self.movie.refresh_from_db(fields=RATING_FIELDS)
     
     def time_since_created(self):
         """Return human-readable time since creation"""
@@ -194,10 +380,32 @@ class WatchHistory(models.Model):
         ordering = ['-watched_at']
         verbose_name_plural = 'Watch Histories'
         unique_together = ('user', 'movie')
+        indexes = [
+            models.Index(fields=['user', '-watched_at', '-id']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.movie.title}"
 
+class WatchProgress(models.Model):
+    """Last playback position per user and movie, flushed in batches from player heartbeats"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='watch_progress')
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='watch_progress')
+    position = models.FloatField(default=0.0, help_text='Seconds into the movie')
+    duration = models.FloatField(default=0.0, help_text='Length reported by the player, in seconds')
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'movie')
+        indexes = [
+            models.Index(fields=['user', '-updated_at']),
+        ]
+        ordering = ['-updated_at']
+        verbose_name_plural = 'Watch Progress'
+
+    def __str__(self):
+        return f"{self.user.username} - {self.movie.title} @ {self.position:.0f}s"
+
 class UserInteraction(models.Model):
     """Track user interactions for collaborative filtering"""
     INTERACTION_TYPES = [
@@ -217,4 +425,161 @@ class UserInteraction(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.user.username} - {self.movie.title} ({self.interaction_type})"
\ No newline at end of file
+        return f"{self.user.username} - {self.movie.title} ({self.interaction_type})"
+
+class MovieSimilarity(models.Model):
+    """Precomputed top-K neighbours of a movie, rebuilt offline"""
+    KINDS = [
+        ('item', 'Co-interaction'),
+        ('content', 'Content (TF-IDF)'),
+    ]
+    
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='neighbours')
+    similar_movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='neighbour_of')
+    kind = models.CharField(max_length=10, choices=KINDS, default='item')
+    score = models.FloatField()
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('movie', 'similar_movie', 'kind')
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['movie', 'kind', '-score']),
+        ]
+        verbose_name_plural = 'Movie Similarities'
+    
+    def __str__(self):
+        return f"{self.movie.title} ~ {self.similar_movie.title} ({self.kind}: {self.score:.3f})"
+
+class UserRecommendation(models.Model):
+    """Materialized ranked recommendation list, refreshed in the background"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stored_recommendations')
+    movie_ids = models.JSONField(default=list, help_text='Recommended movie ids, best first')
+    computed_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - {len(self.movie_ids)} recommendations"
+
+class MovieContentTerms(models.Model):
+    """Raw term counts of a movie's text and metadata, the input to the TF-IDF model"""
+    movie = models.OneToOneField(Movie, on_delete=models.CASCADE, related_name='content_terms')
+    terms = models.JSONField(default=dict, help_text='Term -> weighted count')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.movie.title} ({len(self.terms)} terms)"
+
+class MoviePlayRollup(models.Model):
+    """Play counts per movie per hour/day bucket, fed from play events"""
+    GRANULARITIES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+    
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='play_rollups')
+    granularity = models.CharField(max_length=4, choices=GRANULARITIES)
+    bucket_start = models.DateTimeField()
+    plays = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('movie', 'granularity', 'bucket_start')
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start']),
+        ]
+        ordering = ['-bucket_start']
+    
+    def __str__(self):
+        return f"{self.movie.title} - {self.granularity} {self.bucket_start:%Y-%m-%d %H:00} ({self.plays})"
+
+class TrendingMovie(models.Model):
+    """Materialized top-N trending movies per window, recomputed on a schedule"""
+    WINDOWS = [
+        ('24h', 'Last 24 hours'),
+        ('7d', 'Last 7 days'),
+        ('30d', 'Last 30 days'),
+    ]
+    
+    window = models.CharField(max_length=3, choices=WINDOWS)
+    rank = models.PositiveIntegerField()
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='trending_entries')
+    score = models.FloatField()
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('window', 'rank')
+        ordering = ['window', 'rank']
+    
+    def __str__(self):
+        return f"{self.window} #{self.rank} - {self.movie.title}"
+
+class LeaderboardEntry(models.Model):
+    """Precomputed ranking of movies within one genre or language"""
+    KINDS = [
+        ('genre', 'Genre'),
+        ('language', 'Language'),
+    ]
+    
+    kind = models.CharField(max_length=8, choices=KINDS)
+    key = models.PositiveIntegerField(help_text='Genre or Language id')
+    rank = models.PositiveIntegerField()
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    score = models.FloatField()
+    bayesian_rating = models.FloatField()
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('kind', 'key', 'rank')
+        ordering = ['kind', 'key', 'rank']
+        verbose_name_plural = 'Leaderboard Entries'
+    
+    def __str__(self):
+        return f"{self.kind} {self.key} #{self.rank} - {self.movie.title}"
+
+class PlaybackEvent(models.Model):
+    """Raw player QoE measurement, appended by the beacon and pruned after rollup"""
+    METRICS = [
+        ('startup', 'Time to first frame (ms)'),
+        ('stall', 'Stall duration (ms)'),
+        ('seek', 'Seek latency (ms)'),
+        ('bytes', 'Bytes fetched'),
+        ('error', 'Playback error (MediaError code)'),
+    ]
+    
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='playback_events')
+    metric = models.CharField(max_length=8, choices=METRICS)
+    value = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.movie_id} {self.metric}={self.value:g}"
+
+class QoERollup(models.Model):
+    """Hourly count, total and percentiles of one QoE metric; movie is NULL for all movies"""
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, null=True, blank=True, related_name='qoe_rollups')
+    metric = models.CharField(max_length=8, choices=PlaybackEvent.METRICS)
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0.0)
+    p50 = models.FloatField(default=0.0)
+    p90 = models.FloatField(default=0.0)
+    p99 = models.FloatField(default=0.0)
+    
+    class Meta:
+        unique_together = ('movie', 'metric', 'bucket_start')
+        constraints = [
+            # NULLs never collide in unique_together, so the all-movies rows need their own
+            models.UniqueConstraint(
+                fields=['metric', 'bucket_start'],
+                condition=Q(movie__isnull=True),
+                name='unique_all_movies_qoe_rollup',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['bucket_start']),
+        ]
+        ordering = ['-bucket_start']
+        verbose_name = 'QoE rollup'
+    
+    def __str__(self):
+        scope = self.movie.title if self.movie else 'All movies'
+        return f"{scope} - {self.metric} {self.bucket_start:%Y-%m-%d %H:00} (p90 {self.p90:g})"
@@ -0,0 +1,90 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+A page is read with `WHERE (ts, id) < (last_ts, last_id) ORDER BY ts
+DESC, id DESC LIMIT n + 1` instead of an OFFSET, so with a matching index
+every page costs the same however deep the client has scrolled. The
+position of the last row is handed out as an opaque URL-safe cursor.
+"""
+import base64
+import json
+from dataclasses import dataclass
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 20
+HTML_PAGE_SIZE = 40
+SEARCH_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class CursorPage:
+    items: list
+    next_cursor: str = None
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Turn a cursor back into typed values for the `ordering` fields of `model`"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise ValueError
+        return [
+            model._meta.get_field(name.lstrip('-')).to_python(value)
+            for name, value in zip(ordering, values)
+        ]
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+
+
+def _after(ordering, values):
+    """Q matching rows strictly after `values` in `ordering`"""
+    condition = Q()
+    for i, name in enumerate(ordering):
+        field = name.lstrip('-')
+        step = Q(**{f'{field}__{"lt" if name.startswith("-") else "gt"}': values[i]})
+        for previous, value in zip(ordering[:i], values[:i]):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+    return condition
+
+
+def paginate(queryset, ordering, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Return one CursorPage of `queryset` ordered by `ordering`.
+
+    `ordering` must end in a unique field (normally '-id') so the position
+    is unambiguous. Raises InvalidCursor for a malformed cursor.
+    """
+    if cursor:
+        queryset = queryset.filter(_after(ordering, decode_cursor(cursor, queryset.model, ordering)))
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([getattr(rows[-1], name.lstrip('-')) for name in ordering])
+    return CursorPage(rows, next_cursor)
+
+
+def page_params(request, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Read ?cursor= and ?limit= from a request, clamping the page size"""
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        limit = default
+    return request.GET.get('cursor') or None, min(max(limit, 1), maximum)
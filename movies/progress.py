@@ -0,0 +1,146 @@
+"""
+Resume positions fed by player heartbeats.
+
+A heartbeat never touches the database. The position is stored in an
+in-process buffer keyed by user and movie, so a viewer's newer heartbeat
+simply replaces their older one, and in the user's progress index in the
+cache, which serves resume positions and the "continue watching" row.
+flush_progress() writes the buffer as a few bulk upserts at most every
+WATCH_PROGRESS_FLUSH_INTERVAL seconds (sooner once WATCH_PROGRESS_MAX_PENDING
+entries are waiting), so database writes grow with the number of viewers
+per flush, not with viewers times heartbeats.
+
+A process that dies loses at most one flush interval of positions.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .background import submit, throttle
+from .models import Movie, WatchProgress
+
+INDEX_SIZE = 50  # most recent movies kept in a user's progress index
+INDEX_CACHE_TTL = 24 * 3600
+FLUSH_BATCH_SIZE = 500
+MIN_RESUME_SECONDS = 30  # earlier positions start the movie from the top
+FINISHED_FRACTION = 0.95  # past this share of the duration a movie counts as finished
+
+_pending = {}  # user_id -> {movie_id: (position, duration, updated_at)}
+_pending_count = 0
+_lock = threading.Lock()
+
+
+def _index_key(user_id):
+    return f'movies:progress:{user_id}'
+
+
+def is_finished(position, duration):
+    return duration > 0 and position >= duration * FINISHED_FRACTION
+
+
+def get_progress_index(user_id):
+    """Return {movie_id: (position, duration, updated_at)} for the user's most recent movies"""
+    index = cache.get(_index_key(user_id))
+    if index is None:
+        rows = WatchProgress.objects.filter(user_id=user_id).order_by('-updated_at').values_list(
+            'movie_id', 'position', 'duration', 'updated_at'
+        )[:INDEX_SIZE]
+        index = {movie_id: (position, duration, updated_at) for movie_id, position, duration, updated_at in rows}
+        with _lock:
+            # Heartbeats not flushed yet are newer than anything in the table
+            index.update(_pending.get(user_id, {}))
+        index = _trim(index)
+        cache.set(_index_key(user_id), index, INDEX_CACHE_TTL)
+    return index
+
+
+def _trim(index):
+    if len(index) <= INDEX_SIZE:
+        return index
+    recent = sorted(index.items(), key=lambda item: item[1][2], reverse=True)[:INDEX_SIZE]
+    return dict(recent)
+
+
+def record_heartbeat(user_id, movie_id, position, duration, at=None):
+    """Buffer a playback position and schedule the next flush"""
+    global _pending_count
+    entry = (position, duration, at or timezone.now())
+
+    index = get_progress_index(user_id)
+    index[movie_id] = entry
+    cache.set(_index_key(user_id), _trim(index), INDEX_CACHE_TTL)
+
+    with _lock:
+        movies = _pending.setdefault(user_id, {})
+        if movie_id not in movies:
+            _pending_count += 1
+        movies[movie_id] = entry
+        full = _pending_count == settings.WATCH_PROGRESS_MAX_PENDING
+    if full:
+        submit(flush_progress)
+    else:
+        throttle('watch-progress-flush', settings.WATCH_PROGRESS_FLUSH_INTERVAL, flush_progress)
+
+
+def flush_progress():
+    """Upsert every buffered position; returns the number of rows written"""
+    global _pending, _pending_count
+    with _lock:
+        pending, _pending, _pending_count = _pending, {}, 0
+    if not pending:
+        return 0
+
+    # Skip movies deleted since the heartbeat, which would fail the whole batch
+    movie_ids = {movie_id for movies in pending.values() for movie_id in movies}
+    existing = set(Movie.objects.filter(id__in=movie_ids).values_list('id', flat=True))
+    rows = [
+        WatchProgress(user_id=user_id, movie_id=movie_id, position=position, duration=duration, updated_at=at)
+        for user_id, movies in pending.items()
+        for movie_id, (position, duration, at) in movies.items()
+        if movie_id in existing
+    ]
+    WatchProgress.objects.bulk_create(
+        rows,
+        batch_size=FLUSH_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['user', 'movie'],
+        update_fields=['position', 'duration', 'updated_at'],
+    )
+    return len(rows)
+
+
+def get_resume_position(user_id, movie_id):
+    """Seconds to resume a movie from, or 0 to start it from the top"""
+    position, duration, _ = get_progress_index(user_id).get(movie_id, (0.0, 0.0, None))
+    if position < MIN_RESUME_SECONDS or is_finished(position, duration):
+        return 0
+    return position
+
+
+def continue_watching(user_id, limit=12):
+    """
+    Published movies the user stopped part-way through, most recent first,
+    each with a `progress_percent` attribute.
+    """
+    started = sorted(
+        (
+            (movie_id, entry) for movie_id, entry in get_progress_index(user_id).items()
+            if entry[0] >= MIN_RESUME_SECONDS and not is_finished(entry[0], entry[1])
+        ),
+        key=lambda item: item[1][2],
+        reverse=True,
+    )[:limit]
+    movies = Movie.objects.filter(
+        id__in=[movie_id for movie_id, _ in started], is_published=True
+    ).select_related('language').prefetch_related('genres').in_bulk()
+
+    result = []
+    for movie_id, (position, duration, _) in started:
+        movie = movies.get(movie_id)
+        if movie is None:
+            continue
+        movie.progress_percent = min(round(100 * position / duration), 100) if duration else 0
+        result.append(movie)
+    return result
@@ -0,0 +1,122 @@
+"""
+Playback quality-of-experience telemetry.
+
+The player batches its measurements (time to first frame, each stall, each
+seek, bytes fetched) into one beacon; record_events() stores a beacon with a
+single multi-row INSERT into PlaybackEvent and nothing else. rollup_qoe()
+runs in the background a few minutes later, and from the compute_qoe_rollups
+command on a schedule: it recomputes the hourly QoERollup rows (count,
+total, p50/p90/p99) per movie and for all movies together from the raw
+events of the last few hours. Percentiles can't be merged, so each bucket
+is rebuilt from its events rather than updated in place.
+
+Runs are serialised per process, and each replaces its buckets in one
+transaction. Across processes the unique constraints on QoERollup (one of
+them just for the all-movies rows, whose NULL movie never collides) make an
+overlapping run fail and roll back instead of storing a second copy.
+"""
+import math
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .background import throttle
+from .models import PlaybackEvent, QoERollup
+from .trending import bucket_start
+
+METRICS = [metric for metric, _ in PlaybackEvent.METRICS]
+MAX_EVENTS_PER_BEACON = 100
+MAX_VALUE = 10 ** 10  # sanity bound for every metric; larger values are client bugs
+ROLLUP_HOURS = 2  # hours of raw events each rollup run recomputes
+
+# How long raw events and rollups are kept before prune_qoe() deletes them
+EVENT_RETENTION = timedelta(days=2)
+ROLLUP_RETENTION = timedelta(days=90)
+
+_rollup_lock = threading.Lock()
+
+
+def parse_events(raw):
+    """Validate a beacon's [{"metric": ..., "value": ...}] list into (metric, value) pairs"""
+    if not isinstance(raw, list) or len(raw) > MAX_EVENTS_PER_BEACON:
+        raise ValueError(f'Expected a list of at most {MAX_EVENTS_PER_BEACON} events')
+    events = []
+    for event in raw:
+        try:
+            metric, value = event['metric'], float(event['value'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each event needs a metric and a numeric value')
+        if metric not in METRICS:
+            raise ValueError(f'Unknown metric: {metric}')
+        if not 0 <= value <= MAX_VALUE:
+            raise ValueError(f'Invalid {metric} value')
+        events.append((metric, value))
+    return events
+
+
+def record_events(movie_id, events):
+    """Append one beacon's events and schedule a rollup"""
+    PlaybackEvent.objects.bulk_create([
+        PlaybackEvent(movie_id=movie_id, metric=metric, value=value) for metric, value in events
+    ])
+    throttle('qoe-rollup', settings.QOE_ROLLUP_INTERVAL, rollup_qoe)
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def rollup_qoe(hours=ROLLUP_HOURS, now=None):
+    """Rebuild the rollups of the last `hours` hourly buckets; returns the number of rows stored"""
+    with _rollup_lock:
+        try:
+            return _rebuild_rollups(hours, now or timezone.now())
+        except IntegrityError:
+            # Another process stored these buckets first; its rollup stands
+            return 0
+
+
+def _rebuild_rollups(hours, now):
+    start = bucket_start(now - timedelta(hours=hours - 1), 'hour')
+    values = defaultdict(list)
+    events = PlaybackEvent.objects.filter(created_at__gte=start).values_list('movie_id', 'metric', 'value', 'created_at')
+    for movie_id, metric, value, created_at in events.iterator(chunk_size=5000):
+        bucket = bucket_start(created_at, 'hour')
+        values[(movie_id, metric, bucket)].append(value)
+        values[(None, metric, bucket)].append(value)
+
+    rollups = []
+    for (movie_id, metric, bucket), samples in values.items():
+        samples.sort()
+        rollups.append(QoERollup(
+            movie_id=movie_id, metric=metric, bucket_start=bucket,
+            count=len(samples), total=sum(samples),
+            p50=percentile(samples, 0.5), p90=percentile(samples, 0.9), p99=percentile(samples, 0.99),
+        ))
+    with transaction.atomic():
+        QoERollup.objects.filter(bucket_start__gte=start).delete()
+        QoERollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def prune_qoe(now=None):
+    """Delete raw events and rollups past their retention; returns the number removed"""
+    now = now or timezone.now()
+    removed = PlaybackEvent.objects.filter(created_at__lt=now - EVENT_RETENTION).delete()[0]
+    removed += QoERollup.objects.filter(bucket_start__lt=now - ROLLUP_RETENTION).delete()[0]
+    return removed
+
+
+def latest_summary(now=None):
+    """The newest all-movies rollup of the last day per metric, as {metric: QoERollup}"""
+    now = now or timezone.now()
+    summary = {}
+    rollups = QoERollup.objects.filter(movie__isnull=True, bucket_start__gte=now - timedelta(days=1))
+    for rollup in rollups.order_by('-bucket_start'):
+        summary.setdefault(rollup.metric, rollup)
+    return summary
@@ -0,0 +1,174 @@
+"""
+Materialized per-user recommendation lists.
+
+Ranked movie ids are stored in UserRecommendation and refreshed in the
+background, either shortly after a user's interactions change (debounced)
+or when the stored list is older than RECOMMENDATION_STALE_AFTER.
+
+serve_recommendations() puts a time budget on reads: a fresh stored list
+is returned directly, otherwise a refresh runs on the background pool and
+the request waits at most RECOMMENDATION_BUDGET_MS for it before falling
+back to the stale stored list or the cached popular list. The refresh
+keeps running either way, and every response is tagged with the tier that
+served it.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+
+from .background import debounce, submit, submit_future
+from .models import Movie, UserRecommendation
+
+STORED_RECOMMENDATIONS = 24
+POPULAR_CACHE_KEY = 'recommendations:popular'
+POPULAR_CACHE_TTL = 600
+
+# Tiers in order of preference
+TIER_FRESH = 'fresh'      # stored list within its staleness window
+TIER_LIVE = 'live'        # recomputed within the request budget
+TIER_STALE = 'stale'      # budget ran out, last stored list served
+TIER_POPULAR = 'popular'  # budget ran out and nothing stored yet
+TIERS = (TIER_FRESH, TIER_LIVE, TIER_STALE, TIER_POPULAR)
+
+
+def _stale_after():
+    return timedelta(seconds=getattr(settings, 'RECOMMENDATION_STALE_AFTER', 6 * 3600))
+
+
+def refresh_user_recommendations(user_id):
+    """Recompute and store the ranked list for one user"""
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return None
+    movies = Movie.get_recommendations_for_user(user, limit=STORED_RECOMMENDATIONS)
+    stored, _ = UserRecommendation.objects.update_or_create(
+        user=user,
+        defaults={
+            'movie_ids': [movie.id for movie in movies],
+            'computed_at': timezone.now(),
+        }
+    )
+    return stored
+
+
+def schedule_refresh(user_id, immediate=False):
+    """Queue a background refresh; bursts of interactions collapse into one"""
+    if immediate:
+        submit(refresh_user_recommendations, user_id)
+    else:
+        delay = getattr(settings, 'RECOMMENDATION_REFRESH_DEBOUNCE', 30)
+        debounce(('recommendations', user_id), delay, refresh_user_recommendations, user_id)
+
+
+def popular_movie_ids(limit):
+    """Ids of the best-rated popular movies, cached so fallbacks cost no query"""
+    # Cached with the number of ids asked for, so a catalog with fewer
+    # movies than that isn't queried again on every call
+    fetched, movie_ids = cache.get(POPULAR_CACHE_KEY, (0, None))
+    if movie_ids is None or fetched < limit:
+        fetched = max(limit, STORED_RECOMMENDATIONS)
+        movie_ids = list(Movie.objects.filter(
+            is_published=True
+        ).order_by('-review_stars', '-views').values_list('id', flat=True)[:fetched])
+        cache.set(POPULAR_CACHE_KEY, (fetched, movie_ids), POPULAR_CACHE_TTL)
+    return movie_ids[:limit]
+
+
+def movies_in_order(movie_ids, limit):
+    """Load published movies for `movie_ids`, keeping the stored ranking"""
+    movies = Movie.objects.filter(
+        id__in=movie_ids[:limit * 2], is_published=True
+    ).select_related('language').prefetch_related('genres').in_bulk()
+    return [movies[movie_id] for movie_id in movie_ids if movie_id in movies][:limit]
+
+
+class TierStats:
+    """Per-process counters of which tier served each request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(TIERS, 0)
+
+    def record(self, tier):
+        with self._lock:
+            self.counts[tier] += 1
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.counts.values())
+            degraded = self.counts[TIER_STALE] + self.counts[TIER_POPULAR]
+            return {
+                'counts': dict(self.counts),
+                'total': total,
+                'degraded_rate': degraded / total if total else 0.0,
+            }
+
+
+tier_stats = TierStats()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _refresh_future(user_id):
+    """Start (or join) the background refresh for one user"""
+    with _inflight_lock:
+        future = _inflight.get(user_id)
+        if future is not None:
+            return future
+        future = _inflight[user_id] = submit_future(refresh_user_recommendations, user_id)
+    # Outside the lock: a future that is already done runs the callback right here
+    future.add_done_callback(lambda done: _forget_future(user_id, done))
+    return future
+
+
+def _forget_future(user_id, future):
+    with _inflight_lock:
+        # A newer refresh may already have taken the slot
+        if _inflight.get(user_id) is future:
+            del _inflight[user_id]
+
+
+def serve_recommendations(user, limit=12, budget_ms=None):
+    """
+    Return (movies, tier) for the user within a time budget.
+
+    The stored list is used when fresh. Otherwise a refresh is started in
+    the background and awaited for at most `budget_ms`; if it misses the
+    deadline the stale stored list, or failing that the popular list, is
+    returned while the refresh completes on its own.
+    """
+    if budget_ms is None:
+        budget_ms = getattr(settings, 'RECOMMENDATION_BUDGET_MS', 150)
+
+    stored = UserRecommendation.objects.filter(user=user).first()
+    if stored is not None and stored.computed_at >= timezone.now() - _stale_after():
+        tier, movie_ids = TIER_FRESH, stored.movie_ids
+    else:
+        try:
+            refreshed = _refresh_future(user.id).result(timeout=budget_ms / 1000)
+            tier, movie_ids = TIER_LIVE, refreshed.movie_ids if refreshed else []
+        except Exception:
+            # Deadline missed (or the refresh failed) - degrade instead of blocking
+            if stored is not None:
+                tier, movie_ids = TIER_STALE, stored.movie_ids
+            else:
+                tier, movie_ids = TIER_POPULAR, popular_movie_ids(limit)
+
+    tier_stats.record(tier)
+    return movies_in_order(movie_ids, limit), tier
+
+
+def refresh_stale_recommendations():
+    """Refresh every stored list older than the staleness window; returns the count"""
+    cutoff = timezone.now() - _stale_after()
+    # Materialise the ids first: SQLite cursors don't isolate reads from the writes below
+    user_ids = list(UserRecommendation.objects.filter(
+        computed_at__lt=cutoff
+    ).values_list('user_id', flat=True))
+    for user_id in user_ids:
+        refresh_user_recommendations(user_id)
+    return len(user_ids)
@@ -0,0 +1,108 @@
+"""
+The one place movies are turned into JSON-ready dicts.
+
+Payloads are cached per movie version (see movies.cache), so thumbnail.url,
+video.url and get_genres_display() run once per movie change rather than
+once per row per request. Callers pick the fields they need with
+MOVIE_FIELDS names, usually from a ?fields= query parameter.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import get_movie_versions, movie_version_key
+from .models import Movie
+
+# Field name -> how to read it from a Movie with language and genres loaded
+MOVIE_FIELDS = {
+    'id': lambda movie: movie.id,
+    'title': lambda movie: movie.title,
+    'year': lambda movie: movie.year,
+    'description': lambda movie: movie.description or '',
+    'thumbnail': lambda movie: movie.thumbnail.url if movie.thumbnail else '',
+    'video': lambda movie: movie.video.url if movie.video else '',
+    'genres': lambda movie: movie.get_genres_display(),
+    'language': lambda movie: movie.language.name if movie.language else 'Unknown',
+    'cast': lambda movie: movie.cast or '',
+    'length': lambda movie: movie.movie_length or 'Unknown',
+    'rating': lambda movie: float(movie.review_stars),
+    'views': lambda movie: movie.views,
+}
+
+# Views change on every play without bumping the movie version, so they are
+# read from the row instead of the cached payload
+LIVE_FIELDS = ('views',)
+
+ALL_FIELDS = tuple(MOVIE_FIELDS)
+SUMMARY_FIELDS = ('id', 'title', 'year', 'thumbnail', 'rating', 'genres', 'language')
+
+
+def parse_fields(request, default=ALL_FIELDS):
+    """Fields named by ?fields=a,b,c, or `default`; raises ValueError for unknown names"""
+    raw = request.GET.get('fields')
+    if not raw:
+        return default
+    fields = tuple(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in MOVIE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def only_for(fields):
+    """Columns a queryset must load for serialize_movies(fields) when payloads are cached"""
+    return ['id', *(field for field in LIVE_FIELDS if field in fields)]
+
+
+def _payload_key(movie_id):
+    return f'movies:payload:{movie_id}'
+
+
+def _build_payload(movie):
+    return {name: read(movie) for name, read in MOVIE_FIELDS.items() if name not in LIVE_FIELDS}
+
+
+def serialize_movie_map(movies, fields=ALL_FIELDS):
+    """
+    Serialize `movies` to {movie_id: dict holding `fields`}.
+
+    The movies only need the only_for(fields) columns loaded. Versions and
+    payloads come back in one multi-get; the movies whose payload is missing
+    or stale are reloaded in one query and their payloads cached. Movies
+    deleted since the caller's query are left out.
+    """
+    movies = {movie.id: movie for movie in movies}
+    if not movies:
+        return {}
+    cached = cache.get_many(
+        [movie_version_key(movie_id) for movie_id in movies] + [_payload_key(movie_id) for movie_id in movies]
+    )
+    versions = get_movie_versions(movies, cached)
+
+    payloads, missing = {}, []
+    for movie_id in movies:
+        entry = cached.get(_payload_key(movie_id))
+        if entry is not None and entry[0] == versions[movie_id]:
+            payloads[movie_id] = entry[1]
+        else:
+            missing.append(movie_id)
+    if missing:
+        fresh = {}
+        for movie in Movie.objects.filter(id__in=missing).select_related('language').prefetch_related('genres'):
+            payloads[movie.id] = _build_payload(movie)
+            fresh[_payload_key(movie.id)] = (versions[movie.id], payloads[movie.id])
+        cache.set_many(fresh, settings.MOVIE_PAYLOAD_CACHE_TTL)
+
+    return {
+        movie_id: {
+            name: MOVIE_FIELDS[name](movies[movie_id]) if name in LIVE_FIELDS else payload[name]
+            for name in fields
+        }
+        for movie_id, payload in payloads.items()
+    }
+
+
+def serialize_movies(movies, fields=ALL_FIELDS):
+    """Serialize `movies` to a list of dicts holding `fields`, in order"""
+    movies = list(movies)
+    data = serialize_movie_map(movies, fields)
+    return [data[movie.id] for movie in movies if movie.id in data]
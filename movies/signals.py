@@ -0,0 +1,142 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .background import debounce
+from .cache import bump_catalog_version, bump_movie_versions
+from .leaderboards import forget_catalog_stats, movie_boards, record_rating_change, schedule_board_refresh, schedule_movie_boards
+from .models import RATING_FIELDS, Movie, Genre, Language, Review, UserInteraction, Watchlist
+from .recommendations import schedule_refresh
+from .watchlists import bump_watchlist_version
+
+
+CONTENT_REFRESH_DELAY = 5  # seconds; one admin save fires several signals
+
+
+def schedule_content_refresh(movie_id):
+    from .content import refresh_movie_content
+    debounce(('content', movie_id), CONTENT_REFRESH_DELAY, refresh_movie_content, movie_id)
+
+
+@receiver(post_save, sender=Movie)
+def movie_saved(sender, instance, update_fields=None, **kwargs):
+    schedule_movie_boards(instance.id)
+    if 'language_id' in instance.__dict__ and (update_fields is None or 'language' in update_fields):
+        old_language_id = getattr(instance, '_stored_language_id', None)
+        if old_language_id and old_language_id != instance.language_id:
+            schedule_board_refresh('language', old_language_id)
+        instance._stored_language_id = instance.language_id
+    # View counter bumps happen on every play; cached entries expire on their own TTL
+    if update_fields and set(update_fields) <= {'views'}:
+        return
+    bump_catalog_version()
+    bump_movie_versions([instance.id])
+    if not (update_fields and set(update_fields) <= {'views', *RATING_FIELDS}):
+        schedule_content_refresh(instance.id)
+
+
+@receiver(post_delete, sender=Movie)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(pre_delete, sender=Movie)
+def movie_deleting(sender, instance, **kwargs):
+    # Its board entries cascade away, leaving gaps in the ranks
+    for kind, key in movie_boards(instance):
+        schedule_board_refresh(kind, key)
+
+
+@receiver(pre_delete, sender=Genre)
+@receiver(pre_delete, sender=Language)
+def label_deleting(sender, instance, **kwargs):
+    # The movie links are gone by post_delete, so remember them now
+    instance._movie_ids = list(instance.movies.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+def label_changed(sender, instance, **kwargs):
+    # Genre and language names are part of every movie card that shows them
+    bump_catalog_version()
+    movie_ids = getattr(instance, '_movie_ids', None)
+    if movie_ids is None:
+        movie_ids = instance.movies.values_list('id', flat=True)
+    bump_movie_versions(movie_ids)
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def movie_genres_changed(sender, instance, action, reverse, pk_set=None, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._movie_ids = list(instance.movies.values_list('id', flat=True))
+    if action == 'pre_clear' and not reverse:
+        instance._genre_ids = list(instance.genres.values_list('id', flat=True))
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog_version()
+        if not reverse:
+            bump_movie_versions([instance.id])
+            schedule_content_refresh(instance.id)
+            schedule_movie_boards(instance.id)
+        else:
+            bump_movie_versions(pk_set if pk_set is not None else instance._movie_ids)
+    if action in ('post_remove', 'post_clear') and not reverse:
+        # The movie left these genres; their boards won't be reached via the movie any more
+        for genre_id in pk_set if pk_set is not None else instance._genre_ids:
+            schedule_board_refresh('genre', genre_id)
+    if action in ('post_add', 'post_remove', 'post_clear') and reverse:
+        schedule_board_refresh('genre', instance.id)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Mirror the change Review.save applies to the movie in the leaderboards'
+    # cached catalog totals; _stored_rating is still the old rating here.
+    # Connected before review_changed, so the totals move before its board refresh
+    stored_rating = getattr(instance, '_stored_rating', None)
+    rating = instance.rating
+    if created:
+        transaction.on_commit(lambda: record_rating_change(added=rating))
+    elif update_fields is not None and 'rating' not in update_fields:
+        return
+    elif stored_rating is None:
+        transaction.on_commit(forget_catalog_stats)
+    elif stored_rating != rating:
+        transaction.on_commit(lambda: record_rating_change(added=rating, removed=stored_rating))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    schedule_movie_boards(instance.movie_id)
+    # After commit, so a reader can't cache the old rating under the new version
+    transaction.on_commit(lambda: bump_movie_versions([instance.movie_id]))
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    # Handled here rather than in Review.delete so cascades (e.g. a deleted
+    # user) also update the aggregates, inside the same transaction
+    rating = getattr(instance, '_stored_rating', None) or instance.rating
+    Movie.apply_rating_change(instance.movie_id, removed=rating)
+    transaction.on_commit(lambda: record_rating_change(removed=rating))
+    try:
+        instance.refresh_cached_movie()
+    except Movie.DoesNotExist:
+        pass  # the movie itself is being deleted
+
+
+@receiver(post_save, sender=UserInteraction)
+@receiver(post_delete, sender=UserInteraction)
+def interaction_changed(sender, instance, **kwargs):
+    # After commit: a cascade from a deleted user removes its interactions
+    # first, and a refresh in between would store a list for that user
+    transaction.on_commit(lambda: schedule_refresh(instance.user_id))
+
+
+@receiver(post_save, sender=Watchlist)
+@receiver(post_delete, sender=Watchlist)
+def watchlist_changed(sender, instance, **kwargs):
+    # After commit, so a reader can't cache the old ids under the new version
+    transaction.on_commit(lambda: bump_watchlist_version(instance.user_id))
@@ -0,0 +1,246 @@
+"""
+Offline item-item similarity built from UserInteraction.
+
+The interaction table is turned into a sparse movie x user matrix whose
+cells are the summed interaction scores, neighbours are scored with cosine
+or Jaccard similarity, and the top-K per movie are written to
+MovieSimilarity so serving is a single indexed read.
+
+Every build also saves each movie's interaction count and score total to
+the model directory, so incremental updates can tell which movies gained,
+lost or changed interactions since (deleted rows, including cascades from
+a deleted user or movie, leave no other trace).
+"""
+import os
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from .models import Movie, MovieSimilarity, UserInteraction
+
+SIMILARITY_METHODS = ('cosine', 'jaccard')
+DEFAULT_TOP_K = 20
+BLOCK_SIZE = 256
+
+
+def load_interaction_matrix(chunk_size=50000, from_export=False, movies=None):
+    """
+    Build the score-weighted movie x user CSR matrix.
+
+    Returns (matrix, movie_ids, user_ids) where row i of the matrix belongs
+    to movie_ids[i] and column j to user_ids[j]. Repeated (user, movie)
+    pairs of different interaction types are summed. `movies` (ids or an
+    id queryset) limits the rows to those movies. With from_export the
+    published flat-file export is used instead of querying the database.
+    """
+    if from_export:
+        from .matrix_export import get_shared_matrix
+        shared = get_shared_matrix()
+        if shared is None:
+            raise FileNotFoundError('No interaction matrix export has been published')
+        return shared.csr().T.tocsr(), np.asarray(shared.movie_ids), np.asarray(shared.user_ids)
+
+    rows = UserInteraction.objects.values_list('movie_id', 'user_id', 'score')
+    if movies is not None:
+        rows = rows.filter(movie_id__in=movies)
+    movie_col, user_col, scores = [], [], []
+    for movie_id, user_id, score in rows.iterator(chunk_size=chunk_size):
+        movie_col.append(movie_id)
+        user_col.append(user_id)
+        scores.append(score)
+    return _to_csr(
+        np.asarray(movie_col, dtype=np.int64),
+        np.asarray(user_col, dtype=np.int64),
+        np.asarray(scores, dtype=np.float32),
+    )
+
+
+def _to_csr(movie_col, user_col, scores):
+    movie_ids, movie_idx = np.unique(movie_col, return_inverse=True)
+    user_ids, user_idx = np.unique(user_col, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (scores, (movie_idx, user_idx)),
+        shape=(len(movie_ids), len(user_ids)),
+        dtype=np.float32,
+    )
+    matrix.sum_duplicates()
+    return matrix, movie_ids, user_ids
+
+
+def _normalise(matrix, method):
+    if method == 'jaccard':
+        binary = matrix.copy()
+        binary.data[:] = 1.0
+        return binary
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms).dot(matrix).tocsr()
+
+
+def compute_neighbours(matrix, movie_ids, rows=None, k=DEFAULT_TOP_K, method='cosine'):
+    """
+    Score the given matrix rows against every movie and keep the top K.
+
+    Returns {movie_id: [(similar_movie_id, score), ...]} sorted by score.
+    Rows are processed in blocks so memory stays bounded by
+    BLOCK_SIZE x number of movies.
+    """
+    if method not in SIMILARITY_METHODS:
+        raise ValueError(f"Unknown similarity method: {method}")
+
+    normalised = _normalise(matrix, method)
+    transposed = normalised.T.tocsr()
+    counts = np.asarray(normalised.sum(axis=1)).ravel()
+    rows = np.arange(matrix.shape[0]) if rows is None else np.asarray(rows)
+
+    neighbours = {}
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = rows[start:start + BLOCK_SIZE]
+        scores = normalised[block].dot(transposed).toarray()
+        if method == 'jaccard':
+            union = counts[block][:, None] + counts[None, :] - scores
+            np.divide(scores, union, out=scores, where=union > 0)
+        scores[np.arange(len(block)), block] = 0.0
+
+        top_k = min(k, scores.shape[1] - 1)
+        if top_k <= 0:
+            continue
+        candidates = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        for offset, row in enumerate(block):
+            picked = candidates[offset]
+            picked = picked[np.argsort(-scores[offset, picked])]
+            neighbours[int(movie_ids[row])] = [
+                (int(movie_ids[col]), float(scores[offset, col]))
+                for col in picked if scores[offset, col] > 0
+            ]
+    return neighbours
+
+
+def store_neighbours(neighbours, kind='item', replace_all=False, batch_size=2000):
+    """
+    Replace stored neighbour lists for every movie in `neighbours`.
+
+    With replace_all the whole `kind` table is swapped, which also drops
+    lists of movies that no longer have any interactions.
+    """
+    existing = set(Movie.objects.values_list('id', flat=True))
+    rows = [
+        MovieSimilarity(movie_id=movie_id, similar_movie_id=similar_id, kind=kind, score=score)
+        for movie_id, ranked in neighbours.items() if movie_id in existing
+        for similar_id, score in ranked if similar_id in existing
+    ]
+    stale = MovieSimilarity.objects.filter(kind=kind)
+    movie_ids = list(neighbours)
+    with transaction.atomic():
+        if replace_all:
+            stale.delete()
+        else:
+            for start in range(0, len(movie_ids), 500):
+                stale.filter(movie_id__in=movie_ids[start:start + 500]).delete()
+        MovieSimilarity.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def totals_path():
+    return os.path.join(settings.RECOMMENDER_MODEL_DIR, 'similarity_totals.npz')
+
+
+def interaction_totals():
+    """{movie_id: (interaction count, score total)} over UserInteraction"""
+    rows = UserInteraction.objects.values('movie_id').annotate(count=Count('id'), total=Sum('score')).order_by()
+    return {row['movie_id']: (row['count'], row['total']) for row in rows}
+
+
+def save_totals(totals):
+    """Write the totals the stored lists were built from, atomically"""
+    path = totals_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f, movie_ids=np.fromiter(totals, dtype=np.int64, count=len(totals)),
+            counts=np.array([count for count, _ in totals.values()], dtype=np.int64),
+            scores=np.array([total for _, total in totals.values()], dtype=np.float64),
+        )
+    os.replace(tmp_path, path)
+
+
+def load_totals():
+    """The totals saved by the last build, or None"""
+    try:
+        with np.load(totals_path()) as data:
+            return {
+                int(movie_id): (int(count), float(total))
+                for movie_id, count, total in zip(data['movie_ids'], data['counts'], data['scores'])
+            }
+    except FileNotFoundError:
+        return None
+
+
+def rebuild_similarities(k=DEFAULT_TOP_K, method='cosine', from_export=False):
+    """Recompute the neighbour lists of every movie with interactions"""
+    totals = interaction_totals()
+    matrix, movie_ids, _ = load_interaction_matrix(from_export=from_export)
+    neighbours = compute_neighbours(matrix, movie_ids, k=k, method=method)
+    stored = store_neighbours(neighbours, replace_all=True)
+    save_totals(totals)
+    return len(neighbours), stored
+
+
+def update_similarities(since=None, k=DEFAULT_TOP_K, method='cosine'):
+    """
+    Incrementally refresh neighbour lists after interactions changed.
+
+    A movie whose interactions changed has new scores against every other
+    movie, so its own list and the lists that show it are recomputed, and
+    a new (user, movie) interaction can also lift the movie into the list
+    of any other movie the same user touched. Changed movies are the ones
+    with interactions newer than `since` (by default the last stored build)
+    and the ones whose interaction totals differ from those saved by the
+    last build, which catches deletions. A deleted movie's rows in other
+    lists are gone with it, so lists shorter than `k` are refilled then.
+
+    Only the interactions of the affected movies and of the movies they
+    share a user with are loaded, which is all their scores depend on.
+    Without saved totals or a stored build everything is rebuilt.
+    """
+    if since is None:
+        since = MovieSimilarity.objects.filter(kind='item').aggregate(Max('computed_at'))['computed_at__max']
+    previous = load_totals()
+    if since is None or previous is None:
+        return rebuild_similarities(k=k, method=method)
+
+    totals = interaction_totals()
+    added = UserInteraction.objects.filter(created_at__gt=since)
+    changed = set(added.values_list('movie_id', flat=True)) | {
+        movie_id for movie_id in previous.keys() | totals.keys() if previous.get(movie_id) != totals.get(movie_id)
+    }
+    if not changed:
+        return 0, 0
+
+    stored_lists = MovieSimilarity.objects.filter(kind='item')
+    affected = changed | set(
+        UserInteraction.objects.filter(user_id__in=added.values('user_id')).values_list('movie_id', flat=True)
+    ) | set(stored_lists.filter(similar_movie_id__in=changed).values_list('movie_id', flat=True))
+    if previous.keys() - set(Movie.objects.filter(id__in=previous.keys()).values_list('id', flat=True)):
+        affected |= set(stored_lists.values('movie_id').annotate(n=Count('id')).filter(n__lt=k).values_list(
+            'movie_id', flat=True
+        ))
+    affected = sorted(affected)
+
+    # Every movie sharing a user with an affected movie, with all of its interactions
+    users = UserInteraction.objects.filter(movie_id__in=affected).values('user_id')
+    matrix, movie_ids, _ = load_interaction_matrix(
+        movies=UserInteraction.objects.filter(user_id__in=users).values('movie_id')
+    )
+    rows = np.flatnonzero(np.isin(movie_ids, affected))
+    neighbours = compute_neighbours(matrix, movie_ids, rows=rows, k=k, method=method)
+    for movie_id in affected:
+        # No interactions left, so nothing to list
+        neighbours.setdefault(movie_id, [])
+    stored = store_neighbours(neighbours)
+    save_totals(totals)
+    return len(neighbours), stored
@@ -39,6 +39,30 @@ class JetflixPlayer {
         this.lastVolume = 1;
         this.isDragging = false;
         
+        // Watch progress: resume point and heartbeat settings from the page
+        this.movieId = this.video.dataset.movieId;
+        this.resumePosition = parseFloat(this.video.dataset.resumePosition) || 0;
+        this.heartbeatUrl = this.video.dataset.heartbeatUrl;
+        this.heartbeatInterval = (parseInt(this.video.dataset.heartbeatInterval) || 15) * 1000;
+        this.csrfToken = this.video.dataset.csrfToken;
+        this.heartbeatTimer = null;
+        this.hasPlayed = false;
+        this.lastReportedPosition = null;
+        
+        // Playback QoE measurements, batched into one beacon per heartbeat
+        this.qoeUrl = this.video.dataset.qoeUrl;
+        this.qoeEvents = [];
+        this.playRequestedAt = null;
+        this.firstFrameSeen = false;
+        this.stallStartedAt = null;
+        this.seekStartedAt = null;
+        this.reportedBytes = 0;
+        
+        // Retries after the server turns a stream away (503 while busy)
+        this.retryCount = 0;
+        this.maxRetries = 5;
+        this.retryDelay = 5000;
+        
         // User preferences (session storage)
         this.loadPreferences();
         
@@ -64,10 +88,31 @@ class JetflixPlayer {
         this.video.addEventListener('play', () => this.onPlay());
         this.video.addEventListener('pause', () => this.onPause());
         this.video.addEventListener('timeupdate', () => this.updateProgress());
-        this.video.addEventListener('loadedmetadata', () => this.updateDuration());
+        this.video.addEventListener('loadedmetadata', () => {
+            this.updateDuration();
+            this.resume();
+        });
         this.video.addEventListener('durationchange', () => this.updateDuration());
         this.video.addEventListener('volumechange', () => this.updateVolumeUI());
         this.video.addEventListener('ended', () => this.onVideoEnd());
+        this.video.addEventListener('error', () => this.onVideoError());
+        
+        // QoE: startup time, stalls and seek latency
+        this.video.addEventListener('play', () => {
+            if (this.playRequestedAt === null) this.playRequestedAt = performance.now();
+        });
+        this.video.addEventListener('playing', () => this.onPlaying());
+        this.video.addEventListener('waiting', () => {
+            if (this.firstFrameSeen && !this.video.seeking) this.stallStartedAt = performance.now();
+        });
+        this.video.addEventListener('seeking', () => {
+            this.seekStartedAt = performance.now();
+            this.stallStartedAt = null;
+        });
+        this.video.addEventListener('seeked', () => {
+            if (this.seekStartedAt !== null) this.recordQoE('seek', performance.now() - this.seekStartedAt);
+            this.seekStartedAt = null;
+        });
         
         // Control events - ensure elements exist before adding listeners
         if (this.playPauseBtn) this.playPauseBtn.addEventListener('click', () => this.togglePlayPause());
@@ -95,6 +140,12 @@ class JetflixPlayer {
         document.addEventListener('mozfullscreenchange', () => this.onFullscreenChange());
         document.addEventListener('MSFullscreenChange', () => this.onFullscreenChange());
         
+        // Report the position when the page is hidden or closed
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') this.report();
+        });
+        window.addEventListener('pagehide', () => this.report());
+        
         // Quality menu outside click
         document.addEventListener('click', (e) => {
             if (this.qualityBtn && this.qualityMenu && 
@@ -420,6 +471,7 @@ class JetflixPlayer {
         this.playPauseBtn.querySelector('.play-icon').style.display = 'none';
         this.playPauseBtn.querySelector('.pause-icon').style.display = 'block';
         this.hideCenterPlayButton();
+        this.startHeartbeat();
     }
     
     onPause() {
@@ -428,12 +480,114 @@ class JetflixPlayer {
         this.playPauseBtn.querySelector('.pause-icon').style.display = 'none';
         this.showCenterPlayButton();
         this.showControls();
+        this.stopHeartbeat();
     }
     
     onVideoEnd() {
         this.isPlaying = false;
         this.showCenterPlayButton();
         this.showControls();
+        this.stopHeartbeat();
+    }
+    
+    // Watch progress
+    resume() {
+        const d = this.video.duration;
+        if (this.resumePosition > 0 && (!isFinite(d) || this.resumePosition < d)) {
+            this.video.currentTime = this.resumePosition;
+        }
+        this.resumePosition = 0;
+    }
+    
+    startHeartbeat() {
+        this.hasPlayed = true;
+        clearInterval(this.heartbeatTimer);
+        this.heartbeatTimer = setInterval(() => this.report(), this.heartbeatInterval);
+    }
+    
+    stopHeartbeat() {
+        clearInterval(this.heartbeatTimer);
+        this.heartbeatTimer = null;
+        this.report();
+    }
+    
+    report() {
+        this.sendHeartbeat();
+        this.flushQoE();
+    }
+    
+    sendHeartbeat() {
+        // Nothing to report before playback starts (and the resume seek is done)
+        if (!this.hasPlayed || !this.heartbeatUrl || !navigator.sendBeacon) return;
+        
+        const position = Math.floor(this.video.currentTime);
+        if (position === this.lastReportedPosition) return;
+        this.lastReportedPosition = position;
+        
+        const d = this.video.duration;
+        const body = new FormData();
+        body.append('movie_id', this.movieId);
+        body.append('position', position);
+        body.append('duration', isFinite(d) ? Math.floor(d) : 0);
+        body.append('csrfmiddlewaretoken', this.csrfToken);
+        navigator.sendBeacon(this.heartbeatUrl, body);
+    }
+    
+    // Playback QoE
+    onPlaying() {
+        this.retryCount = 0;
+        const now = performance.now();
+        if (!this.firstFrameSeen) {
+            this.firstFrameSeen = true;
+            if (this.playRequestedAt !== null) this.recordQoE('startup', now - this.playRequestedAt);
+        } else if (this.stallStartedAt !== null) {
+            this.recordQoE('stall', now - this.stallStartedAt);
+        }
+        this.stallStartedAt = null;
+    }
+    
+    recordQoE(metric, value) {
+        this.qoeEvents.push({ metric, value: Math.round(value) });
+    }
+    
+    fetchedBytes() {
+        // Only counts what the browser exposes through Resource Timing
+        return performance.getEntriesByType('resource')
+            .filter(entry => entry.name === this.video.currentSrc)
+            .reduce((total, entry) => total + (entry.transferSize || 0), 0);
+    }
+    
+    flushQoE() {
+        if (!this.qoeUrl || !navigator.sendBeacon) return;
+        
+        const bytes = this.fetchedBytes();
+        if (bytes > this.reportedBytes) {
+            this.recordQoE('bytes', bytes - this.reportedBytes);
+            this.reportedBytes = bytes;
+        }
+        if (!this.qoeEvents.length) return;
+        
+        const body = new FormData();
+        body.append('movie_id', this.movieId);
+        body.append('events', JSON.stringify(this.qoeEvents.splice(0, 100)));
+        body.append('csrfmiddlewaretoken', this.csrfToken);
+        navigator.sendBeacon(this.qoeUrl, body);
+    }
+    
+    onVideoError() {
+        if (this.video.error) this.recordQoE('error', this.video.error.code);
+        
+        // A busy server answers 503; retry from the same position a few times
+        if (this.retryCount >= this.maxRetries) return;
+        this.retryCount++;
+        const position = this.video.currentTime;
+        const wasPlaying = this.isPlaying;
+        this.showBufferingIndicator();
+        setTimeout(() => {
+            this.resumePosition = position;
+            this.video.load();
+            if (wasPlaying) this.video.play().catch(() => {});
+        }, this.retryDelay);
     }
     
     onFullscreenChange() {
@@ -0,0 +1,129 @@
+"""
+Admission control for media streams.
+
+A streamed video holds a server worker for as long as the client reads it,
+so an unbounded number of streams can starve pages and APIs served by the
+same process. limit_media_streams wraps a media view: stream_tracker counts
+open media responses per viewer and in total, and a new one is refused
+past STREAM_MAX_PER_USER per viewer or past the media share of the
+process's worker threads (the rest stays reserved for non-media routes)
+with a 503 and Retry-After.
+
+A slot is held from admission until the server closes the response, which
+it does once the body is sent or the client goes away. Counts are per
+process; each process enforces its own caps.
+"""
+import mimetypes
+import threading
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse
+
+
+class StreamLimitExceeded(Exception):
+    pass
+
+
+def node_stream_limit():
+    """Media streams one process may serve at once"""
+    return max(1, int(settings.SERVER_WORKER_THREADS * settings.MEDIA_WORKER_SHARE))
+
+
+def viewer_key(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.id}'
+    return f'ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+class _TrackedStream:
+    """Streaming body that gives its slot back when the response is closed"""
+
+    def __init__(self, tracker, key, content):
+        self.tracker = tracker
+        self.key = key
+        self.content = content
+        self.released = False
+
+    def __iter__(self):
+        return iter(self.content)
+
+    def close(self):
+        if not self.released:
+            self.released = True
+            self.tracker.release(self.key)
+
+
+class StreamTracker:
+    """Per-process counters of open media streams"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_viewer = Counter()
+        self.rejected = 0
+
+    def acquire(self, key):
+        """Take a stream slot for `key`; raises StreamLimitExceeded when a cap is reached"""
+        with self._lock:
+            if self.by_viewer[key] >= settings.STREAM_MAX_PER_USER:
+                self.rejected += 1
+                raise StreamLimitExceeded('Too many simultaneous streams for this account')
+            if sum(self.by_viewer.values()) >= node_stream_limit():
+                self.rejected += 1
+                raise StreamLimitExceeded('Server busy, please retry shortly')
+            self.by_viewer[key] += 1
+
+    def release(self, key):
+        with self._lock:
+            self.by_viewer[key] -= 1
+            if self.by_viewer[key] <= 0:
+                del self.by_viewer[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': sum(self.by_viewer.values()),
+                'viewers': len(self.by_viewer),
+                'limit': node_stream_limit(),
+                'rejected': self.rejected,
+            }
+
+
+stream_tracker = StreamTracker()
+
+
+def limit_media_streams(view):
+    """
+    Admit a media view's video and audio responses through stream_tracker.
+
+    Media is recognised by the file type of the `path` argument (unknown
+    types count, as video_stream serves them as video/mp4); images and
+    other files pass straight through. A streamed response keeps its slot
+    until it is closed; any other response or an exception frees it at once.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        content_type, _ = mimetypes.guess_type(kwargs.get('path', ''))
+        if content_type and not content_type.startswith(('video/', 'audio/')):
+            return view(request, *args, **kwargs)
+
+        key = viewer_key(request)
+        try:
+            stream_tracker.acquire(key)
+        except StreamLimitExceeded as e:
+            response = HttpResponse(str(e), status=503, content_type='text/plain')
+            response['Retry-After'] = str(settings.STREAM_RETRY_AFTER)
+            return response
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            stream_tracker.release(key)
+            raise
+        if response.streaming:
+            response.streaming_content = _TrackedStream(stream_tracker, key, response.streaming_content)
+        else:
+            stream_tracker.release(key)
+        return response
+
+    return wrapper
@@ -1,3 +1,1709 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from scipy import sparse
+from django.contrib.auth.models import AnonymousUser, User
+from django.middleware.csrf import get_token
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models import QuerySet
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from home.models import Payment
+
+from .ann import IVFIndex, _index_file as ann_index_file, benchmark, get_index, index_path
+from .background import debounce, gather, throttle
+from .cache import (
+    CSRF_PLACEHOLDER, bump_catalog_version, bump_movie_versions, cache_anonymous_page, get_movie_versions,
+)
+from .cards import attach_movie_cards
+from .content import (
+    _model_file as content_model_file, content_model_path, current_content_model, get_content_model,
+    rebuild_content_model,
+)
+from .evaluation import PopularStrategy, Strategy, evaluate, generate_dataset, run_evaluation
+from .factorization import FactorModel, get_model, model_path, reset_model_cache, save_model, train_als
+from .leaderboards import get_leaderboard_page, rebuild_leaderboards, update_board_entry
+from .loadgen import generate_load_data
+from .matrix_export import SharedInteractionMatrix, export_interaction_matrix
+from .models import (
+    Genre, Language, LeaderboardEntry, Movie, MoviePlayRollup, MovieSimilarity, PlaybackEvent, QoERollup, Review,
+    TrendingMovie, UserInteraction, UserRecommendation, WatchHistory, Watchlist, WatchProgress,
+)
+from .pagination import InvalidCursor, encode_cursor, paginate
+from .progress import continue_watching, flush_progress, get_resume_position, record_heartbeat
+from .qoe import MAX_EVENTS_PER_BEACON, parse_events, rollup_qoe
+from .recommendations import (
+    STORED_RECOMMENDATIONS, _inflight, popular_movie_ids, refresh_stale_recommendations, refresh_user_recommendations,
+    tier_stats,
+)
+from .serializers import SUMMARY_FIELDS, only_for, parse_fields, serialize_movie_map, serialize_movies
+from .similarity import load_interaction_matrix, rebuild_similarities, totals_path, update_similarities
+from .trending import compute_trending, get_trending_movies, prune_rollups, record_play
+from .streams import StreamTracker, limit_media_streams
+from .watchlists import BULK_MAX_IDS, apply_watchlist_changes
+
+
+class RatingAggregateTests(TestCase):
+    """Movie rating fields kept in step with reviews through apply_rating_change"""
+
+    def setUp(self):
+        self.movie = Movie.objects.create(
+            title='Test Movie', year=2020, description='A test movie',
+            thumbnail='thumbnails/test.jpg', video='movies/test.mp4'
+        )
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+
+    def assertAggregates(self, rating_sum, rating_count, histogram):
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.rating_sum, rating_sum)
+        self.assertEqual(self.movie.rating_count, rating_count)
+        self.assertEqual(self.movie.rating_histogram, {star: histogram.get(star, 0) for star in range(1, 6)})
+        self.assertAlmostEqual(self.movie.review_stars, rating_sum / rating_count if rating_count else 0.0)
+
+    def test_create_adds_rating(self):
+        Review.objects.create(user=self.alice, movie=self.movie, rating=4, review_text='Good')
+        self.assertAggregates(4, 1, {4: 1})
+        Review.objects.create(user=self.bob, movie=self.movie, rating=1, review_text='Bad')
+        self.assertAggregates(5, 2, {4: 1, 1: 1})
+
+    def test_edit_moves_rating(self):
+        Review.objects.create(user=self.alice, movie=self.movie, rating=4, review_text='Good')
+        review = Review.objects.get(user=self.alice, movie=self.movie)
+        self.assertEqual(review._stored_rating, 4)
+
+        review.rating = 2
+        review.save()
+        self.assertEqual(review._stored_rating, 2)
+        self.assertAggregates(2, 1, {2: 1})
+
+        # A second edit of the same instance applies the delta from the new rating
+        review.rating = 5
+        review.save()
+        self.assertAggregates(5, 1, {5: 1})
+
+    def test_edit_to_same_rating_changes_nothing(self):
+        Review.objects.create(user=self.alice, movie=self.movie, rating=3, review_text='Fine')
+        review = Review.objects.get(user=self.alice, movie=self.movie)
+        review.rating = 3
+        review.review_text = 'Still fine'
+        review.save()
+        self.assertAggregates(3, 1, {3: 1})
+
+    def test_text_only_update_keeps_rating(self):
+        review = Review.objects.create(user=self.alice, movie=self.movie, rating=3, review_text='Fine')
+        review.review_text = 'Edited'
+        review.save(update_fields=['review_text'])
+        self.assertAggregates(3, 1, {3: 1})
+
+    def test_delete_removes_stored_rating(self):
+        Review.objects.create(user=self.alice, movie=self.movie, rating=5, review_text='Great')
+        Review.objects.create(user=self.bob, movie=self.movie, rating=2, review_text='Meh')
+        review = Review.objects.get(user=self.alice, movie=self.movie)
+        # An unsaved change must not be what gets subtracted
+        review.rating = 1
+        review.delete()
+        self.assertAggregates(2, 1, {2: 1})
+
+    def test_cascade_delete_removes_rating(self):
+        Review.objects.create(user=self.alice, movie=self.movie, rating=5, review_text='Great')
+        Review.objects.create(user=self.bob, movie=self.movie, rating=2, review_text='Meh')
+        self.bob.delete()
+        self.assertAggregates(5, 1, {5: 1})
+
+    def test_save_over_unloaded_row_recounts(self):
+        existing = Review.objects.create(user=self.alice, movie=self.movie, rating=2, review_text='Meh')
+        # Built by hand rather than loaded, so the stored rating is unknown
+        review = Review(
+            id=existing.id, user=self.alice, movie=self.movie, rating=4,
+            review_text='Better', created_at=existing.created_at
+        )
+        review.save()
+        self.assertAggregates(4, 1, {4: 1})
+
+    def test_review_endpoints_apply_deltas(self):
+        review = Review.objects.create(user=self.alice, movie=self.movie, rating=4, review_text='Good')
+        self.client.force_login(self.alice)
+
+        response = self.client.post(
+            reverse('movies:edit_review', args=[review.id]),
+            data={'rating': 1, 'review_text': 'Worse on rewatch'}, content_type='application/json'
+        )
+        self.assertEqual(response.json()['average_rating'], 1.0)
+        self.assertAggregates(1, 1, {1: 1})
+
+        response = self.client.post(reverse('movies:delete_review', args=[review.id]))
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertAggregates(0, 0, {})
+
+    def test_apply_rating_change_deltas(self):
+        Movie.apply_rating_change(self.movie.id, added=5)
+        Movie.apply_rating_change(self.movie.id, added=3)
+        self.assertAggregates(8, 2, {5: 1, 3: 1})
+        Movie.apply_rating_change(self.movie.id, added=1, removed=5)
+        self.assertAggregates(4, 2, {1: 1, 3: 1})
+        Movie.apply_rating_change(self.movie.id, added=3, removed=3)
+        self.assertAggregates(4, 2, {1: 1, 3: 1})
+        Movie.apply_rating_change(self.movie.id, removed=1)
+        Movie.apply_rating_change(self.movie.id, removed=3)
+        self.assertAggregates(0, 0, {})
+
+
+class CursorPaginationTests(TestCase):
+    """Keyset pages over rows whose sort keys tie, and malformed cursors"""
+
+    def setUp(self):
+        self.movie = Movie.objects.create(
+            title='Test Movie', year=2020, description='A test movie',
+            thumbnail='thumbnails/test.jpg', video='movies/test.mp4'
+        )
+        for i in range(7):
+            Movie.objects.create(
+                title=f'Movie {i}', year=2000 + i % 2, description='Another movie',
+                thumbnail='thumbnails/test.jpg', video='movies/test.mp4'
+            )
+        users = [User.objects.create_user(username=f'user{i}') for i in range(7)]
+        for i, user in enumerate(users):
+            Review.objects.create(user=user, movie=self.movie, rating=i % 5 + 1, review_text='Review')
+        # Every review shares one timestamp, so only the id breaks ties
+        Review.objects.update(created_at=timezone.now())
+
+    def collect(self, queryset, ordering, page_size):
+        ids, cursor = [], None
+        while True:
+            page = paginate(queryset, ordering, cursor, page_size)
+            ids += [row.id for row in page.items]
+            if not page.has_more:
+                return ids
+            cursor = page.next_cursor
+
+    def test_tied_keys_page_without_skips_or_repeats(self):
+        movies = Movie.objects.all()
+        expected = list(movies.order_by('-year', '-id').values_list('id', flat=True))
+        for page_size in (1, 2, 3, 8, 20):
+            self.assertEqual(self.collect(movies, ['-year', '-id'], page_size), expected)
+
+        expected = list(movies.order_by('year', 'title', '-id').values_list('id', flat=True))
+        self.assertEqual(self.collect(movies, ['year', 'title', '-id'], 3), expected)
+
+    def test_reviews_endpoint_pages_tied_timestamps(self):
+        url = reverse('movies:get_reviews', args=[self.movie.id])
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3, **({'cursor': cursor} if cursor else {})}
+            data = self.client.get(url, params).json()
+            self.assertEqual(data['status'], 'success')
+            seen += [review['id'] for review in data['reviews']]
+            if not data['has_more']:
+                break
+            cursor = data['next_cursor']
+        self.assertEqual(seen, sorted(Review.objects.values_list('id', flat=True), reverse=True))
+
+    def test_bad_cursor_is_rejected(self):
+        for cursor in ('not-a-cursor', encode_cursor([1]), encode_cursor(['yesterday', 3]), '%%%'):
+            with self.assertRaises(InvalidCursor):
+                paginate(Review.objects.all(), ['-created_at', '-id'], cursor)
+
+            response = self.client.get(
+                reverse('movies:get_reviews', args=[self.movie.id]), {'cursor': cursor}
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['status'], 'error')
+
+
+class MovieSerializerTests(TestCase):
+    """Cached per-movie payloads, live fields and ?fields= projection"""
+
+    def setUp(self):
+        cache.clear()
+        self.drama = Genre.objects.create(name='Drama')
+        self.movie = Movie.objects.create(
+            title='Test Movie', year=2020, description='A test movie',
+            thumbnail='thumbnails/test.jpg', video='movies/test.mp4'
+        )
+        self.movie.genres.add(self.drama)
+        self.bare = Movie.objects.create(title='No Art', year=2021, description='', thumbnail='', video='')
+
+    def test_payload_fields(self):
+        data = serialize_movie_map(Movie.objects.all())
+        self.assertEqual(data[self.movie.id]['thumbnail'], self.movie.thumbnail.url)
+        self.assertEqual(data[self.movie.id]['genres'], 'Drama')
+        # The API reports a missing image as ''; templates choose the placeholder
+        self.assertEqual(data[self.bare.id]['thumbnail'], '')
+        self.assertEqual(data[self.bare.id]['video'], '')
+        self.assertEqual(data[self.bare.id]['language'], 'Unknown')
+
+    def test_cached_payload_follows_movie_version(self):
+        fields = ('id', 'title', 'views')
+        serialize_movies(Movie.objects.only(*only_for(fields)), fields)
+        with self.assertNumQueries(1):
+            data = serialize_movies(Movie.objects.only(*only_for(fields)).order_by('id'), fields)
+        self.assertEqual(data[0], {'id': self.movie.id, 'title': 'Test Movie', 'views': 0})
+
+        # Views are read from the row, not the cached payload
+        Movie.objects.filter(id=self.movie.id).update(views=7)
+        data = serialize_movies(Movie.objects.only(*only_for(fields)).order_by('id'), fields)
+        self.assertEqual(data[0]['views'], 7)
+
+        self.movie.title = 'Renamed'
+        self.movie.save()
+        data = serialize_movies(Movie.objects.only(*only_for(fields)).order_by('id'), fields)
+        self.assertEqual(data[0]['title'], 'Renamed')
+
+    def test_field_selection(self):
+        self.assertEqual(only_for(('title', 'rating')), ['id'])
+        self.assertEqual(only_for(('title', 'views')), ['id', 'views'])
+
+        request = RequestFactory().get('/', {'fields': 'id, title,id'})
+        self.assertEqual(parse_fields(request), ('id', 'title'))
+        self.assertEqual(parse_fields(RequestFactory().get('/'), default=SUMMARY_FIELDS), SUMMARY_FIELDS)
+        with self.assertRaises(ValueError):
+            parse_fields(RequestFactory().get('/', {'fields': 'id,secret'}))
+
+    def test_unknown_field_is_a_bad_request(self):
+        response = self.client.get(reverse('movies:get_similar_movies', args=[self.movie.id]), {'fields': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+
+class LeaderboardTests(TestCase):
+    """Board builds, single-movie re-ranks and boards a movie leaves"""
+
+    def setUp(self):
+        cache.clear()
+        self.drama = Genre.objects.create(name='Drama')
+        self.horror = Genre.objects.create(name='Horror')
+        self.english = Language.objects.create(name='English', code='en')
+        self.french = Language.objects.create(name='French', code='fr')
+        # Catalog mean 4.0 and no views: great 4.25, unrated 4.0, fair 3.75
+        self.great = self.create_movie('Great', rating_sum=45, rating_count=10)
+        self.unrated = self.create_movie('Unrated')
+        self.fair = self.create_movie('Fair', rating_sum=35, rating_count=10)
+        self.hidden = self.create_movie('Hidden', is_published=False)
+        self.user = User.objects.create_user(username='critic')
+        rebuild_leaderboards()
+
+    def create_movie(self, title, **fields):
+        movie = Movie.objects.create(
+            title=title, year=2020, description='A test movie', language=self.english,
+            thumbnail='thumbnails/test.jpg', video='movies/test.mp4', **fields
+        )
+        movie.genres.add(self.drama, self.horror)
+        return movie
+
+    def board(self, kind, key):
+        return list(LeaderboardEntry.objects.filter(kind=kind, key=key).order_by('rank').values_list('movie_id', flat=True))
+
+    def page(self, kind, key, page=1, page_size=20):
+        return [entry.movie_id for entry in get_leaderboard_page(kind, key, page, page_size)]
+
+    def test_boards_rank_published_movies(self):
+        expected = [self.great.id, self.unrated.id, self.fair.id]
+        self.assertEqual(self.board('genre', self.drama.id), expected)
+        self.assertEqual(self.board('language', self.english.id), expected)
+        self.assertEqual(self.board('language', self.french.id), [])
+        self.assertEqual(
+            list(LeaderboardEntry.objects.filter(kind='genre', key=self.drama.id).values_list('rank', flat=True)),
+            [1, 2, 3]
+        )
+
+    def test_pages(self):
+        self.assertEqual(self.page('genre', self.drama.id, 1, 2), [self.great.id, self.unrated.id])
+        self.assertEqual(self.page('genre', self.drama.id, 2, 2), [self.fair.id])
+        self.assertEqual(self.page('genre', self.drama.id, 3, 2), [])
+
+    def test_rating_change_reranks(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(user=self.user, movie=self.unrated, rating=1, review_text='Dull')
+        # The new review moved the catalog mean, so every board was rebuilt
+        self.assertEqual(self.board('genre', self.drama.id), [self.great.id, self.fair.id, self.unrated.id])
+        self.assertEqual(self.board('language', self.english.id), [self.great.id, self.fair.id, self.unrated.id])
+
+    def test_single_entry_update(self):
+        fair = Movie.objects.get(id=self.fair.id)
+        fair.rating_sum = 41
+        self.assertTrue(update_board_entry('genre', self.drama.id, fair))
+        self.assertEqual(self.board('genre', self.drama.id), [self.great.id, self.fair.id, self.unrated.id])
+
+        # Once the catalog stats move, the stored scores can't be patched
+        cache.set('movies:leaderboards:max_views', 1000)
+        self.assertFalse(update_board_entry('genre', self.drama.id, fair))
+
+    def test_unpublished_movie_leaves_boards(self):
+        self.great.is_published = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.great.save()
+        self.assertEqual(self.board('genre', self.drama.id), [self.unrated.id, self.fair.id])
+        self.assertEqual(self.page('language', self.english.id), [self.unrated.id, self.fair.id])
+
+    def test_stale_entries_are_skipped_before_the_rebuild(self):
+        Movie.objects.filter(id=self.great.id).update(is_published=False)
+        self.fair.genres.remove(self.drama)
+        self.assertEqual(self.page('genre', self.drama.id), [self.unrated.id])
+
+    def test_genre_removal_refreshes_the_old_board(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.great.genres.remove(self.drama)
+        self.assertEqual(self.board('genre', self.drama.id), [self.unrated.id, self.fair.id])
+        self.assertEqual(self.board('genre', self.horror.id), [self.great.id, self.unrated.id, self.fair.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.unrated.genres.clear()
+        self.assertEqual(self.board('genre', self.drama.id), [self.fair.id])
+        self.assertEqual(self.board('genre', self.horror.id), [self.great.id, self.fair.id])
+
+        # From the genre's side
+        with self.captureOnCommitCallbacks(execute=True):
+            self.horror.movies.remove(self.fair)
+        self.assertEqual(self.board('genre', self.horror.id), [self.great.id])
+
+    def test_language_change_refreshes_the_old_board(self):
+        movie = Movie.objects.get(id=self.fair.id)
+        movie.language = self.french
+        with self.captureOnCommitCallbacks(execute=True):
+            movie.save()
+        self.assertEqual(self.board('language', self.english.id), [self.great.id, self.unrated.id])
+        self.assertEqual(self.board('language', self.french.id), [self.fair.id])
+
+    def test_deleted_movie_leaves_no_gap(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.unrated.delete()
+        self.assertEqual(self.page('genre', self.drama.id, 1, 1), [self.great.id])
+        self.assertEqual(self.page('genre', self.drama.id, 2, 1), [self.fair.id])
+
+
+@override_settings(LANDING_EAGER_ROWS=1, LANDING_ROW_SIZE=2)
+class LandingPageTests(TestCase):
+    """The streamed landing page and the landing_row pages its lazy rows fetch"""
+
+    def setUp(self):
+        cache.clear()
+        self.action = Genre.objects.create(name='Action')
+        self.comedy = Genre.objects.create(name='Comedy')
+        self.english = Language.objects.create(name='English', code='en')
+        for i in range(3):
+            movie = Movie.objects.create(
+                title=f'Action {i}', year=2020, description='A test movie', language=self.english,
+                thumbnail='thumbnails/test.jpg', video='movies/test.mp4'
+            )
+            movie.genres.add(self.action)
+        movie.genres.add(self.comedy)
+        Genre.objects.create(name='Empty')
+        self.client.force_login(User.objects.create_user(username='viewer'))
+
+    def test_streams_eager_rows_then_placeholders(self):
+        response = self.client.get(reverse('movies:landing'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        page = ''.join(chunks)
+
+        # The page head is sent on its own, before any row
+        self.assertNotIn('data-row-url', chunks[0])
+        # The first row renders its newest cards and a cursor for the rest
+        eager = chunks[1]
+        self.assertIn('Action 2', eager)
+        self.assertIn('Action 1', eager)
+        self.assertNotIn('Action 0', eager)
+        self.assertIn('data-next-cursor=', eager)
+        self.assertNotIn('lazy-row', eager)
+        # Later rows are placeholders; rows without published movies are left out
+        self.assertEqual(page.count('category-section lazy-row'), 2)
+        self.assertIn(reverse('movies:landing_row', args=['genre', self.comedy.id]), page)
+        self.assertIn(reverse('movies:landing_row', args=['language', self.english.id]), page)
+        self.assertNotIn('Empty', page)
+        self.assertTrue(page.rstrip().endswith('</html>'))
+
+    def test_row_pages(self):
+        url = reverse('movies:landing_row', args=['genre', self.action.id])
+        data = self.client.get(url).json()
+        self.assertEqual(data['status'], 'success')
+        self.assertTrue(data['has_more'])
+        self.assertIn('Action 2', data['html'])
+        self.assertNotIn('Action 0', data['html'])
+
+        data = self.client.get(url, {'cursor': data['next_cursor']}).json()
+        self.assertFalse(data['has_more'])
+        self.assertIsNone(data['next_cursor'])
+        self.assertIn('Action 0', data['html'])
+        self.assertNotIn('Action 1', data['html'])
+
+        self.assertEqual(self.client.get(reverse('movies:landing_row', args=['year', 1])).status_code, 404)
+        self.assertEqual(self.client.get(url, {'cursor': 'not-a-cursor'}).json()['status'], 'error')
+
+
+class ContentModelTests(TestCase):
+    """Full TF-IDF builds and the incremental refresh run when a movie is saved"""
+
+    def setUp(self):
+        self.scifi = Genre.objects.create(name='Sci-Fi')
+        self.romance = Genre.objects.create(name='Romance')
+        self.pirates = self.create_movie('Space Pirates', 'Space pirates raid cargo ships near Jupiter', self.scifi)
+        self.sequel = self.create_movie('Space Pirates Return', 'The space pirates raid Jupiter again', self.scifi)
+        self.paris = self.create_movie('Paris', 'A quiet romance between two painters in Paris', self.romance)
+        self.letters = self.create_movie('Letters', 'Two painters write letters about romance and Paris', self.romance)
+        rebuild_content_model(k=2)
+        self.addCleanup(content_model_file.reset)
+        self.addCleanup(os.remove, content_model_path())
+
+    def create_movie(self, title, description, genre):
+        movie = Movie.objects.create(
+            title=title, year=2020, description=description,
+            thumbnail='thumbnails/test.jpg', video='movies/test.mp4'
+        )
+        movie.genres.add(genre)
+        return movie
+
+    def neighbours(self, movie):
+        return list(MovieSimilarity.objects.filter(kind='content', movie=movie).order_by('-score').values_list(
+            'similar_movie_id', flat=True
+        ))
+
+    def test_build(self):
+        model = get_content_model()
+        self.assertEqual(sorted(model.movie_ids), sorted(m.id for m in (self.pirates, self.sequel, self.paris, self.letters)))
+        self.assertEqual(self.neighbours(self.pirates)[0], self.sequel.id)
+        self.assertEqual(self.neighbours(self.paris)[0], self.letters.id)
+
+    def test_saved_movie_is_rescored_without_rewriting_the_file(self):
+        with open(content_model_path(), 'rb') as f:
+            stored = f.read()
+
+        self.paris.description = 'Space pirates raid cargo ships near Jupiter'
+        self.paris.save()
+        self.paris.genres.set([self.scifi])
+
+        self.assertEqual(self.neighbours(self.paris)[0], self.pirates.id)
+        self.assertIn(self.paris.id, self.neighbours(self.pirates))
+        # Only the neighbour tables moved; the changed row is folded in from its terms
+        with open(content_model_path(), 'rb') as f:
+            self.assertEqual(f.read(), stored)
+        model = current_content_model()
+        pirates, paris = model.matrix[model.position(self.pirates.id)], model.matrix[model.position(self.paris.id)]
+        self.assertGreater(pirates.dot(paris.T).toarray()[0, 0], 0.5)
+
+    def test_new_and_deleted_movies_are_folded_in(self):
+        heist = self.create_movie('Heist', 'Pirates plan a heist on Jupiter', self.scifi)
+        self.letters.delete()
+
+        model = current_content_model()
+        self.assertIsNotNone(model.position(heist.id))
+        self.assertIsNone(model.position(self.letters.id))
+        self.assertIn(self.pirates.id, self.neighbours(heist))
+
+
+class MatrixExportTests(TestCase):
+    """Exported interaction matrices and the CURRENT pointer that publishes them"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='jetflix-export-')
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        movies = [
+            Movie.objects.create(title=f'Movie {i}', year=2020, description='', thumbnail='', video='')
+            for i in range(3)
+        ]
+        users = [User.objects.create_user(username=f'user{i}') for i in range(4)]
+        UserInteraction.objects.bulk_create([
+            UserInteraction(user=users[0], movie=movies[0], interaction_type='watch', score=2.0),
+            UserInteraction(user=users[0], movie=movies[0], interaction_type='review', score=0.5),
+            UserInteraction(user=users[1], movie=movies[2], interaction_type='watchlist', score=1.0),
+            UserInteraction(user=users[3], movie=movies[1], interaction_type='watch', score=2.0),
+            UserInteraction(user=users[3], movie=movies[2], interaction_type='watch', score=2.0),
+        ])
+
+    def pointer(self):
+        return os.path.join(self.root, 'CURRENT')
+
+    def test_export_round_trips(self):
+        meta = export_interaction_matrix(root=self.root)
+        shared = SharedInteractionMatrix.from_pointer(self.pointer())
+        matrix, movie_ids, user_ids = load_interaction_matrix()
+
+        self.assertEqual(shared.version, meta['version'])
+        self.assertEqual((shared.shape, shared.nnz), ((len(user_ids), len(movie_ids)), matrix.nnz))
+        self.assertEqual(list(shared.user_ids), list(user_ids))
+        self.assertEqual(list(shared.movie_ids), list(movie_ids))
+        self.assertEqual((shared.csr() != matrix.T.tocsr()).nnz, 0)
+
+    def test_pointer_swap_publishes_complete_versions(self):
+        first = export_interaction_matrix(root=self.root)
+        old = SharedInteractionMatrix.from_pointer(self.pointer())
+        old_weights = old.csr().toarray()
+        replace = os.replace
+
+        def checked_replace(src, dst):
+            # Until the swap readers get the old version; the new one is already complete
+            self.assertEqual(SharedInteractionMatrix.from_pointer(dst).version, first['version'])
+            with open(src) as f:
+                version = f.read()
+            self.assertEqual(SharedInteractionMatrix(os.path.join(self.root, version)).nnz, old.nnz)
+            replace(src, dst)
+
+        with mock.patch('movies.matrix_export.os.replace', side_effect=checked_replace) as swap:
+            second = export_interaction_matrix(root=self.root, keep=1)
+        swap.assert_called_once()
+
+        self.assertEqual(SharedInteractionMatrix.from_pointer(self.pointer()).version, second['version'])
+        self.assertEqual(sorted(os.listdir(self.root)), ['CURRENT', second['version']])
+        # A mapping of the pruned version stays readable
+        self.assertEqual((old.csr().toarray() != old_weights).sum(), 0)
+
+
+class WatchProgressTests(TestCase):
+    """Heartbeats buffered in memory and the cache, flushed to WatchProgress in bulk"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(flush_progress)
+        self.user = User.objects.create_user(username='viewer')
+        self.movies = [
+            Movie.objects.create(title=f'Movie {i}', year=2020, description='', thumbnail='', video='')
+            for i in range(3)
+        ]
+
+    def stored(self):
+        return dict(WatchProgress.objects.filter(user=self.user).values_list('movie_id', 'position'))
+
+    def test_last_heartbeat_wins(self):
+        movie = self.movies[0]
+        self.client.force_login(self.user)
+        for position in (40, 55, 70):
+            response = self.client.post(reverse('movies:progress_heartbeat'), {
+                'movie_id': movie.id, 'position': position, 'duration': 600,
+            })
+            self.assertEqual(response.json()['status'], 'success')
+
+        # Background jobs run inline here, so every heartbeat was flushed
+        self.assertEqual(self.stored(), {movie.id: 70})
+        self.assertEqual(get_resume_position(self.user.id, movie.id), 70)
+        self.assertEqual([(m.id, m.progress_percent) for m in continue_watching(self.user.id)], [(movie.id, 12)])
+
+        # Served from the table once the cached index is gone
+        cache.clear()
+        self.assertEqual(get_resume_position(self.user.id, movie.id), 70)
+
+    def test_finished_and_barely_started_movies_are_not_resumed(self):
+        record_heartbeat(self.user.id, self.movies[0].id, 10, 600)
+        record_heartbeat(self.user.id, self.movies[1].id, 590, 600)
+        record_heartbeat(self.user.id, self.movies[2].id, 300, 600)
+        self.assertEqual(get_resume_position(self.user.id, self.movies[0].id), 0)
+        self.assertEqual(get_resume_position(self.user.id, self.movies[1].id), 0)
+        self.assertEqual([m.id for m in continue_watching(self.user.id)], [self.movies[2].id])
+
+    @override_settings(WATCH_PROGRESS_MAX_PENDING=3)
+    def test_buffer_flushes_early_when_full(self):
+        # A throttled flush that hasn't fired yet
+        with mock.patch('movies.progress.throttle') as throttle:
+            record_heartbeat(self.user.id, self.movies[0].id, 100, 600)
+            record_heartbeat(self.user.id, self.movies[0].id, 120, 600)
+            record_heartbeat(self.user.id, self.movies[1].id, 200, 600)
+            self.assertEqual(throttle.call_count, 3)
+            # Nothing written yet, but the buffered positions are served
+            self.assertEqual(self.stored(), {})
+            self.assertEqual(get_resume_position(self.user.id, self.movies[0].id), 120)
+            self.assertEqual(
+                [m.id for m in continue_watching(self.user.id)], [self.movies[1].id, self.movies[0].id]
+            )
+
+            # The third buffered movie fills the buffer and flushes right away
+            record_heartbeat(self.user.id, self.movies[2].id, 300, 600)
+            self.assertEqual(throttle.call_count, 3)
+            self.assertEqual(
+                self.stored(), {self.movies[0].id: 120, self.movies[1].id: 200, self.movies[2].id: 300}
+            )
+
+            # Later flushes update the existing rows in place
+            record_heartbeat(self.user.id, self.movies[0].id, 150, 600)
+            self.movies[1].delete()
+            record_heartbeat(self.user.id, self.movies[1].id, 250, 600)
+        self.assertEqual(flush_progress(), 1)
+        self.assertEqual(self.stored(), {self.movies[0].id: 150, self.movies[2].id: 300})
+
+
+@limit_media_streams
+def fake_media_view(request, path):
+    if 'missing' in path:
+        return HttpResponse(status=404)
+    return StreamingHttpResponse(iter([b'frame']), content_type='video/mp4')
+
+
+@override_settings(STREAM_MAX_PER_USER=2, SERVER_WORKER_THREADS=4, MEDIA_WORKER_SHARE=0.75, STREAM_RETRY_AFTER=7)
+class MediaStreamLimitTests(TestCase):
+    """Per-viewer and per-process caps on open media streams"""
+
+    def setUp(self):
+        self.tracker = StreamTracker()
+        patcher = mock.patch('movies.streams.stream_tracker', self.tracker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+        self.users = [User.objects.create_user(username=f'viewer{i}') for i in range(3)]
+
+    def open(self, user, path='movies/test.mp4'):
+        request = self.factory.get(f'/media/{path}')
+        request.user = user
+        return fake_media_view(request, path=path)
+
+    def assertRefused(self, response):
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+    def test_viewer_cap(self):
+        first, second = self.open(self.users[0]), self.open(self.users[0])
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertRefused(self.open(self.users[0]))
+        # Other viewers are still admitted
+        self.assertEqual(self.open(self.users[1]).status_code, 200)
+
+        first.close()
+        self.assertEqual(self.open(self.users[0]).status_code, 200)
+        self.assertEqual(self.tracker.stats()['rejected'], 1)
+
+    def test_node_cap(self):
+        held = [self.open(self.users[0]), self.open(self.users[0]), self.open(self.users[1])]
+        self.assertEqual(self.tracker.stats()['active'], 3)
+        self.assertRefused(self.open(self.users[2]))
+
+        held[2].close()
+        held[2].close()  # a second close must not free another slot
+        self.assertEqual(self.tracker.stats()['active'], 2)
+        self.assertEqual(self.open(self.users[2]).status_code, 200)
+        self.assertRefused(self.open(AnonymousUser()))
+
+    def test_other_responses_hold_no_slot(self):
+        for _ in range(3):
+            self.assertEqual(self.open(self.users[0], 'thumbnails/poster.jpg').status_code, 200)
+            self.assertEqual(self.open(self.users[0], 'movies/missing.mp4').status_code, 404)
+        self.assertEqual(self.tracker.stats()['active'], 0)
+
+
+class QoETests(TestCase):
+    """Beacon validation and the hourly percentile rollups"""
+
+    def setUp(self):
+        self.movie = Movie.objects.create(title='Movie', year=2020, description='', thumbnail='', video='')
+        self.other = Movie.objects.create(title='Other', year=2020, description='', thumbnail='', video='')
+
+    def test_malformed_beacons_are_rejected(self):
+        self.assertEqual(parse_events([{'metric': 'stall', 'value': '250'}]), [('stall', 250.0)])
+        for raw in (
+            {'metric': 'stall', 'value': 1},
+            [{'metric': 'stall'}],
+            [{'metric': 'stall', 'value': 'slow'}],
+            [{'metric': 'bitrate', 'value': 1}],
+            [{'metric': 'stall', 'value': -1}],
+            [{'metric': 'stall', 'value': 'nan'}],
+            ['stall'],
+            [{'metric': 'seek', 'value': 1}] * (MAX_EVENTS_PER_BEACON + 1),
+        ):
+            with self.assertRaises(ValueError):
+                parse_events(raw)
+
+        self.client.force_login(User.objects.create_user(username='viewer'))
+        response = self.client.post(reverse('movies:qoe_beacon'), {
+            'movie_id': self.movie.id, 'events': json.dumps([{'metric': 'stall', 'value': 100}, {'metric': 'nope'}]),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PlaybackEvent.objects.exists())
+
+    def test_rollup_percentiles(self):
+        PlaybackEvent.objects.bulk_create(
+            [PlaybackEvent(movie=self.movie, metric='startup', value=value) for value in range(100, 0, -1)]
+            + [PlaybackEvent(movie=self.other, metric='startup', value=1000)]
+        )
+        rollup_qoe()
+
+        rollup = QoERollup.objects.get(movie=self.movie, metric='startup')
+        self.assertEqual((rollup.count, rollup.total), (100, 5050))
+        self.assertEqual((rollup.p50, rollup.p90, rollup.p99), (50, 90, 99))
+        overall = QoERollup.objects.get(movie__isnull=True, metric='startup')
+        self.assertEqual((overall.count, overall.total), (101, 6050))
+        self.assertEqual((overall.p50, overall.p90, overall.p99), (51, 91, 100))
+
+    def test_rebuilding_gives_the_same_rows(self):
+        self.client.force_login(User.objects.create_user(username='viewer'))
+        for movie, value in ((self.movie, 120), (self.movie, 80), (self.other, 300)):
+            self.client.post(reverse('movies:qoe_beacon'), {
+                'movie_id': movie.id, 'events': json.dumps([{'metric': 'startup', 'value': value}]),
+            })
+        fields = ('movie_id', 'metric', 'bucket_start', 'count', 'total', 'p50', 'p90', 'p99')
+        # Background jobs run inline here, so each beacon already rolled up
+        first = sorted(QoERollup.objects.values_list(*fields), key=str)
+        self.assertEqual(len(first), 3)
+
+        rollup_qoe()
+        self.assertEqual(sorted(QoERollup.objects.values_list(*fields), key=str), first)
+
+
+class WatchlistIdsTests(TestCase):
+    """Versioned watchlist ids revalidated with ETags, and bulk updates"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer')
+        self.client.force_login(self.user)
+        self.movies = [
+            Movie.objects.create(title=f'Movie {i}', year=2020, description='', thumbnail='', video='')
+            for i in range(3)
+        ]
+        self.hidden = Movie.objects.create(
+            title='Hidden', year=2020, description='', thumbnail='', video='', is_published=False
+        )
+        self.url = reverse('movies:watchlist_ids')
+
+    def fetch(self, etag=None):
+        return self.client.get(self.url, **({'HTTP_IF_NONE_MATCH': etag} if etag else {}))
+
+    def test_unchanged_list_is_not_modified(self):
+        response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['ids'], [])
+        self.assertEqual(self.fetch(response['ETag']).status_code, 304)
+
+    def test_bulk_update_changes_the_etag(self):
+        etag = self.fetch()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            added, removed = apply_watchlist_changes(
+                self.user, add=[self.movies[0].id, self.movies[2].id, self.hidden.id, 999999]
+            )
+        self.assertEqual((added, removed), ([self.movies[0].id, self.movies[2].id], []))
+
+        response = self.fetch(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['ids'], [self.movies[0].id, self.movies[2].id])
+        self.assertEqual(self.fetch(response['ETag']).status_code, 304)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('movies:bulk_update_watchlist'),
+                data={'add': [self.movies[1].id], 'remove': [self.movies[0].id]}, content_type='application/json'
+            )
+        self.assertEqual(response.json()['removed'], [self.movies[0].id])
+        response = self.fetch(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['ids'], [self.movies[1].id, self.movies[2].id])
+
+    def test_bulk_request_size_is_capped(self):
+        response = self.client.post(
+            reverse('movies:bulk_update_watchlist'),
+            data={'add': [self.movies[0].id] * BULK_MAX_IDS, 'remove': [self.movies[1].id]},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Watchlist.objects.exists())
+
+        response = self.client.post(
+            reverse('movies:bulk_update_watchlist'),
+            data={'add': [self.movies[0].id] * BULK_MAX_IDS}, content_type='application/json'
+        )
+        self.assertEqual(response.json()['added'], [self.movies[0].id])
+
+
+@override_settings(RECOMMENDATION_BUDGET_MS=20, RECOMMENDATION_STALE_AFTER=3600)
+class RecommendationTierTests(TestCase):
+    """Which tier serves /api/recommendations/user/ and the in-flight refreshes behind it"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer')
+        self.client.force_login(self.user)
+        self.movies = [
+            Movie.objects.create(title=f'Movie {i}', year=2020, description='', thumbnail='', video='', views=i)
+            for i in range(3)
+        ]
+        self.url = reverse('movies:get_user_recommendations')
+
+    def store(self, movie_ids, age):
+        UserRecommendation.objects.create(
+            user=self.user, movie_ids=movie_ids, computed_at=timezone.now() - timedelta(seconds=age)
+        )
+
+    def serve(self, tier):
+        before = tier_stats.stats()['counts'][tier]
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Recommendation-Tier'], tier)
+        self.assertEqual(response.json()['tier'], tier)
+        self.assertEqual(tier_stats.stats()['counts'][tier], before + 1)
+        return [movie['id'] for movie in response.json()['movies']]
+
+    def pending_refresh(self):
+        """Patch in a refresh that doesn't finish until the returned future is resolved"""
+        future = Future()
+        patcher = mock.patch('movies.recommendations.submit_future', return_value=future)
+        submit_future = patcher.start()
+        self.addCleanup(patcher.stop)
+        return future, submit_future
+
+    def test_fresh_list_is_served_as_stored(self):
+        self.store([self.movies[1].id, self.movies[0].id], age=60)
+        self.assertEqual(self.serve('fresh'), [self.movies[1].id, self.movies[0].id])
+
+    def test_refresh_within_budget_is_live(self):
+        self.store([self.movies[1].id], age=7200)
+        self.serve('live')
+        stored = UserRecommendation.objects.get(user=self.user)
+        self.assertGreater(stored.computed_at, timezone.now() - timedelta(seconds=60))
+        # The finished refresh doesn't linger
+        self.assertNotIn(self.user.id, _inflight)
+
+    def test_missed_budget_serves_stale_list(self):
+        future, submit_future = self.pending_refresh()
+        self.store([self.movies[0].id], age=7200)
+        self.assertEqual(self.serve('stale'), [self.movies[0].id])
+        # A second request joins the refresh already running
+        self.serve('stale')
+        submit_future.assert_called_once()
+
+        future.set_result(None)
+        self.assertNotIn(self.user.id, _inflight)
+
+    def test_missed_budget_without_stored_list_serves_popular(self):
+        future, _ = self.pending_refresh()
+        self.assertEqual(self.serve('popular'), [self.movies[2].id, self.movies[1].id, self.movies[0].id])
+        future.set_exception(RuntimeError('refresh failed'))
+        self.assertNotIn(self.user.id, _inflight)
+
+    def test_short_popular_list_is_cached(self):
+        self.assertEqual(len(popular_movie_ids(6)), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(popular_movie_ids(6)), 3)
+
+
+class ItemSimilarityTests(TestCase):
+    """Full and incremental builds of the item-item neighbour lists"""
+
+    def setUp(self):
+        self.movies = [
+            Movie.objects.create(title=f'Movie {i}', year=2020, description='', thumbnail='', video='')
+            for i in range(6)
+        ]
+        self.users = [User.objects.create_user(username=f'user{i}') for i in range(6)]
+        # Movies 0-3 share viewers; movies 4 and 5 only share theirs
+        self.interact([
+            (0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (2, 1), (2, 3), (3, 2), (3, 3), (4, 4), (4, 5), (5, 5),
+        ])
+        self.addCleanup(lambda: os.path.exists(totals_path()) and os.remove(totals_path()))
+        rebuild_similarities(k=2)
+
+    def interact(self, pairs, interaction_type='watch'):
+        UserInteraction.objects.bulk_create([
+            UserInteraction(
+                user=self.users[user], movie=self.movies[movie], interaction_type=interaction_type, score=2.0
+            )
+            for user, movie in pairs
+        ])
+
+    def lists(self):
+        return {
+            movie_id: sorted(MovieSimilarity.objects.filter(kind='item', movie_id=movie_id).values_list(
+                'similar_movie_id', 'score'
+            ))
+            for movie_id in MovieSimilarity.objects.filter(kind='item').values_list('movie_id', flat=True).distinct()
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.lists()
+        rebuild_similarities(k=2)
+        rebuilt = self.lists()
+        self.assertEqual(incremental.keys(), rebuilt.keys())
+        for movie_id, neighbours in rebuilt.items():
+            self.assertEqual([m for m, _ in incremental[movie_id]], [m for m, _ in neighbours])
+            for (_, got), (_, expected) in zip(incremental[movie_id], neighbours):
+                self.assertAlmostEqual(got, expected, places=5)
+
+    def test_build(self):
+        lists = self.lists()
+        self.assertEqual([m for m, _ in lists[self.movies[4].id]], [self.movies[5].id])
+        self.assertNotIn(self.movies[4].id, [m for m, _ in lists[self.movies[0].id]])
+        self.assertEqual(update_similarities(k=2), (0, 0))
+
+    def test_new_interactions_update_affected_movies_only(self):
+        self.interact([(3, 0)], interaction_type='review')
+        loaded = []
+
+        def load(**kwargs):
+            result = load_interaction_matrix(**kwargs)
+            loaded.extend(result[1])
+            return result
+
+        with mock.patch('movies.similarity.load_interaction_matrix', side_effect=load):
+            update_similarities(k=2)
+        # Movies 4 and 5 share no viewer with the changed movie
+        self.assertEqual(sorted(loaded), [movie.id for movie in self.movies[:4]])
+        self.assertMatchesRebuild()
+
+    def test_deleted_interactions_are_picked_up(self):
+        UserInteraction.objects.filter(user=self.users[0], movie=self.movies[3]).delete()
+        update_similarities(k=2)
+        self.assertMatchesRebuild()
+
+    def test_cascade_deletes_are_picked_up(self):
+        self.users[3].delete()
+        update_similarities(k=2)
+        self.assertMatchesRebuild()
+
+        self.movies[1].delete()
+        update_similarities(k=2)
+        self.assertMatchesRebuild()
+
+
+def clustered_interactions(clusters=2, users_per_cluster=10, movies_per_cluster=5):
+    """
+    Movie x user weights where each user watched every movie of their own
+    cluster but one, which is the movie a recommender should find for them
+    """
+    rows, columns = [], []
+    unseen = {}
+    for cluster in range(clusters):
+        for offset in range(users_per_cluster):
+            user = cluster * users_per_cluster + offset
+            skipped = cluster * movies_per_cluster + offset % movies_per_cluster
+            unseen[user] = skipped
+            for movie in range(cluster * movies_per_cluster, (cluster + 1) * movies_per_cluster):
+                if movie != skipped:
+                    rows.append(movie)
+                    columns.append(user)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=(clusters * movies_per_cluster, clusters * users_per_cluster),
+    )
+    return matrix, unseen
+
+
+class FactorizationTests(TestCase):
+    """ALS training, the saved model file and serving from it"""
+
+    def setUp(self):
+        self.addCleanup(reset_model_cache)
+
+    def test_training_recovers_each_users_missing_movie(self):
+        matrix, unseen = clustered_interactions()
+        # One factor per cluster, so the model can't just memorise what was seen
+        user_factors, item_factors = train_als(matrix, factors=2, iterations=10, workers=2)
+        self.assertEqual(user_factors.shape, (20, 2))
+        self.assertEqual(item_factors.shape, (10, 2))
+        self.assertEqual(item_factors.dtype, np.float32)
+
+        model = FactorModel(user_factors, item_factors, np.arange(20), np.arange(10), timezone.now())
+        for user, movie in unseen.items():
+            seen = matrix[:, user].nonzero()[0].tolist()
+            self.assertEqual(model.recommend(user, exclude_ids=seen, limit=1)[0][0], movie)
+        self.assertEqual(model.recommend(0, exclude_ids=range(10)), [])
+
+    def test_saved_model_round_trips(self):
+        matrix, _ = clustered_interactions()
+        user_factors, item_factors = train_als(matrix, factors=4, iterations=2)
+        path = model_path()
+        self.addCleanup(os.remove, path)
+        saved = save_model(path, user_factors, item_factors, np.arange(20) + 100, np.arange(10) + 500)
+
+        loaded = get_model()
+        self.assertEqual(loaded.trained_at, saved.trained_at)
+        self.assertTrue(loaded.has_user(119))
+        self.assertFalse(loaded.has_user(5))
+        np.testing.assert_array_equal(loaded.user_vector(100), user_factors[0])
+        np.testing.assert_array_equal(loaded.movie_vector(509), item_factors[9])
+        self.assertIsNone(loaded.movie_vector(1))
+
+    def test_recommendations_are_served_from_the_trained_model(self):
+        matrix, unseen = clustered_interactions(users_per_cluster=5)
+        users = [User.objects.create_user(username=f'user{i}') for i in range(matrix.shape[1])]
+        movies = [
+            Movie.objects.create(title=f'Movie {i}', year=2020, description='', thumbnail='', video='')
+            for i in range(matrix.shape[0])
+        ]
+        movie_rows, user_columns = matrix.nonzero()
+        UserInteraction.objects.bulk_create([
+            UserInteraction(user=users[user], movie=movies[movie], interaction_type='watch', score=2.0)
+            for movie, user in zip(movie_rows, user_columns)
+        ])
+        self.addCleanup(lambda: os.path.exists(model_path()) and os.remove(model_path()))
+        call_command('train_recommender', '--factors', '2', '--iterations', '10', stdout=StringIO())
+        self.assertTrue(get_model().has_user(users[0].id))
+
+        for user, movie in unseen.items():
+            recommended = Movie.get_recommendations_for_user(users[user], limit=1)
+            self.assertEqual([m.id for m in recommended], [movies[movie].id])
+
+
+class ANNIndexTests(TestCase):
+    """IVF search against brute force, filters, and the saved index"""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        centres = rng.normal(size=(20, 16))
+        noise = rng.normal(scale=0.3, size=(2000, 16))
+        self.vectors = (centres[rng.integers(0, 20, 2000)] + noise).astype(np.float32)
+        self.ids = np.arange(2000) + 1000
+        self.published = rng.random(2000) > 0.1
+        self.language_ids = rng.integers(1, 4, 2000)
+        self.index = IVFIndex.build(self.vectors, self.ids, self.published, self.language_ids, seed=1)
+        self.queries = rng.normal(size=(50, 16)).astype(np.float32)
+        self.addCleanup(ann_index_file.reset)
+
+    def recall(self, n_probe, **filters):
+        found = truth = 0
+        for query in self.queries:
+            expected = {m for m, _ in self.index.exact_search(query, k=10, **filters)}
+            found += len(expected & {m for m, _ in self.index.search(query, k=10, n_probe=n_probe, **filters)})
+            truth += len(expected)
+        return found / truth
+
+    def test_recall_against_brute_force(self):
+        self.assertEqual(self.index.n_lists, 44)
+        self.assertEqual(self.recall(self.index.n_lists), 1.0)
+        self.assertGreater(self.recall(8), 0.9)
+        self.assertLess(self.recall(1), self.recall(8))
+
+        rows = benchmark(self.index, self.queries[:10], probes=(1, self.index.n_lists))
+        self.assertEqual([row['probes'] for row in rows], ['exact', 1, self.index.n_lists])
+        self.assertEqual(rows[-1]['recall'], 1.0)
+
+    def test_filters(self):
+        exclude = set(int(m) for m in self.ids[:500])
+        results = self.index.search(self.queries[0], k=20, language_id=2, exclude_ids=exclude)
+        self.assertEqual(len(results), 20)
+        for movie_id, _ in results:
+            position = movie_id - 1000
+            self.assertTrue(self.published[position])
+            self.assertEqual(self.language_ids[position], 2)
+            self.assertNotIn(movie_id, exclude)
+        self.assertGreater(self.recall(8, language_id=2, exclude_ids=exclude), 0.9)
+
+        # Few matches widen the probe until k are found
+        unpublished = [int(m) for m in self.ids[~self.published]][:3]
+        only = set(int(m) for m in self.ids) - set(unpublished)
+        results = self.index.search(self.queries[0], k=3, n_probe=1, published_only=False, exclude_ids=only)
+        self.assertEqual(sorted(m for m, _ in results), sorted(unpublished))
+
+    def test_similar_uses_cosine_and_skips_the_movie(self):
+        movie_id = int(self.ids[0])
+        similar = self.index.similar(movie_id, k=5, n_probe=self.index.n_lists)
+        self.assertNotIn(movie_id, [m for m, _ in similar])
+        self.assertTrue(all(-1.0 <= score <= 1.0 + 1e-6 for _, score in similar))
+        self.assertEqual(self.index.similar(1, k=5), [])
+
+    def test_saved_index_matches_its_model(self):
+        index = IVFIndex.build(self.vectors, self.ids, source_version=1234.5)
+        self.addCleanup(os.remove, index_path())
+        index.save(index_path())
+
+        loaded = get_index()
+        self.assertEqual(len(loaded), 2000)
+        self.assertEqual(loaded.search(self.queries[0], k=5), index.search(self.queries[0], k=5))
+        model = mock.Mock(trained_at=datetime.fromtimestamp(1234.5, tz=dt_timezone.utc))
+        self.assertIs(get_index(model), loaded)
+        model.trained_at = timezone.now()
+        self.assertIsNone(get_index(model))
+
+
+@override_settings(RECOMMENDATION_STALE_AFTER=3600)
+class StoredRecommendationTests(TestCase):
+    """UserRecommendation lists and what refreshes them"""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='viewer')
+        self.other = User.objects.create_user(username='other')
+        self.movies = [
+            Movie.objects.create(title=f'Movie {i}', year=2020, description='', thumbnail='', video='')
+            for i in range(4)
+        ]
+        UserInteraction.objects.bulk_create([
+            UserInteraction(user=self.other, movie=movie, interaction_type='watch', score=2.0)
+            for movie in self.movies
+        ])
+
+    def test_refresh_stores_the_ranked_list(self):
+        UserInteraction.objects.bulk_create([
+            UserInteraction(user=self.viewer, movie=self.movies[0], interaction_type='watch', score=2.0)
+        ])
+        stored = refresh_user_recommendations(self.viewer.id)
+        expected = Movie.get_recommendations_for_user(self.viewer, STORED_RECOMMENDATIONS)
+        self.assertEqual(stored.movie_ids, [movie.id for movie in expected])
+        self.assertNotIn(self.movies[0].id, stored.movie_ids)
+        self.assertEqual(UserRecommendation.objects.count(), 1)
+        self.assertIsNone(refresh_user_recommendations(999999))
+
+    def test_interactions_refresh_the_list_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            UserInteraction.objects.create(user=self.viewer, movie=self.movies[1], interaction_type='watch')
+        self.assertFalse(UserRecommendation.objects.filter(user=self.viewer).exists())
+
+        for callback in callbacks:
+            callback()
+        stored = UserRecommendation.objects.get(user=self.viewer)
+        self.assertNotIn(self.movies[1].id, stored.movie_ids)
+        self.assertEqual(len(stored.movie_ids), 3)
+
+    def test_deleting_a_user_with_interactions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            UserInteraction.objects.create(user=self.viewer, movie=self.movies[1], interaction_type='watch')
+            self.viewer.delete()
+        self.assertFalse(UserRecommendation.objects.exists())
+
+    def test_stale_lists_are_refreshed(self):
+        old = timezone.now() - timedelta(hours=2)
+        UserRecommendation.objects.create(user=self.viewer, movie_ids=[], computed_at=old)
+        UserRecommendation.objects.create(user=self.other, movie_ids=[], computed_at=timezone.now())
+        self.assertEqual(refresh_stale_recommendations(), 1)
+        self.assertGreater(UserRecommendation.objects.get(user=self.viewer).computed_at, old)
+
+        out = StringIO()
+        call_command('refresh_recommendations', stdout=out)
+        self.assertIn('Refreshed 0 recommendation lists', out.getvalue())
+        call_command('refresh_recommendations', '--all', stdout=out)
+        self.assertIn('Refreshed 1 recommendation lists', out.getvalue())
+
+
+class TrendingTests(TestCase):
+    """Play rollup buckets and the decayed trending lists computed from them"""
+
+    def setUp(self):
+        self.now = datetime(2026, 3, 10, 15, 30, tzinfo=dt_timezone.utc)
+        self.movies = [
+            Movie.objects.create(title=f'Movie {i}', year=2020, description='', thumbnail='', video='', views=i)
+            for i in range(3)
+        ]
+
+    def buckets(self, movie):
+        return sorted(MoviePlayRollup.objects.filter(movie=movie).values_list('granularity', 'bucket_start', 'plays'))
+
+    def test_plays_are_added_to_hour_and_day_buckets(self):
+        movie = self.movies[0]
+        for minute in (31, 45, 59):
+            record_play(movie.id, at=self.now.replace(minute=minute))
+        record_play(movie.id, count=2, at=self.now + timedelta(hours=1))
+        self.assertEqual(self.buckets(movie), [
+            ('day', datetime(2026, 3, 10, tzinfo=dt_timezone.utc), 5),
+            ('hour', datetime(2026, 3, 10, 15, tzinfo=dt_timezone.utc), 3),
+            ('hour', datetime(2026, 3, 10, 16, tzinfo=dt_timezone.utc), 2),
+        ])
+
+    def test_bucket_created_concurrently_is_incremented(self):
+        movie = self.movies[0]
+        record_play(movie.id, at=self.now)
+        update = QuerySet.update
+        calls = []
+
+        def racing_update(queryset, **kwargs):
+            # The first update misses, as if the bucket didn't exist yet
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            record_play(movie.id, at=self.now)
+        self.assertEqual([plays for _, _, plays in self.buckets(movie)], [2, 2])
+
+    def test_view_endpoint_records_a_play(self):
+        self.client.force_login(User.objects.create_user(username='viewer'))
+        self.client.post(
+            reverse('movies:increment_view'), data={'movie_id': self.movies[1].id}, content_type='application/json'
+        )
+        self.assertEqual([plays for _, _, plays in self.buckets(self.movies[1])], [1, 1])
+
+    def test_recent_plays_outweigh_older_ones(self):
+        record_play(self.movies[0].id, count=10, at=self.now - timedelta(hours=20))
+        record_play(self.movies[1].id, count=4, at=self.now)
+        record_play(self.movies[2].id, count=50, at=self.now)
+        Movie.objects.filter(id=self.movies[2].id).update(is_published=False)
+
+        self.assertEqual(compute_trending(windows=['24h'], now=self.now), {'24h': 2})
+        entries = TrendingMovie.objects.filter(window='24h').order_by('rank')
+        self.assertEqual([entry.movie_id for entry in entries], [self.movies[1].id, self.movies[0].id])
+        self.assertAlmostEqual(entries[1].score, 10 * 2 ** (-20.5 / 6), places=6)
+        self.assertEqual([m.id for m in get_trending_movies('24h')], [self.movies[1].id, self.movies[0].id])
+
+    def test_fallbacks_and_pruning(self):
+        # Before anything is computed the view counter orders the row
+        self.assertEqual([m.id for m in get_trending_movies('24h')], [m.id for m in reversed(self.movies)])
+
+        record_play(self.movies[0].id, at=self.now - timedelta(days=4))
+        compute_trending(now=self.now)
+        self.assertFalse(TrendingMovie.objects.filter(window='24h').exists())
+        self.assertEqual([m.id for m in get_trending_movies('24h')], [self.movies[0].id])
+
+        self.assertEqual(prune_rollups(now=self.now), 1)
+        self.assertEqual([granularity for granularity, _, _ in self.buckets(self.movies[0])], ['day'])
+
+
+@override_settings(BACKGROUND_TASKS_SYNC=False)
+class BackgroundCoalescingTests(SimpleTestCase):
+    """debounce() and throttle() collapse bursts of triggers; gather() keeps call order"""
+
+    def setUp(self):
+        self.calls = []
+
+    def job(self, value):
+        self.calls.append(value)
+
+    def wait_for_calls(self, count, timeout=2):
+        deadline = time.monotonic() + timeout
+        while len(self.calls) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Long enough for a wrongly scheduled extra run to show up
+        time.sleep(0.15)
+
+    def test_debounce_runs_once_with_the_last_arguments(self):
+        for value in range(5):
+            debounce(('test-debounce', id(self)), 0.2, self.job, value)
+            time.sleep(0.02)
+        self.assertEqual(self.calls, [])
+        self.wait_for_calls(1)
+        self.assertEqual(self.calls, [4])
+
+    def test_throttle_runs_once_per_period(self):
+        key = ('test-throttle', id(self))
+        for value in range(5):
+            throttle(key, 0.1, self.job, value)
+        self.wait_for_calls(1)
+        self.assertEqual(self.calls, [0])
+
+        # Once it has run, the next trigger starts a new period
+        throttle(key, 0.1, self.job, 5)
+        self.wait_for_calls(2)
+        self.assertEqual(self.calls, [0, 5])
+
+    @override_settings(BACKGROUND_TASKS_SYNC=True)
+    def test_sync_mode_runs_inline(self):
+        debounce('test-sync', 60, self.job, 'debounced')
+        throttle('test-sync', 60, self.job, 'throttled')
+        self.assertEqual(self.calls, ['debounced', 'throttled'])
+
+    def test_gather_keeps_order_and_raises(self):
+        def slow(value, delay):
+            time.sleep(delay)
+            return value
+
+        self.assertEqual(gather((slow, 'a', 0.05), (slow, 'b', 0), (slow, 'c', 0.02)), ['a', 'b', 'c'])
+        with self.assertRaises(ZeroDivisionError):
+            gather((slow, 'a', 0), (lambda: 1 / 0,))
+
+
+class SimilarBatchTests(TestCase):
+    """/api/recommendations/similar/?ids= answers many movies with per-movie fallbacks"""
+
+    def setUp(self):
+        cache.clear()
+        drama = Genre.objects.create(name='Drama')
+        self.a, self.b, self.c, self.hidden = [
+            Movie.objects.create(
+                title=title, year=2020, description='', thumbnail='', video='', is_published=title != 'Hidden'
+            )
+            for title in ('A', 'B', 'C', 'Hidden')
+        ]
+        self.a.genres.add(drama)
+        self.c.genres.add(drama)
+        MovieSimilarity.objects.bulk_create([
+            MovieSimilarity(movie=self.a, similar_movie=self.hidden, kind='item', score=0.99),
+            MovieSimilarity(movie=self.a, similar_movie=self.b, kind='item', score=0.9),
+            MovieSimilarity(movie=self.a, similar_movie=self.c, kind='item', score=0.5),
+            MovieSimilarity(movie=self.b, similar_movie=self.c, kind='content', score=0.4),
+        ])
+        self.url = reverse('movies:get_similar_movies_batch')
+
+    def test_each_movie_uses_its_first_source_with_results(self):
+        ids = [self.a.id, self.b.id, self.c.id, self.hidden.id, 999999, self.a.id]
+        data = self.client.get(self.url, {'ids': ','.join(map(str, ids)), 'fields': 'id'}).json()
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['results'], {
+            str(self.a.id): [{'id': self.b.id}, {'id': self.c.id}],  # item neighbours, unpublished skipped
+            str(self.b.id): [{'id': self.c.id}],  # content neighbours
+            str(self.c.id): [{'id': self.a.id}],  # shared genre
+        })
+        self.assertEqual(data['missing'], [self.hidden.id, 999999])
+
+        data = self.client.get(self.url, {'ids': str(self.a.id), 'limit': 1, 'fields': 'id'}).json()
+        self.assertEqual(data['results'], {str(self.a.id): [{'id': self.b.id}]})
+
+    def test_bad_requests(self):
+        too_many = ','.join(map(str, range(1, 52)))
+        for params in ({}, {'ids': ','}, {'ids': 'x'}, {'ids': too_many}, {'ids': '1', 'fields': 'nope'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['status'], 'error')
+
+
+class OracleStrategy(Strategy):
+    """Recommends a user's held-out movies, after one query"""
+    name = 'oracle'
+
+    def __init__(self, dataset):
+        super().__init__()
+        self.dataset = dataset
+
+    def recommend(self, user, seen, k):
+        Movie.objects.exists()
+        return sorted(self.dataset.holdout[user.id])
+
+
+class EvaluationTests(TestCase):
+    """Synthetic datasets and the metrics the evaluation harness reports"""
+
+    def setUp(self):
+        self.dataset = generate_dataset(users=30, movies=40, events_per_user=8, seed=3)
+
+    def test_dataset_splits_events_by_time(self):
+        self.assertEqual((len(self.dataset.user_ids), len(self.dataset.movie_ids)), (30, 40))
+        self.assertEqual(UserInteraction.objects.count(), self.dataset.train_count)
+        self.assertEqual(sum(map(len, self.dataset.seen.values())), self.dataset.train_count)
+        self.assertGreater(sum(map(len, self.dataset.holdout.values())), 0)
+        for user_id, held_out in self.dataset.holdout.items():
+            self.assertFalse(held_out & self.dataset.seen.get(user_id, set()))
+        # Views count training-period watches only
+        watches = UserInteraction.objects.filter(interaction_type='watch').count()
+        self.assertEqual(sum(Movie.objects.values_list('views', flat=True)), watches)
+
+    def test_metrics(self):
+        user_ids = sorted(self.dataset.holdout)
+        k = 5
+        row = evaluate(OracleStrategy(self.dataset), self.dataset, user_ids, k=k)
+        holdout = [self.dataset.holdout[user_id] for user_id in user_ids]
+        self.assertAlmostEqual(row['precision'], np.mean([min(len(h), k) / k for h in holdout]))
+        self.assertAlmostEqual(row['recall'], np.mean([min(len(h), k) / len(h) for h in holdout]))
+        recommended = set().union(*(sorted(h)[:k] for h in holdout))
+        self.assertAlmostEqual(row['coverage'], len(recommended) / 40)
+        self.assertEqual(row['queries'], 1.0)
+
+    def test_run_evaluation_prepares_each_strategy(self):
+        rows = []
+        result = run_evaluation(
+            self.dataset, strategies=[PopularStrategy(), OracleStrategy(self.dataset)],
+            k=5, eval_users=10, callback=rows.append,
+        )
+        self.assertEqual(rows, result)
+        self.assertEqual([row['strategy'] for row in rows], ['popular', 'oracle'])
+        # Nothing can beat recommending exactly the held-out movies
+        self.assertGreaterEqual(rows[1]['precision'], rows[0]['precision'])
+        self.assertGreaterEqual(rows[1]['recall'], rows[0]['recall'])
+        for row in rows:
+            self.assertGreaterEqual(row['build_s'], 0)
+            self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+
+
+class PopulateInteractionsTests(TestCase):
+    """populate_interactions copies reviews, watches and watchlists in batches"""
+
+    def setUp(self):
+        self.users = User.objects.bulk_create([User(username=f'copier{i}') for i in range(3)])
+        self.movies = Movie.objects.bulk_create([
+            Movie(title=f'Copied {i}', year=2020, description='', thumbnail='', video='') for i in range(3)
+        ])
+        Review.objects.bulk_create([
+            Review(user=user, movie=self.movies[0], rating=i + 2, review_text='ok')
+            for i, user in enumerate(self.users)
+        ])
+        WatchHistory.objects.bulk_create([
+            WatchHistory(user=user, movie=movie) for user in self.users for movie in self.movies[1:]
+        ])
+        Watchlist.objects.bulk_create([Watchlist(user=self.users[0], movie=self.movies[2])])
+
+    def populate(self, *args):
+        out = StringIO()
+        call_command('populate_interactions', '--batch-size', '2', *args, stdout=out, stderr=out)
+        return out.getvalue()
+
+    def scores(self, interaction_type):
+        return sorted(
+            UserInteraction.objects.filter(interaction_type=interaction_type).values_list('score', flat=True)
+        )
+
+    def test_copies_every_source(self):
+        output = self.populate()
+
+        self.assertEqual(self.scores('review'), [2.0, 3.0, 4.0])
+        self.assertEqual(self.scores('watch'), [2.0] * 6)
+        self.assertEqual(self.scores('watchlist'), [1.0])
+        self.assertIn('3 review interactions, 6 watch interactions, and 1 watchlist interactions', output)
+        self.assertIn('refresh_recommendations --all', output)
+
+    def test_rerun_adds_nothing(self):
+        self.populate()
+        output = self.populate()
+
+        self.assertEqual(UserInteraction.objects.count(), 10)
+        self.assertIn('0 review interactions, 0 watch interactions, and 0 watchlist interactions', output)
+        self.assertNotIn('refresh_recommendations', output)
+
+    def test_since_copies_only_newer_rows(self):
+        old = timezone.now() - timedelta(days=2)
+        Review.objects.update(created_at=old)
+        WatchHistory.objects.exclude(user=self.users[0]).update(watched_at=old)
+
+        self.populate('--since', (old + timedelta(days=1)).isoformat())
+
+        self.assertEqual(self.scores('review'), [])
+        self.assertEqual(
+            set(UserInteraction.objects.filter(interaction_type='watch').values_list('user_id', flat=True)),
+            {self.users[0].id},
+        )
+        self.assertEqual(self.scores('watchlist'), [1.0])
+
+    def test_invalid_since_is_rejected(self):
+        output = self.populate('--since', 'yesterday')
+
+        self.assertIn('Invalid --since timestamp: yesterday', output)
+        self.assertFalse(UserInteraction.objects.exists())
+
+
+# Worker threads write through their own connections, so these tests commit
+class LoadDataTests(TransactionTestCase):
+    """generate_load_data output is consistent and independent of the worker count"""
+
+    def generate(self, workers):
+        # Small ranges so several workers share the users
+        with mock.patch('movies.loadgen.USERS_PER_RANGE', 4):
+            return generate_load_data(users=10, movies=12, interactions=150, seed=5, workers=workers, batch_size=7)
+
+    def snapshot(self):
+        return {
+            model.__name__: sorted(model.objects.values_list('user__username', 'movie__title', *fields))
+            for model, fields in [
+                (WatchHistory, []), (Review, ['rating']), (Watchlist, []),
+                (UserInteraction, ['interaction_type', 'score']),
+            ]
+        }
+
+    def test_rows_are_consistent(self):
+        totals = self.generate(workers=3)
+
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Movie.objects.count(), 12)
+        self.assertEqual(Payment.objects.count(), totals['payments'])
+        self.assertEqual(WatchHistory.objects.count(), totals['watch_history'])
+        self.assertEqual(Review.objects.count(), totals['reviews'])
+        self.assertEqual(Watchlist.objects.count(), totals['watchlist'])
+        self.assertEqual(UserInteraction.objects.count(), totals['interactions'])
+        self.assertEqual(totals['interactions'], totals['watch_history'] + totals['reviews'] + totals['watchlist'])
+        self.assertGreater(totals['reviews'], 0)
+
+        # Every review and watchlist entry is also a watch, with a matching interaction
+        watched = set(WatchHistory.objects.values_list('user_id', 'movie_id'))
+        self.assertLessEqual(set(Review.objects.values_list('user_id', 'movie_id')), watched)
+        self.assertLessEqual(set(Watchlist.objects.values_list('user_id', 'movie_id')), watched)
+        self.assertEqual(
+            set(Review.objects.values_list('user_id', 'movie_id', 'rating')),
+            {(u, m, int(s)) for u, m, s in UserInteraction.objects.filter(
+                interaction_type='review').values_list('user_id', 'movie_id', 'score')},
+        )
+
+        for movie in Movie.objects.all():
+            ratings = list(Review.objects.filter(movie=movie).values_list('rating', flat=True))
+            self.assertEqual(movie.views, WatchHistory.objects.filter(movie=movie).count())
+            self.assertEqual((movie.rating_count, movie.rating_sum), (len(ratings), sum(ratings)))
+            self.assertEqual(movie.rating_3, ratings.count(3))
+
+    def test_output_does_not_depend_on_workers(self):
+        self.generate(workers=1)
+        single = self.snapshot()
+        Movie.objects.all().delete()
+        User.objects.all().delete()
+
+        self.generate(workers=3)
+        self.assertEqual(self.snapshot(), single)
+
+    def test_command_refuses_an_existing_seed(self):
+        User.objects.create_user(username='load_5_0')
+        with self.assertRaisesMessage(CommandError, 'already exists (load_5_*)'):
+            call_command('generate_load_data', '--seed', '5', stdout=StringIO())
+
+
+class MovieCardCacheTests(TestCase):
+    """Rendered cards are reused until the movie's version changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.genre = Genre.objects.create(name='Noir')
+        self.movie = Movie.objects.create(title='Night Train', year=1950, description='', thumbnail='', video='')
+        self.movie.genres.add(self.genre)
+
+    def card(self):
+        movie = Movie.objects.get(pk=self.movie.pk)
+        attach_movie_cards([movie])
+        return movie.card_html
+
+    def test_card_is_reused_until_the_version_is_bumped(self):
+        self.assertIn('Night Train', self.card())
+
+        # A queryset update skips the signals, so the cached card stays
+        Movie.objects.filter(pk=self.movie.pk).update(title='Day Train')
+        self.assertIn('Night Train', self.card())
+
+        bump_movie_versions([self.movie.pk])
+        self.assertIn('Day Train', self.card())
+
+    def test_movie_and_genre_changes_refresh_the_card(self):
+        self.assertIn('Noir', self.card())
+
+        self.movie.title = 'Day Train'
+        self.movie.save()
+        self.assertIn('Day Train', self.card())
+
+        self.genre.name = 'Crime'
+        self.genre.save()
+        self.assertIn('Crime', self.card())
+
+    def test_committed_review_bumps_the_version(self):
+        before = get_movie_versions([self.movie.pk])[self.movie.pk]
+        user = User.objects.create_user(username='critic')
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(user=user, movie=self.movie, rating=4, review_text='Moody')
+
+        self.assertNotEqual(get_movie_versions([self.movie.pk])[self.movie.pk], before)
+
+    def test_movie_in_several_lists_gets_the_same_card(self):
+        first, second = Movie.objects.get(pk=self.movie.pk), Movie.objects.get(pk=self.movie.pk)
+        attach_movie_cards([first], [], [second])
+
+        self.assertEqual(first.card_html, second.card_html)
+        self.assertIn('Night Train', first.card_html)
+
+
+class AnonymousPageCacheTests(TestCase):
+    """cache_anonymous_page serves anonymous GETs from the cache until the catalog changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+
+    def page(self, request):
+        self.calls += 1
+        return HttpResponse(
+            f'<form><input type="hidden" name="csrfmiddlewaretoken" value="{get_token(request)}"></form>'
+            f'render {self.calls}'
+        )
+
+    def get(self, view, user=None, method='get'):
+        request = getattr(self.factory, method)('/browse/?page=2')
+        request.user = user or AnonymousUser()
+        return cache_anonymous_page(view)(request)
+
+    def test_second_request_is_a_hit_with_its_own_csrf_token(self):
+        first = self.get(self.page)
+        second = self.get(self.page)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((first['X-Page-Cache'], second['X-Page-Cache']), ('miss', 'hit'))
+        self.assertIn('Cookie', second['Vary'])
+        self.assertIn(b'render 1', second.content)
+        self.assertNotIn(CSRF_PLACEHOLDER.encode(), second.content)
+        self.assertNotEqual(
+            first.content.split(b'value="')[1][:64], second.content.split(b'value="')[1][:64],
+        )
+
+    def test_catalog_change_invalidates_pages(self):
+        self.get(self.page)
+        bump_catalog_version()
+
+        self.assertEqual(self.get(self.page)['X-Page-Cache'], 'miss')
+        self.assertEqual(self.calls, 2)
+
+    def test_signed_in_users_and_posts_always_run_the_view(self):
+        user = User.objects.create_user(username='member')
+        for _ in range(2):
+            self.assertFalse(self.get(self.page, user=user).has_header('X-Page-Cache'))
+            self.get(self.page, method='post')
+        # Nothing was stored for anonymous visitors either
+        self.assertEqual(self.get(self.page)['X-Page-Cache'], 'miss')
+        self.assertEqual(self.calls, 5)
+
+    def test_errors_and_responses_setting_cookies_are_not_stored(self):
+        def failing(request):
+            self.calls += 1
+            return HttpResponse('busy', status=503)
+
+        def with_cookie(request):
+            response = self.page(request)
+            response.set_cookie('seen', '1')
+            return response
+
+        for view in (failing, failing, with_cookie, with_cookie):
+            self.assertEqual(self.get(view)['X-Page-Cache'], 'miss')
+        self.assertEqual(self.calls, 4)
+
+    def test_streamed_page_is_stored_once_fully_sent(self):
+        def streamed(request):
+            self.calls += 1
+            return StreamingHttpResponse(iter([b'<head>', b'<rows>', b'</html>']))
+
+        first = self.get(streamed)
+        self.assertTrue(first.streaming)
+        # Nothing is stored until the visitor has received the whole page
+        self.assertEqual(self.get(streamed)['X-Page-Cache'], 'miss')
+        self.assertEqual(b''.join(first.streaming_content), b'<head><rows></html>')
+
+        hit = self.get(streamed)
+        self.assertEqual(hit['X-Page-Cache'], 'hit')
+        self.assertEqual(hit.content, b'<head><rows></html>')
+        self.assertEqual(self.calls, 2)
+
+
+class MovieDetailTests(TestCase):
+    """/api/movies/<id>/detail/ returns everything the movie modal shows"""
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user(username='viewer')
+        critic = User.objects.create_user(username='critic')
+        genre = Genre.objects.create(name='Heist')
+        self.movie, self.other, self.hidden = Movie.objects.bulk_create([
+            Movie(title=title, year=2020, description='', thumbnail='', video='', is_published=published)
+            for title, published in [('The Vault', True), ('The Job', True), ('Draft Cut', False)]
+        ])
+        for movie in (self.movie, self.other):
+            movie.genres.add(genre)
+        Review.objects.create(user=critic, movie=self.movie, rating=2, review_text='Slow')
+        Review.objects.create(user=self.viewer, movie=self.movie, rating=5, review_text='Tense')
+        Watchlist.objects.create(user=self.viewer, movie=self.movie)
+        UserRecommendation.objects.create(user=self.viewer, movie_ids=[self.other.id], computed_at=timezone.now())
+        self.client.force_login(self.viewer)
+
+    def detail(self, movie):
+        return self.client.get(reverse('movies:movie_detail', args=[movie.id]))
+
+    def test_combines_movie_reviews_similar_recommendations_and_viewer_state(self):
+        response = self.detail(self.movie)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['movie']['title'], 'The Vault')
+        self.assertEqual([r['review_text'] for r in data['reviews']['reviews']], ['Tense', 'Slow'])
+        self.assertEqual((data['reviews']['total_reviews'], data['reviews']['average_rating']), (2, 3.5))
+        self.assertEqual([m['id'] for m in data['similar']], [self.other.id])
+        self.assertEqual(data['recommendations'], {'movies': [data['similar'][0]], 'tier': 'fresh'})
+        self.assertEqual(response['X-Recommendation-Tier'], 'fresh')
+        self.assertEqual(data['viewer']['in_watchlist'], True)
+        self.assertEqual(data['viewer']['watched'], False)
+        self.assertEqual(data['viewer']['review']['rating'], 5)
+        self.assertTrue(data['viewer']['review']['is_owner'])
+
+    def test_review_page_size_follows_the_request(self):
+        response = self.client.get(reverse('movies:movie_detail', args=[self.movie.id]), {'limit': 1})
+        reviews = response.json()['reviews']
+
+        self.assertEqual(len(reviews['reviews']), 1)
+        self.assertTrue(reviews['has_more'])
+
+    def test_unpublished_or_missing_movie_is_not_found(self):
+        for movie in (self.hidden, Movie(id=self.hidden.id + 100)):
+            response = self.detail(movie)
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.json()['status'], 'error')
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.detail(self.movie).status_code, 302)
@@ -0,0 +1,128 @@
+"""
+Time-bucketed play rollups and decayed trending scores.
+
+Every play increments an hourly and a daily MoviePlayRollup bucket. On a
+schedule, compute_trending() scores each movie per window as the sum of
+its bucket counts weighted by exp(-age * ln2 / half_life), and stores the
+top TRENDING_SIZE per window in TrendingMovie. Reading a trending row is
+then one indexed query instead of sorting the whole catalog by views.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Movie, MoviePlayRollup, TrendingMovie
+
+TRENDING_SIZE = 50
+
+# window -> (rollup granularity, window length, score half-life)
+WINDOWS = {
+    '24h': ('hour', timedelta(hours=24), timedelta(hours=6)),
+    '7d': ('day', timedelta(days=7), timedelta(days=2)),
+    '30d': ('day', timedelta(days=30), timedelta(days=7)),
+}
+
+# How long rollup buckets are kept before prune_rollups() deletes them
+RETENTION = {
+    'hour': timedelta(days=3),
+    'day': timedelta(days=90),
+}
+
+
+def bucket_start(moment, granularity):
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def record_play(movie_id, count=1, at=None):
+    """Add `count` plays of a movie to its current hourly and daily buckets"""
+    at = at or timezone.now()
+    for granularity in ('hour', 'day'):
+        bucket = bucket_start(at, granularity)
+        rollup = MoviePlayRollup.objects.filter(
+            movie_id=movie_id, granularity=granularity, bucket_start=bucket
+        )
+        if rollup.update(plays=F('plays') + count):
+            continue
+        try:
+            with transaction.atomic():
+                MoviePlayRollup.objects.create(
+                    movie_id=movie_id, granularity=granularity, bucket_start=bucket, plays=count
+                )
+        except IntegrityError:
+            # Another request created the bucket first
+            rollup.update(plays=F('plays') + count)
+
+
+def score_window(window, now=None):
+    """Return {movie_id: decayed score} for one trending window"""
+    granularity, length, half_life = WINDOWS[window]
+    now = now or timezone.now()
+    decay = math.log(2) / half_life.total_seconds()
+    scores = defaultdict(float)
+    rollups = MoviePlayRollup.objects.filter(
+        granularity=granularity,
+        bucket_start__gte=bucket_start(now - length, granularity),
+    ).values_list('movie_id', 'bucket_start', 'plays')
+    for movie_id, start, plays in rollups.iterator(chunk_size=5000):
+        age = max((now - start).total_seconds(), 0.0)
+        scores[movie_id] += plays * math.exp(-decay * age)
+    return scores
+
+
+def compute_trending(windows=None, size=TRENDING_SIZE, now=None):
+    """Recompute the materialized top-N of each window; returns {window: rows}"""
+    now = now or timezone.now()
+    published = set(Movie.objects.filter(is_published=True).values_list('id', flat=True))
+    stored = {}
+    for window in windows or WINDOWS:
+        scores = score_window(window, now)
+        ranked = sorted(
+            (item for item in scores.items() if item[0] in published),
+            key=lambda item: item[1], reverse=True,
+        )[:size]
+        with transaction.atomic():
+            TrendingMovie.objects.filter(window=window).delete()
+            TrendingMovie.objects.bulk_create([
+                TrendingMovie(window=window, rank=rank, movie_id=movie_id, score=score)
+                for rank, (movie_id, score) in enumerate(ranked, start=1)
+            ])
+        stored[window] = len(ranked)
+    return stored
+
+
+def prune_rollups(now=None):
+    """Delete buckets older than their retention; returns the number removed"""
+    now = now or timezone.now()
+    removed = 0
+    for granularity, keep in RETENTION.items():
+        removed += MoviePlayRollup.objects.filter(
+            granularity=granularity, bucket_start__lt=now - keep
+        ).delete()[0]
+    return removed
+
+
+def get_trending_movies(window='24h', limit=8):
+    """
+    Published movies of the materialized trending list, best first.
+
+    Falls back to wider windows when a window has no plays yet, and to the
+    all-time view counter before trending has ever been computed.
+    """
+    order = list(WINDOWS)
+    for candidate in order[order.index(window):]:
+        movies = list(Movie.objects.filter(
+            trending_entries__window=candidate,
+            is_published=True
+        ).select_related('language').prefetch_related('genres').order_by('trending_entries__rank')[:limit])
+        if movies:
+            return movies
+    return list(Movie.objects.filter(
+        is_published=True
+    ).select_related('language').prefetch_related('genres').order_by('-views')[:limit])
@@ -5,18 +5,27 @@ app_name = 'movies'
 
 urlpatterns = [
     path('', views.landing_page, name='landing'),
+    path('rows/<str:kind>/<int:key>/', views.landing_row, name='landing_row'),
     path('watchlist/', views.watchlist_page, name='watchlist'),
     path('player/<int:movie_id>/', views.video_player, name='video_player'),
     path('api/watchlist/', views.get_watchlist, name='get_watchlist'),
+    path('api/watchlist/ids/', views.get_watchlist_ids, name='watchlist_ids'),
+    path('api/watchlist/bulk/', views.bulk_update_watchlist, name='bulk_update_watchlist'),
     path('api/watchlist/add/', views.add_to_watchlist, name='add_to_watchlist'),
     path('api/watchlist/remove/', views.remove_from_watchlist, name='remove_from_watchlist'),
     path('api/watchlist/check/<int:movie_id>/', views.check_watchlist_status, name='check_watchlist_status'),
     path('api/increment-view/', views.increment_view, name='increment_view'),
+    path('api/progress/', views.get_watch_progress, name='watch_progress'),
+    path('api/progress/heartbeat/', views.progress_heartbeat, name='progress_heartbeat'),
+    path('api/qoe/', views.qoe_beacon, name='qoe_beacon'),
+    path('api/movies/<int:movie_id>/detail/', views.movie_detail, name='movie_detail'),
     path('api/reviews/<int:movie_id>/', views.get_reviews, name='get_reviews'),
     path('api/reviews/add/', views.add_review, name='add_review'),
     path('api/reviews/edit/<int:review_id>/', views.edit_review, name='edit_review'),
     path('api/reviews/delete/<int:review_id>/', views.delete_review, name='delete_review'),
+    path('api/recommendations/similar/', views.get_similar_movies_batch, name='get_similar_movies_batch'),
     path('api/recommendations/similar/<int:movie_id>/', views.get_similar_movies, name='get_similar_movies'),
     path('api/recommendations/user/', views.get_user_recommendations, name='get_user_recommendations'),
+    path('api/leaderboards/<str:kind>/<int:key>/', views.get_leaderboard, name='get_leaderboard'),
     path('api/user/<int:user_id>/', views.get_user_profile, name='get_user_profile'),
 ]
\ No newline at end of file
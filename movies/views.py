@@ -1,41 +1,112 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from django.db.models import F
-from .models import Movie, Watchlist, Review, WatchHistory, UserInteraction
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_POST
+from django.db import transaction
+from django.db.models import Count, F, Q
+from .background import gather
+from .cache import cache_anonymous_page
+from .cards import attach_movie_cards
+from .models import Genre, Language, Movie, Watchlist, Review, WatchHistory, UserInteraction
+from .recommendations import serve_recommendations
+from .trending import record_play
+from .progress import get_resume_position, record_heartbeat
+from .qoe import parse_events, record_events
+from .leaderboards import get_leaderboard_page
+from .serializers import SUMMARY_FIELDS, only_for, parse_fields, serialize_movie_map, serialize_movies
+from .watchlists import BULK_MAX_IDS as WATCHLIST_BULK_MAX_IDS, apply_watchlist_changes, get_watchlist_version, watchlist_membership
+from .pagination import DEFAULT_PAGE_SIZE, HTML_PAGE_SIZE, InvalidCursor, page_params, paginate
 import json
 
+SIMILAR_BATCH_MAX_IDS = 50
+
+LANDING_ROWS_MARKER = '<!-- landing-rows -->'
+
+# Row kind -> Movie filter for the movies in that row
+LANDING_ROW_FILTERS = {
+    'genre': 'genres',
+    'language': 'language',
+}
+
+
+def _landing_rows():
+    """Genre rows then language rows that have published movies, as (kind, object) pairs"""
+    published = Count('movies', filter=Q(movies__is_published=True))
+    genres = Genre.objects.annotate(movie_count=published).filter(movie_count__gt=0).order_by('name')
+    languages = Language.objects.annotate(movie_count=published).filter(movie_count__gt=0).order_by('name')
+    return [('genre', genre) for genre in genres] + [('language', language) for language in languages]
+
+
+def _landing_row_page(kind, key, cursor=None):
+    """One keyset page of the newest published movies in a landing row"""
+    movies = Movie.objects.filter(
+        is_published=True, **{LANDING_ROW_FILTERS[kind]: key}
+    ).select_related('language').prefetch_related('genres')
+    return paginate(movies, ['-id'], cursor, settings.LANDING_ROW_SIZE)
+
+
+def _render_movie_cards(request, movies):
+    attach_movie_cards(movies)
+    return render_to_string('movies/partials/movie_cards.html', {
+        'movies': movies,
+        'movies_data': serialize_movies(movies),
+    }, request=request)
+
+
+@cache_anonymous_page
 def landing_page(request):
-    movies = Movie.objects.filter(is_published=True).prefetch_related('genres', 'language')
-    
-    # Get user's watchlist IDs if logged in
-    user_watchlist_ids = []
-    if request.user.is_authenticated:
-        user_watchlist_ids = list(
-            Watchlist.objects.filter(user=request.user).values_list('movie_id', flat=True)
+    """
+    Stream the landing page: the page head goes out before any movie is
+    queried, then the first LANDING_EAGER_ROWS rows as each renders. Later
+    rows are sent as empty placeholders that fetch landing_row pages when
+    scrolled into view, so the response size no longer grows with the catalog.
+    """
+    rows = _landing_rows()
+    eager = settings.LANDING_EAGER_ROWS
+
+    # Render the page frame once and split it where the rows go
+    frame = render_to_string('movies/landing.html', {
+        'rows_marker': LANDING_ROWS_MARKER,
+    }, request=request)
+    head, tail = frame.split(LANDING_ROWS_MARKER, 1)
+
+    def stream():
+        yield head
+        for kind, row in rows[:eager]:
+            page = _landing_row_page(kind, row.id)
+            yield render_to_string('movies/partials/movie_row.html', {
+                'kind': kind,
+                'row': row,
+                'cards': _render_movie_cards(request, page.items),
+                'next_cursor': page.next_cursor,
+            }, request=request)
+        yield ''.join(
+            render_to_string('movies/partials/movie_row.html', {'kind': kind, 'row': row, 'lazy': True})
+            for kind, row in rows[eager:]
         )
-    
-    # Get genres with movie counts
-    from django.db.models import Count, Q
-    from movies.models import Genre, Language
-    
-    genres = Genre.objects.annotate(
-        movie_count=Count('movies', filter=Q(movies__is_published=True))
-    ).filter(movie_count__gt=0).order_by('name')
-    
-    # Get languages with movie counts
-    languages = Language.objects.annotate(
-        movie_count=Count('movies', filter=Q(movies__is_published=True))
-    ).filter(movie_count__gt=0).order_by('name')
-    
-    return render(request, 'movies/landing.html', {
-        'movies': movies,
-        'user_watchlist_ids': user_watchlist_ids,
-        'genres': genres,
-        'languages': languages
-    })
+        yield tail
+
+    return StreamingHttpResponse(stream(), content_type='text/html; charset=utf-8')
+
+
+def landing_row(request, kind, key):
+    """Next page of movie cards for one landing row, as an HTML fragment"""
+    if kind not in LANDING_ROW_FILTERS:
+        raise Http404('Unknown row kind')
+    try:
+        page = _landing_row_page(kind, key, request.GET.get('cursor') or None)
+        return JsonResponse({
+            'status': 'success',
+            'html': _render_movie_cards(request, page.items),
+            'next_cursor': page.next_cursor,
+            'has_more': page.has_more
+        })
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
 @login_required
 def watchlist_page(request):
@@ -58,6 +129,7 @@ def increment_view(request):
         movie = Movie.objects.get(id=movie_id)
         movie.views = F('views') + 1
         movie.save(update_fields=['views'])
+        record_play(movie.id)
         
         # Add to watch history
         WatchHistory.objects.get_or_create(
@@ -93,12 +165,23 @@ def increment_view(request):
 
 @login_required
 def watchlist_page(request):
-    watchlist_items = Watchlist.objects.filter(user=request.user).select_related('movie')
-    movies = [item.movie for item in watchlist_items]
+    watchlist_items = Watchlist.objects.filter(user=request.user)
+    cursor, limit = page_params(request, default=HTML_PAGE_SIZE)
+    try:
+        page = paginate(
+            watchlist_items.select_related('movie__language').prefetch_related('movie__genres'),
+            ['-added_on', '-id'], cursor, limit
+        )
+    except InvalidCursor:
+        return redirect(request.path)
+    movies = [item.movie for item in page.items]
+    attach_movie_cards(movies)
     
     return render(request, 'movies/watchlist.html', {
         'movies': movies,
-        'watchlist_count': len(movies)
+        'watchlist_count': watchlist_items.count(),
+        'cursor': cursor,
+        'next_cursor': page.next_cursor
     })
 
 @login_required
@@ -136,31 +219,77 @@ def add_to_watchlist(request):
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
+def _watchlist_etag(request):
+    return get_watchlist_version(request.user.id) if request.user.is_authenticated else None
+
+
+@login_required
+@condition(etag_func=_watchlist_etag)
+def get_watchlist_ids(request):
+    """
+    Sorted ids of the user's watchlist with its version. The version is also
+    the ETag, so clients revalidating with If-None-Match get a 304 until the
+    watchlist changes.
+    """
+    try:
+        version, ids = watchlist_membership(request.user.id)
+        response = JsonResponse({
+            'status': 'success',
+            'version': version,
+            'ids': ids,
+            'count': len(ids)
+        })
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+@login_required
+@require_POST
+def bulk_update_watchlist(request):
+    """Add and remove many movies at once: {"add": [ids], "remove": [ids]}"""
+    try:
+        data = json.loads(request.body)
+        add = [int(movie_id) for movie_id in data.get('add', [])]
+        remove = [int(movie_id) for movie_id in data.get('remove', [])]
+        if len(add) + len(remove) > WATCHLIST_BULK_MAX_IDS:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'At most {WATCHLIST_BULK_MAX_IDS} movie ids per request'
+            }, status=400)
+        
+        added, removed = apply_watchlist_changes(request.user, add, remove)
+        version, ids = watchlist_membership(request.user.id)
+        return JsonResponse({
+            'status': 'success',
+            'added': added,
+            'removed': removed,
+            'version': version,
+            'ids': ids
+        })
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
 @login_required
 def get_watchlist(request):
     """API endpoint to get user's watchlist"""
     try:
-        watchlist_items = Watchlist.objects.filter(user=request.user).select_related('movie').prefetch_related('movie__genres', 'movie__language')
-        
-        movies_data = [{
-            'id': item.movie.id,
-            'title': item.movie.title,
-            'year': item.movie.year,
-            'description': item.movie.description or '',
-            'thumbnail': item.movie.thumbnail.url if item.movie.thumbnail else '',
-            'video': item.movie.video.url if item.movie.video else '',
-            'genres': item.movie.get_genres_display(),
-            'language': item.movie.language.name if item.movie.language else 'Unknown',
-            'cast': item.movie.cast or '',
-            'length': item.movie.movie_length or 'Unknown',
-            'rating': float(item.movie.review_stars),
-            'views': item.movie.views
-        } for item in watchlist_items]
+        fields = parse_fields(request)
+        cursor, limit = page_params(request)
+        page = paginate(
+            Watchlist.objects.filter(user=request.user).select_related('movie').only(
+                'id', 'added_on', 'movie', *(f'movie__{column}' for column in only_for(fields))
+            ),
+            ['-added_on', '-id'], cursor, limit
+        )
+        movies_data = serialize_movies([item.movie for item in page.items], fields)
         
         return JsonResponse({
             'status': 'success',
             'movies': movies_data,
-            'count': len(movies_data)
+            'count': len(movies_data),
+            'next_cursor': page.next_cursor,
+            'has_more': page.has_more
         })
     except Exception as e:
         return JsonResponse({
@@ -200,7 +329,8 @@ def increment_view(request):
         movie_id = json.loads(request.body).get('movie_id')
         movie = Movie.objects.get(id=movie_id)
         movie.views += 1
-        movie.save()
+        movie.save(update_fields=['views'])
+        record_play(movie.id)
         
         # Add to watch history
         WatchHistory.objects.get_or_create(
@@ -211,28 +341,37 @@ def increment_view(request):
         return JsonResponse({'status': 'success', 'views': movie.views})
 
 # Review API endpoints
+def _review_data(review, user):
+    return {
+        'id': review.id,
+        'user': review.user.username,
+        'user_id': review.user.id,
+        'rating': review.rating,
+        'review_text': review.review_text,
+        'created_at': review.time_since_created(),
+        'is_owner': user.is_authenticated and review.user == user
+    }
+
+
+def _reviews_page_data(movie, user, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of a movie's reviews, newest first, with its rating summary"""
+    page = paginate(movie.reviews.select_related('user'), ['-created_at', '-id'], cursor, limit)
+    return {
+        'reviews': [_review_data(review, user) for review in page.items],
+        'average_rating': float(movie.review_stars),
+        'total_reviews': movie.rating_count,
+        'rating_histogram': movie.rating_histogram,
+        'next_cursor': page.next_cursor,
+        'has_more': page.has_more
+    }
+
+
 def get_reviews(request, movie_id):
     """Get all reviews for a movie"""
     try:
         movie = get_object_or_404(Movie, id=movie_id)
-        reviews = movie.reviews.select_related('user').all()
-        
-        reviews_data = [{
-            'id': review.id,
-            'user': review.user.username,
-            'user_id': review.user.id,
-            'rating': review.rating,
-            'review_text': review.review_text,
-            'created_at': review.time_since_created(),
-            'is_owner': request.user.is_authenticated and review.user == request.user
-        } for review in reviews]
-        
-        return JsonResponse({
-            'status': 'success',
-            'reviews': reviews_data,
-            'average_rating': float(movie.review_stars),
-            'total_reviews': len(reviews_data)
-        })
+        cursor, limit = page_params(request)
+        return JsonResponse({'status': 'success', **_reviews_page_data(movie, request.user, cursor, limit)})
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
@@ -285,7 +424,7 @@ def add_review(request):
                 'created_at': review.time_since_created(),
                 'is_owner': True
             },
-            'average_rating': float(movie.review_stars)
+            'average_rating': float(review.movie.review_stars)
         })
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
@@ -308,10 +447,12 @@ def edit_review(request, review_id):
         if len(review_text) > 1000:
             return JsonResponse({'status': 'error', 'message': 'Review text too long (max 1000 characters)'}, status=400)
         
-        review = get_object_or_404(Review, id=review_id, user=request.user)
-        review.rating = int(rating)
-        review.review_text = review_text
-        review.save()
+        with transaction.atomic():
+            # Lock the row so concurrent edits apply their rating deltas in turn
+            review = get_object_or_404(Review.objects.select_for_update(), id=review_id, user=request.user)
+            review.rating = int(rating)
+            review.review_text = review_text
+            review.save()
         
         return JsonResponse({
             'status': 'success',
@@ -334,9 +475,11 @@ def edit_review(request, review_id):
 def delete_review(request, review_id):
     """Delete a review"""
     try:
-        review = get_object_or_404(Review, id=review_id, user=request.user)
-        movie = review.movie
-        review.delete()
+        with transaction.atomic():
+            # A second concurrent delete must not subtract the rating again
+            review = get_object_or_404(Review.objects.select_for_update(), id=review_id, user=request.user)
+            movie = review.movie
+            review.delete()
         
         return JsonResponse({
             'status': 'success',
@@ -350,18 +493,9 @@ def delete_review(request, review_id):
 def get_similar_movies(request, movie_id):
     """Get movies similar to the given movie"""
     try:
+        fields = parse_fields(request, default=SUMMARY_FIELDS)
         movie = get_object_or_404(Movie, id=movie_id, is_published=True)
-        similar_movies = movie.get_similar_movies(limit=6)
-        
-        movies_data = [{
-            'id': m.id,
-            'title': m.title,
-            'year': m.year,
-            'thumbnail': m.thumbnail.url if m.thumbnail else '',
-            'rating': float(m.review_stars),
-            'genres': m.get_genres_display(),
-            'language': m.language.name if m.language else 'Unknown'
-        } for m in similar_movies]
+        movies_data = serialize_movies(movie.get_similar_movies(limit=6), fields)
         
         return JsonResponse({
             'status': 'success',
@@ -370,24 +504,131 @@ def get_similar_movies(request, movie_id):
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
+def get_similar_movies_batch(request):
+    """Get similar movies for several movies in one request (?ids=1,2,3)"""
+    try:
+        movie_ids = [int(movie_id) for movie_id in request.GET.get('ids', '').split(',') if movie_id.strip()]
+        if not movie_ids:
+            return JsonResponse({'status': 'error', 'message': 'No movie ids given'}, status=400)
+        if len(movie_ids) > SIMILAR_BATCH_MAX_IDS:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'At most {SIMILAR_BATCH_MAX_IDS} movie ids per request'
+            }, status=400)
+        limit = min(max(int(request.GET.get('limit', 6)), 1), 20)
+        fields = parse_fields(request, default=SUMMARY_FIELDS)
+        
+        published_ids = list(Movie.objects.filter(id__in=movie_ids, is_published=True).values_list('id', flat=True))
+        similar = Movie.get_similar_movies_bulk(published_ids, limit=limit)
+        
+        # One payload lookup for every neighbour of every requested movie
+        serialized = serialize_movie_map([m for movies in similar.values() for m in movies], fields)
+        results = {
+            str(movie_id): [serialized[m.id] for m in movies if m.id in serialized]
+            for movie_id, movies in similar.items()
+        }
+        
+        return JsonResponse({
+            'status': 'success',
+            'results': results,
+            'missing': [movie_id for movie_id in dict.fromkeys(movie_ids) if movie_id not in similar]
+        })
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
 @login_required
 def get_user_recommendations(request):
     """Get personalized recommendations for the logged-in user"""
     try:
-        recommended_movies = Movie.get_recommendations_for_user(request.user, limit=6)
+        fields = parse_fields(request, default=SUMMARY_FIELDS)
+        recommended_movies, tier = serve_recommendations(request.user, limit=6)
+        movies_data = serialize_movies(recommended_movies, fields)
+        
+        response = JsonResponse({
+            'status': 'success',
+            'movies': movies_data,
+            'tier': tier
+        })
+        response['X-Recommendation-Tier'] = tier
+        return response
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+def _similar_movies_data(movie):
+    return serialize_movies(movie.get_similar_movies(limit=6), SUMMARY_FIELDS)
+
+
+def _recommendations_data(user):
+    recommended_movies, tier = serve_recommendations(user, limit=6)
+    return {'movies': serialize_movies(recommended_movies, SUMMARY_FIELDS), 'tier': tier}
+
+
+def _viewer_data(movie, user):
+    """What the signed-in user has done with the movie"""
+    review = Review.objects.filter(user=user, movie=movie).select_related('user').first()
+    return {
+        'in_watchlist': Watchlist.objects.filter(user=user, movie=movie).exists(),
+        'watched': WatchHistory.objects.filter(user=user, movie=movie).exists(),
+        'review': _review_data(review, user) if review else None
+    }
+
+
+@login_required
+def movie_detail(request, movie_id):
+    """
+    Everything the movie modal shows in one request: the movie, the first
+    page of reviews with the rating histogram, similar movies, the user's
+    recommendations and the viewer's watchlist/watch/review state. The
+    independent parts are looked up in parallel.
+    """
+    try:
+        movie = get_object_or_404(Movie, id=movie_id, is_published=True)
+        cursor, limit = page_params(request)
+        reviews, similar, recommendations, viewer = gather(
+            (_reviews_page_data, movie, request.user, cursor, limit),
+            (_similar_movies_data, movie),
+            (_recommendations_data, request.user),
+            (_viewer_data, movie, request.user),
+        )
+        response = JsonResponse({
+            'status': 'success',
+            'movie': serialize_movies([movie])[0],
+            'reviews': reviews,
+            'similar': similar,
+            'recommendations': recommendations,
+            'viewer': viewer
+        })
+        response['X-Recommendation-Tier'] = recommendations['tier']
+        return response
+    except Http404 as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+def get_leaderboard(request, kind, key):
+    """Get one page of a precomputed genre or language leaderboard"""
+    try:
+        if kind not in ('genre', 'language'):
+            return JsonResponse({'status': 'error', 'message': 'Unknown leaderboard'}, status=404)
+        
+        page = max(int(request.GET.get('page', 1)), 1)
+        entries = get_leaderboard_page(kind, key, page)
         
+        movies = serialize_movies(
+            [entry.movie for entry in entries], ('id', 'title', 'year', 'thumbnail', 'rating', 'language')
+        )
         movies_data = [{
-            'id': m.id,
-            'title': m.title,
-            'year': m.year,
-            'thumbnail': m.thumbnail.url if m.thumbnail else '',
-            'rating': float(m.review_stars),
-            'genres': m.get_genres_display(),
-            'language': m.language.name if m.language else 'Unknown'
-        } for m in recommended_movies]
+            'rank': entry.rank,
+            **movie,
+            'bayesian_rating': round(entry.bayesian_rating, 2),
+            'score': round(entry.score, 4)
+        } for entry, movie in zip(entries, movies)]
         
         return JsonResponse({
             'status': 'success',
+            'kind': kind,
+            'key': key,
+            'page': page,
             'movies': movies_data
         })
     except Exception as e:
@@ -424,6 +665,7 @@ def video_player(request, movie_id):
     # Increment view count
     movie.views = F('views') + 1
     movie.save(update_fields=['views'])
+    record_play(movie.id)
     
     # Add to watch history
     WatchHistory.objects.get_or_create(
@@ -440,5 +682,59 @@ def video_player(request, movie_id):
     )
     
     return render(request, 'movies/player.html', {
-        'movie': movie
-    })
\ No newline at end of file
+        'movie': movie,
+        'resume_position': get_resume_position(request.user.id, movie.id),
+        'heartbeat_interval': settings.WATCH_PROGRESS_HEARTBEAT_INTERVAL
+    })
+
+@login_required
+def get_watch_progress(request):
+    """Where to resume ?movie_id= from, and how often the player should report"""
+    try:
+        movie_id = int(request.GET['movie_id'])
+        return JsonResponse({
+            'status': 'success',
+            'position': get_resume_position(request.user.id, movie_id),
+            'heartbeat_interval': settings.WATCH_PROGRESS_HEARTBEAT_INTERVAL
+        })
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+@login_required
+@require_POST
+def progress_heartbeat(request):
+    """
+    Record the player's position. Sent as form data (navigator.sendBeacon)
+    every few seconds while playing; only buffered here, see movies.progress.
+    """
+    try:
+        movie_id = int(request.POST['movie_id'])
+        position = float(request.POST['position'])
+        duration = float(request.POST.get('duration') or 0)
+        if not (0 <= position < float('inf') and 0 <= duration < float('inf')):
+            raise ValueError('Invalid position')
+
+        record_heartbeat(request.user.id, movie_id, position, duration)
+        return JsonResponse({'status': 'success'})
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+@login_required
+@require_POST
+def qoe_beacon(request):
+    """
+    Store a batch of player QoE measurements. Sent as form data
+    (navigator.sendBeacon) with movie_id and `events`, a JSON list of
+    {"metric": ..., "value": ...}; see movies.qoe.
+    """
+    try:
+        movie_id = int(request.POST['movie_id'])
+        events = parse_events(json.loads(request.POST['events']))
+        if not Movie.objects.filter(id=movie_id).exists():
+            return JsonResponse({'status': 'error', 'message': 'Movie not found'}, status=404)
+
+        if events:
+            record_events(movie_id, events)
+        return JsonResponse({'status': 'success', 'accepted': len(events)})
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
@@ -0,0 +1,83 @@
+"""
+Watchlist membership for client-side badges.
+
+Each user's watchlist has a version token, replaced whenever a Watchlist row
+is added or removed. Clients keep the sorted id list with its version and
+revalidate it with If-None-Match, so an unchanged watchlist costs one cache
+read and a 304.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Movie, UserInteraction, Watchlist
+from .recommendations import schedule_refresh
+
+IDS_CACHE_TTL = 24 * 3600  # entries are versioned; this only bounds memory
+BULK_MAX_IDS = 500
+
+
+def _version_key(user_id):
+    return f'movies:watchlist_version:{user_id}'
+
+
+def _ids_key(user_id):
+    return f'movies:watchlist_ids:{user_id}'
+
+
+def get_watchlist_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_watchlist_version(user_id):
+    cache.set(_version_key(user_id), uuid.uuid4().hex, timeout=None)
+
+
+def watchlist_membership(user_id):
+    """Return (version, sorted movie ids) of the user's watchlist"""
+    cached = cache.get_many([_version_key(user_id), _ids_key(user_id)])
+    version = cached.get(_version_key(user_id)) or get_watchlist_version(user_id)
+    entry = cached.get(_ids_key(user_id))
+    if entry is not None and entry[0] == version:
+        return version, entry[1]
+    ids = list(Watchlist.objects.filter(user_id=user_id).order_by('movie_id').values_list('movie_id', flat=True))
+    cache.set(_ids_key(user_id), (version, ids), IDS_CACHE_TTL)
+    return version, ids
+
+
+def apply_watchlist_changes(user, add=(), remove=()):
+    """
+    Add and remove many movies in one transaction.
+
+    Unknown or unpublished movies are skipped. Returns (added ids, removed ids).
+    Rows are bulk-written, so the version bump and recommendation refresh
+    that per-row signals would trigger are done here once, after commit.
+    """
+    remove = set(remove)
+    add = set(Movie.objects.filter(id__in=set(add) - remove, is_published=True).values_list('id', flat=True))
+    with transaction.atomic():
+        existing = set(Watchlist.objects.filter(user=user, movie_id__in=add).values_list('movie_id', flat=True))
+        added = sorted(add - existing)
+        Watchlist.objects.bulk_create(
+            [Watchlist(user=user, movie_id=movie_id) for movie_id in added], ignore_conflicts=True
+        )
+        UserInteraction.objects.bulk_create([
+            UserInteraction(user=user, movie_id=movie_id, interaction_type='watchlist', score=1.0)
+            for movie_id in added
+        ], ignore_conflicts=True)
+
+        removing = Watchlist.objects.filter(user=user, movie_id__in=remove)
+        removed = sorted(removing.values_list('movie_id', flat=True))
+        removing.delete()
+
+        if added or removed:
+            transaction.on_commit(lambda: bump_watchlist_version(user.id))
+        if added:
+            transaction.on_commit(lambda: schedule_refresh(user.id))
+    return added, removed